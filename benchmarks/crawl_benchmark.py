@@ -0,0 +1,187 @@
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import socket
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from synthetic_site import add_site_arguments, site_from_args
+
+def _serve(args: argparse.Namespace) -> None:
+    asyncio.run(site_from_args(args).serve_forever())
+
+def _wait_for_port(host: str, port: int, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Synthetic site did not start on {host}:{port}")
+            time.sleep(0.05)
+
+def _latency_summary(histogram, label: str) -> Dict[str, Dict[str, Any]]:
+    summary = {}
+    for key in list(histogram.values):
+        labels = {label: key[0]}
+        summary[key[0]] = {
+            'count': histogram.count(**labels),
+            'p50': histogram.quantile(0.5, **labels),
+            'p99': histogram.quantile(0.99, **labels),
+        }
+    return summary
+
+async def _crawl(start_url: str, plugins: List[str]) -> float:
+    from spider.config import config
+    from spider.plugin import PluginManager
+    from spider.spider import Spider
+    plugin_manager = PluginManager(timeout=config['plugins']['timeout'])
+    if 'title' in plugins:
+        from spider.plugins.title_logger_plugin import TitleLoggerPlugin
+        plugin_manager.register(TitleLoggerPlugin())
+    crawler = Spider(start_url, config, plugin_manager)
+    start = time.perf_counter()
+    await crawler.crawl()
+    return time.perf_counter() - start
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Serve the synthetic site in a child process, crawl it in this one and collect the
+    crawler's metrics.
+
+    :param args: Parsed command line arguments.
+    :return: The benchmark report.
+    """
+    site = site_from_args(args)
+    workdir = tempfile.mkdtemp(prefix='spider-bench-')
+    # The crawler reads its configuration at import time, so set it up first.
+    os.environ['CRAWLER_DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['CRAWLER_RATE_LIMIT'] = str(args.rate_limit)
+    os.environ['CRAWLER_THREADS'] = str(args.threads)
+    os.environ['CRAWLER_CONDITIONAL_GET'] = 'false'
+    # The synthetic site spreads over several loopback addresses, each its own site.
+    os.environ['CRAWLER_SAME_SITE'] = 'false'
+
+    server = multiprocessing.get_context('spawn').Process(target=_serve, args=(args,), daemon=True)
+    server.start()
+    try:
+        for i in range(site.hosts):
+            _wait_for_port(site.host_for(i), site.port)
+        wall = asyncio.run(_crawl(site.start_url, args.plugins))
+    finally:
+        server.terminate()
+        server.join()
+
+    from spider import metrics
+    fetched = metrics.pages_fetched.get()
+    rows = metrics.db_rows_written.total()
+    return {
+        'params': {
+            'pages': site.pages, 'fanout': site.fanout, 'page_size': site.page_size,
+            'latency': site.latency, 'error_rate': site.error_rate, 'hosts': site.hosts,
+            'seed': site.seed, 'threads': args.threads, 'rate_limit': args.rate_limit,
+            'plugins': args.plugins,
+        },
+        'wall_seconds': wall,
+        'pages_fetched': fetched,
+        'fetch_errors': metrics.fetch_errors.snapshot(),
+        'pages_per_sec': fetched / wall if wall else 0.0,
+        'stages': _latency_summary(metrics.stage_seconds, 'stage'),
+        'plugins': _latency_summary(metrics.plugin_seconds, 'plugin'),
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024),
+        'db_rows_written': rows,
+        'db_rows_per_sec': rows / wall if wall else 0.0,
+    }
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], max_throughput_drop: float = 0.10,
+            max_latency_increase: float = 0.25, max_rss_increase: float = 0.20,
+            min_latency_delta: float = 0.005) -> List[str]:
+    """
+    Compare a report against a baseline report.
+
+    :param current: The new report.
+    :param baseline: The reference report.
+    :param max_throughput_drop: Allowed relative drop of pages/sec and DB rows/sec.
+    :param max_latency_increase: Allowed relative increase of a stage's p99.
+    :param max_rss_increase: Allowed relative increase of peak RSS.
+    :param min_latency_delta: p99 increases below this many seconds are ignored as noise.
+    :return: A description of every regression; empty if none.
+    """
+    regressions = []
+    for key in ('pages_per_sec', 'db_rows_per_sec'):
+        before, after = baseline.get(key) or 0.0, current.get(key) or 0.0
+        if before and after < before * (1 - max_throughput_drop):
+            regressions.append(f"{key} dropped {1 - after / before:.1%} ({before:.1f} -> {after:.1f})")
+    for group in ('stages', 'plugins'):
+        for name, before in (baseline.get(group) or {}).items():
+            after = (current.get(group) or {}).get(name)
+            if not after or before.get('p99') is None or after.get('p99') is None:
+                continue
+            delta = after['p99'] - before['p99']
+            if delta > min_latency_delta and after['p99'] > before['p99'] * (1 + max_latency_increase):
+                regressions.append(f"{group[:-1]} {name} p99 rose {before['p99'] * 1000:.1f}ms -> {after['p99'] * 1000:.1f}ms")
+    before, after = baseline.get('peak_rss_mb') or 0.0, current.get('peak_rss_mb') or 0.0
+    if before and after > before * (1 + max_rss_increase):
+        regressions.append(f"peak RSS rose {before:.0f}MB -> {after:.0f}MB")
+    return regressions
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        f"pages fetched:   {report['pages_fetched']:.0f} in {report['wall_seconds']:.2f}s "
+        f"({report['pages_per_sec']:.1f} pages/s)",
+        f"fetch errors:    {report['fetch_errors'] or 'none'}",
+        f"peak RSS:        {report['peak_rss_mb']:.1f} MB",
+        f"DB rows written: {report['db_rows_written']:.0f} ({report['db_rows_per_sec']:.1f} rows/s)",
+    ]
+    for group in ('stages', 'plugins'):
+        for name, stats in sorted(report[group].items()):
+            p50 = f"{stats['p50'] * 1000:.2f}ms" if stats['p50'] is not None else '-'
+            p99 = f"{stats['p99'] * 1000:.2f}ms" if stats['p99'] is not None else '-'
+            lines.append(f"{group[:-1]} {name:<20} n={stats['count']:<7} p50={p50:<10} p99={p99}")
+    return '\n'.join(lines)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the crawler against a local synthetic site.")
+    add_site_arguments(parser)
+    parser.add_argument('--threads', type=int, default=8, help="crawl workers")
+    parser.add_argument('--rate-limit', type=float, default=0.0, help="seconds between requests to one host")
+    parser.add_argument('--plugins', nargs='*', default=['title'], choices=['title'], help="plugins to register")
+    parser.add_argument('--database-url', help="database to write to (default: a temporary SQLite file)")
+    parser.add_argument('--output', help="write the JSON report to this file")
+    parser.add_argument('--baseline', help="JSON report to compare against; exits 1 on regressions")
+    parser.add_argument('--max-throughput-drop', type=float, default=0.10)
+    parser.add_argument('--max-latency-increase', type=float, default=0.25)
+    parser.add_argument('--max-rss-increase', type=float, default=0.20)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    report = run_benchmark(args)
+    print(format_report(report))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('params') != report['params']:
+            print("warning: baseline was recorded with different parameters")
+        regressions = compare(report, baseline, args.max_throughput_drop, args.max_latency_increase, args.max_rss_increase)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+# Modules that must not be loaded just by importing an entry point.
+HEAVY_MODULES = ['fastapi', 'uvicorn', 'starlette', 'spacy', 'playwright']
+
+# Runs in a fresh interpreter: times the import and reports what it pulled in.
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+from spider import db
+print(json.dumps({{
+    'seconds': elapsed,
+    'modules': len(sys.modules),
+    'heavy': sorted(name for name in {heavy!r} if name in sys.modules),
+    'engines': len(db._engines),
+}}))
+"""
+
+def measure(module: str, runs: int, env: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Import ``module`` in ``runs`` fresh interpreters.
+
+    :return: Median and best import time, module count, heavy modules and engines created.
+    """
+    samples: List[Dict[str, Any]] = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            env=env, check=True, capture_output=True, text=True
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    times = [sample['seconds'] for sample in samples]
+    return {
+        'median_seconds': statistics.median(times),
+        'min_seconds': min(times),
+        'modules': samples[-1]['modules'],
+        'heavy_modules': samples[-1]['heavy'],
+        'engines': samples[-1]['engines'],
+    }
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    env = dict(os.environ)
+    env['PYTHONPATH'] = SRC + os.pathsep + env.get('PYTHONPATH', '')
+    # Never touch a real database; importing must not connect anyway.
+    env['CRAWLER_DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='spider-startup-'), 'startup.db')}"
+    return {
+        'params': {'modules': args.modules, 'runs': args.runs},
+        'imports': {module: measure(module, args.runs, env) for module in args.modules},
+    }
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], max_increase: float = 0.25,
+            min_delta: float = 0.02) -> List[str]:
+    """
+    Compare a report against a baseline report.
+
+    :param max_increase: Allowed relative increase of the median import time.
+    :param min_delta: Increases below this many seconds are ignored as noise.
+    :return: A description of every regression; empty if none.
+    """
+    regressions = []
+    for module, before in (baseline.get('imports') or {}).items():
+        after = (current.get('imports') or {}).get(module)
+        if not after:
+            continue
+        delta = after['median_seconds'] - before['median_seconds']
+        if delta > min_delta and after['median_seconds'] > before['median_seconds'] * (1 + max_increase):
+            regressions.append(f"import {module} rose {before['median_seconds'] * 1000:.0f}ms -> "
+                               f"{after['median_seconds'] * 1000:.0f}ms")
+    return regressions
+
+def check(report: Dict[str, Any]) -> List[str]:
+    """
+    Problems that fail the benchmark regardless of any baseline.
+    """
+    problems = []
+    for module, result in report['imports'].items():
+        if result['heavy_modules']:
+            problems.append(f"import {module} loads {', '.join(result['heavy_modules'])}")
+        if result['engines']:
+            problems.append(f"import {module} creates {result['engines']} database engine(s)")
+    return problems
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = []
+    for module, result in report['imports'].items():
+        lines.append(
+            f"{module:<20} median={result['median_seconds'] * 1000:.0f}ms min={result['min_seconds'] * 1000:.0f}ms "
+            f"modules={result['modules']} heavy={','.join(result['heavy_modules']) or 'none'} engines={result['engines']}"
+        )
+    return '\n'.join(lines)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure how long the crawler's entry points take to import.")
+    parser.add_argument('--modules', nargs='*', default=['spider.main', 'spider.tasks'], help="modules to import")
+    parser.add_argument('--runs', type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument('--output', help="write the JSON report to this file")
+    parser.add_argument('--baseline', help="JSON report to compare against; exits 1 on regressions")
+    parser.add_argument('--max-increase', type=float, default=0.25)
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    print(format_report(report))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    problems = check(report)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        problems += compare(report, baseline, args.max_increase)
+    for problem in problems:
+        print(f"REGRESSION: {problem}")
+    if problems:
+        sys.exit(1)
+    if args.baseline:
+        print("No regressions against baseline.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+import argparse
+import asyncio
+import random
+from hashlib import blake2b
+from typing import Dict, List
+from aiohttp import web
+
+# Words pages are written in; each page draws its own seeded sequence, so pages are
+# distinct to near-duplicate detection while sharing a vocabulary like a real site.
+VOCABULARY = [f"{a}{b}" for a in ("lor", "ips", "dol", "sit", "amet", "cons", "adip", "elit", "sed", "temp")
+              for b in ("um", "or", "is", "at", "ent", "ura", "ex", "on", "ia", "us")]
+
+class SyntheticSite:
+    def __init__(self, pages: int = 1000, fanout: int = 10, page_size: int = 20000,
+                 latency: float = 0.0, error_rate: float = 0.0, hosts: int = 1,
+                 port: int = 8900, seed: int = 42) -> None:
+        """
+        A deterministic site graph served by aiohttp, for benchmarking the crawler
+        without touching real sites. Page ``i`` links to page ``i + 1`` (so every page
+        is reachable from page 0) and to ``fanout - 1`` pages chosen by a seeded RNG.
+
+        Pages are spread over ``hosts`` loopback addresses (127.0.0.1, 127.0.0.2, ...),
+        which the crawler treats as separate hosts for politeness and concurrency.
+
+        :param pages: Number of pages in the graph.
+        :param fanout: Links per page.
+        :param page_size: Approximate HTML size of each page in bytes.
+        :param latency: Seconds each response is delayed.
+        :param error_rate: Fraction of pages that answer with HTTP 500.
+        :param hosts: Number of loopback hosts serving the graph.
+        :param port: TCP port used on every host.
+        :param seed: Seed of the link graph and error selection.
+        """
+        self.pages = max(int(pages), 1)
+        self.fanout = max(int(fanout), 1)
+        self.page_size = int(page_size)
+        self.latency = float(latency)
+        self.error_rate = float(error_rate)
+        self.hosts = max(int(hosts), 1)
+        self.port = int(port)
+        self.seed = int(seed)
+        self._pages: Dict[int, str] = {}
+        self._runners: List[web.AppRunner] = []
+
+    def host_for(self, page: int) -> str:
+        return f"127.0.0.{page % self.hosts + 1}"
+
+    def url_for(self, page: int) -> str:
+        return f"http://{self.host_for(page)}:{self.port}/page/{page}"
+
+    @property
+    def start_url(self) -> str:
+        return self.url_for(0)
+
+    def links_for(self, page: int) -> List[int]:
+        rng = random.Random(self.seed * 1000003 + page)
+        links = [(page + 1) % self.pages]
+        links.extend(rng.randrange(self.pages) for _ in range(self.fanout - 1))
+        return links
+
+    def is_error(self, page: int) -> bool:
+        if page == 0 or self.error_rate <= 0:
+            return False
+        digest = blake2b(f"{self.seed}:{page}".encode(), digest_size=8).digest()
+        return int.from_bytes(digest, 'little') / 2 ** 64 < self.error_rate
+
+    def text_for(self, page: int) -> str:
+        rng = random.Random(self.seed * 1000003 - page)
+        words: List[str] = []
+        length = 0
+        while length < self.page_size:
+            word = rng.choice(VOCABULARY)
+            words.append(word)
+            length += len(word) + 1
+        return ' '.join(words)
+
+    def render(self, page: int) -> str:
+        html = self._pages.get(page)
+        if html is None:
+            links = ''.join(f'<li><a href="{self.url_for(link)}">Page {link}</a></li>' for link in self.links_for(page))
+            html = self._pages[page] = (
+                f"<html><head><title>Page {page}</title></head><body>"
+                f"<h1>Page {page}</h1><ul>{links}</ul><p>{self.text_for(page)}</p></body></html>"
+            )
+        return html
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        try:
+            page = int(request.match_info['page'])
+        except ValueError:
+            raise web.HTTPNotFound()
+        if not 0 <= page < self.pages:
+            raise web.HTTPNotFound()
+        if self.is_error(page):
+            return web.Response(status=500, text="synthetic error")
+        return web.Response(text=self.render(page), content_type='text/html')
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get('/page/{page}', self.handle)
+        for i in range(self.hosts):
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            await web.TCPSite(runner, f"127.0.0.{i + 1}", self.port).start()
+            self._runners.append(runner)
+
+    async def stop(self) -> None:
+        for runner in self._runners:
+            await runner.cleanup()
+        self._runners = []
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.stop()
+
+def add_site_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--pages', type=int, default=1000, help="number of pages in the site graph")
+    parser.add_argument('--fanout', type=int, default=10, help="links per page")
+    parser.add_argument('--page-size', type=int, default=20000, help="approximate bytes per page")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds each response is delayed")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of pages answering HTTP 500")
+    parser.add_argument('--hosts', type=int, default=1, help="number of loopback hosts serving the site")
+    parser.add_argument('--port', type=int, default=8900, help="port used on every host")
+    parser.add_argument('--seed', type=int, default=42, help="seed of the link graph")
+
+def site_from_args(args: argparse.Namespace) -> SyntheticSite:
+    return SyntheticSite(
+        pages=args.pages, fanout=args.fanout, page_size=args.page_size, latency=args.latency,
+        error_rate=args.error_rate, hosts=args.hosts, port=args.port, seed=args.seed
+    )
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve a synthetic site graph for crawl benchmarks.")
+    add_site_arguments(parser)
+    site = site_from_args(parser.parse_args())
+    print(f"Serving {site.pages} pages starting at {site.start_url}")
+    try:
+        asyncio.run(site.serve_forever())
+    except KeyboardInterrupt:
+        pass
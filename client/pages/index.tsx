@@ -32,13 +32,18 @@ export default function Dashboard() {
     // Connect to the WebSocket endpoint provided by the RealTimeMetricsPlugin.
     const ws = new WebSocket("ws://localhost:3001/ws/metrics");
     ws.onopen = () => console.log("WebSocket connected");
+    // The server sends full snapshots for its recent history, then only the
+    // fields that changed; merge each message onto the previous point.
+    let last: Metrics | null = null;
     ws.onmessage = (event) => {
-      const data: Metrics = JSON.parse(event.data);
+      const delta: Partial<Metrics> = JSON.parse(event.data);
+      const data: Metrics = { ...(last ?? {}), ...delta } as Metrics;
+      last = data;
       setMetrics((prev) => [...prev, data]);
-      if (data.errors > errorThreshold) {
+      if (delta.errors !== undefined && data.errors > errorThreshold) {
         toast.error(`Error rate spiked to ${data.errors}%!`);
       }
-      if (data.performance < performanceThreshold) {
+      if (delta.performance !== undefined && data.performance < performanceThreshold) {
         toast.warn(`Performance dipped to ${data.performance}%!`);
       }
     };
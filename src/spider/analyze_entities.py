@@ -1,44 +1,209 @@
+import argparse
 import json
+import logging
 from collections import Counter
-from sqlalchemy import create_engine, select, MetaData, Table
-from sqlalchemy.orm import sessionmaker
-from config import config
-
-engine = create_engine(config['database']['url'], echo=False)
-SessionLocal = sessionmaker(bind=engine)
-session = SessionLocal()
-
-# Create a MetaData instance and reflect the entities table.
-metadata = MetaData()
-entities_table = Table(
-    'entities',
-    metadata,
-    autoload_with=engine
+from datetime import datetime, time, timedelta, timezone
+from typing import Iterator, List, Optional, Sequence, Tuple
+from sqlalchemy import delete, desc, func, insert, select
+from spider.domain import get_domain_name
+from spider.plugins.entity_extraction import (
+    UNKNOWN_DAY, count_entities, entities_table, get_engine, label_counts_table, text_counts_table
 )
 
-def analyze_entities():
+# Rows fetched per round trip when streaming the entities table.
+STREAM_BATCH_SIZE = 1000
+
+def _entities(value) -> list:
+    # Older rows may hold the entity list as a JSON string.
+    return json.loads(value) if isinstance(value, str) else value or []
+
+def _aggregate_filters(table, since: Optional[datetime], until: Optional[datetime], domains: Sequence[str]) -> list:
+    # The aggregates are kept per day, so windows are widened to whole days.
+    filters = []
+    if since:
+        filters.append(table.c.day >= since.date())
+    if until:
+        filters.append(table.c.day <= until.date())
+    if domains:
+        filters.append(table.c.domain.in_(domains))
+    return filters
+
+def top_labels(since: Optional[datetime] = None, until: Optional[datetime] = None,
+               domains: Sequence[str] = (), top: int = 10) -> List[Tuple[str, int]]:
+    """
+    Most frequent entity labels, read from the incrementally maintained aggregates.
+
+    :param since: Start of the window (inclusive, whole days).
+    :param until: End of the window (inclusive, whole days).
+    :param domains: Only count pages of these domains.
+    :param top: Number of labels returned.
+    :return: ``(label, count)`` pairs, most frequent first.
+    """
+    total = func.sum(label_counts_table.c['count']).label('total')
+    query = (
+        select(label_counts_table.c.label, total)
+        .where(*_aggregate_filters(label_counts_table, since, until, domains))
+        .group_by(label_counts_table.c.label)
+        .having(total > 0)
+        .order_by(desc(total))
+        .limit(top)
+    )
+    with get_engine().connect() as conn:
+        return [(row.label, int(row.total)) for row in conn.execute(query)]
+
+def top_texts(since: Optional[datetime] = None, until: Optional[datetime] = None, domains: Sequence[str] = (),
+              top: int = 10, label: Optional[str] = None) -> List[Tuple[str, str, int]]:
+    """
+    Most frequent entities, read from the incrementally maintained aggregates.
+
+    :param label: Only count entities with this label.
+    :return: ``(text, label, count)`` triples, most frequent first.
+    """
+    filters = _aggregate_filters(text_counts_table, since, until, domains)
+    if label:
+        filters.append(text_counts_table.c.label == label)
+    total = func.sum(text_counts_table.c['count']).label('total')
+    query = (
+        select(text_counts_table.c.text, text_counts_table.c.label, total)
+        .where(*filters)
+        .group_by(text_counts_table.c.text, text_counts_table.c.label)
+        .having(total > 0)
+        .order_by(desc(total))
+        .limit(top)
+    )
+    with get_engine().connect() as conn:
+        return [(row.text, row.label, int(row.total)) for row in conn.execute(query)]
+
+def stream_entities(since: Optional[datetime] = None, until: Optional[datetime] = None, domains: Sequence[str] = (),
+                    batch_size: int = STREAM_BATCH_SIZE) -> Iterator[Tuple[str, list, Optional[str], Optional[datetime]]]:
+    """
+    Yield ``(url, entities, domain, extracted_at)`` for every extracted page in the
+    window, through a server-side cursor that holds ``batch_size`` rows at a time.
+
+    :param since: Start of the window (inclusive).
+    :param until: End of the window (exclusive).
+    :param domains: Only yield pages of these domains.
+    :param batch_size: Rows fetched per round trip.
     """
-    Query the entities table to compute the frequency of each entity label.
+    filters = []
+    if since:
+        filters.append(entities_table.c.extracted_at >= since)
+    if until:
+        filters.append(entities_table.c.extracted_at < until)
+    if domains:
+        filters.append(entities_table.c.domain.in_(domains))
+    query = select(
+        entities_table.c.url, entities_table.c.entities, entities_table.c.domain, entities_table.c.extracted_at
+    ).where(*filters)
+    with get_engine().connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(query)
+        for row in result:
+            yield row.url, _entities(row.entities), row.domain, row.extracted_at
+
+def stream_counts(since: Optional[datetime] = None, until: Optional[datetime] = None, domains: Sequence[str] = (),
+                  batch_size: int = STREAM_BATCH_SIZE) -> Tuple[Counter, Counter]:
     """
-    query = select(entities_table.c.entities)
-    results = session.execute(query).fetchall()
+    Count labels and ``(text, label)`` pairs by scanning the entities table. Slower than
+    the aggregates but exact for any window, and memory stays bounded by the number of
+    distinct entities rather than the number of pages.
 
-    # Create a counter for entity labels.
-    label_counter = Counter()
-    for row in results:
-        # Each row's 'entities' column is expected to be a JSON value (a list of entity dicts).
-        entities = row[0]
-        # If entities are stored as a JSON string, load them.
-        if isinstance(entities, str):
-            entities = json.loads(entities)
+    :return: The label counter and the ``(text, label)`` counter.
+    """
+    labels: Counter = Counter()
+    texts: Counter = Counter()
+    for _, entities, _, _ in stream_entities(since, until, domains, batch_size):
         for entity in entities:
             label = entity.get('label')
             if label:
-                label_counter[label] += 1
+                labels[label] += 1
+                texts[(entity.get('text', ''), label)] += 1
+    return labels, texts
+
+def rebuild_aggregates(batch_size: int = STREAM_BATCH_SIZE) -> int:
+    """
+    Recompute the aggregate tables from the entities table, e.g. after upgrading a
+    database whose entities were extracted before the aggregates existed.
+
+    :return: The number of pages counted.
+    """
+    counts: Tuple[Counter, Counter] = (Counter(), Counter())
+    pages = 0
+    for url, entities, domain, extracted_at in stream_entities(batch_size=batch_size):
+        day = extracted_at.date() if extracted_at else UNKNOWN_DAY
+        count_entities(counts, entities, day, domain or get_domain_name(url))
+        pages += 1
+    label_rows = [{'day': day, 'domain': domain, 'label': label, 'count': count}
+                  for (day, domain, label), count in counts[0].items()]
+    text_rows = [{'day': day, 'domain': domain, 'label': label, 'text': text, 'count': count}
+                 for (day, domain, label, text), count in counts[1].items()]
+    with get_engine().begin() as conn:
+        conn.execute(delete(label_counts_table))
+        conn.execute(delete(text_counts_table))
+        if label_rows:
+            conn.execute(insert(label_counts_table), label_rows)
+        if text_rows:
+            conn.execute(insert(text_counts_table), text_rows)
+    return pages
+
+def analyze_entities(since: Optional[datetime] = None, until: Optional[datetime] = None,
+                     domains: Sequence[str] = (), top: int = 10, texts: bool = False,
+                     label: Optional[str] = None, stream: bool = False) -> None:
+    """
+    Print the most frequent entity labels (and optionally entities) in a time window.
+
+    :param since: Start of the window.
+    :param until: End of the window.
+    :param domains: Only count pages of these domains.
+    :param top: Number of results printed.
+    :param texts: Also print the most frequent entities.
+    :param label: Only print entities with this label.
+    :param stream: Scan the entities table instead of reading the aggregates.
+    """
+    if stream:
+        label_counter, text_counter = stream_counts(since, until, domains)
+        labels = label_counter.most_common(top)
+        entities = [(text, entity_label, count) for (text, entity_label), count in text_counter.most_common()
+                    if not label or entity_label == label][:top]
+    else:
+        # The aggregates are per day; an exclusive end that is not midnight still counts its day.
+        last_day = until - timedelta(microseconds=1) if until else None
+        labels = top_labels(since, last_day, domains, top)
+        entities = top_texts(since, last_day, domains, top, label) if texts else []
+
+    print(f"Top {top} entity labels:")
+    for name, count in labels:
+        print(f"{name}: {count}")
+    if texts:
+        print(f"\nTop {top} entities{f' labelled {label}' if label else ''}:")
+        for text, entity_label, count in entities:
+            print(f"{text} ({entity_label}): {count}")
+
+def _parse_time(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    return parsed if isinstance(parsed, datetime) else datetime.combine(parsed, time())
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Report the most frequent named entities found by the crawler.")
+    parser.add_argument('--since', type=_parse_time, help="start of the window (UTC, YYYY-MM-DD or ISO datetime)")
+    parser.add_argument('--until', type=_parse_time, help="end of the window, exclusive (UTC)")
+    parser.add_argument('--days', type=int, help="window covering the last N days (instead of --since)")
+    parser.add_argument('--domain', action='append', default=[], help="only count pages of this domain (repeatable)")
+    parser.add_argument('--top', type=int, default=10, help="number of results")
+    parser.add_argument('--texts', action='store_true', help="also report the most frequent entities")
+    parser.add_argument('--label', help="only report entities with this label (implies --texts)")
+    parser.add_argument('--stream', action='store_true',
+                        help="scan the entities table instead of the aggregates (exact for sub-day windows)")
+    parser.add_argument('--rebuild', action='store_true', help="recompute the aggregate tables first")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-    print("Top 10 entity labels:")
-    for label, count in label_counter.most_common(10):
-        print(f"{label}: {count}")
+    if args.rebuild:
+        pages = rebuild_aggregates()
+        logging.info(f"Rebuilt entity aggregates from {pages} pages")
+    since = args.since
+    if args.days is not None:
+        since = datetime.combine(datetime.now(timezone.utc).date() - timedelta(days=args.days - 1), time())
+    analyze_entities(since, args.until, args.domain, args.top, args.texts or bool(args.label), args.label, args.stream)
 
 if __name__ == '__main__':
-    analyze_entities()
+    main()
@@ -0,0 +1,130 @@
+import hashlib
+import logging
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; bodies fall back to zlib.
+    zstandard = None
+
+ZLIB = 'zlib'
+ZSTD = 'zstd'
+
+def blob_hash(data: bytes) -> str:
+    """
+    Content address of a body: the hex SHA-256 of its bytes.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+class BlobCodec:
+    def __init__(self, compression: str = ZSTD, level: int = 3) -> None:
+        """
+        Compresses page bodies with zstd, optionally with a trained dictionary, or with
+        zlib when zstd is not installed or not requested.
+
+        Every payload is labelled with the codec that wrote it (``zlib``, ``zstd`` or
+        ``zstd:<dictionary id>``), so bodies written under different settings stay readable.
+
+        :param compression: ZSTD or ZLIB.
+        :param level: Compression level.
+        """
+        if compression == ZSTD and zstandard is None:
+            logging.warning("zstandard is not installed; compressing page bodies with zlib")
+            compression = ZLIB
+        self.compression = compression
+        self.level = int(level)
+        self.dictionaries: Dict[int, bytes] = {}
+        self.dictionary_id: Optional[int] = None
+        # zstd (de)compressors must not be shared between threads.
+        self._local = threading.local()
+
+    @property
+    def codec(self) -> str:
+        if self.compression != ZSTD:
+            return ZLIB
+        return f"{ZSTD}:{self.dictionary_id}" if self.dictionary_id is not None else ZSTD
+
+    def add_dictionary(self, dictionary_id: int, data: bytes, use: bool = True) -> None:
+        """
+        Register a zstd dictionary for decompression and, if ``use``, compress with it from now on.
+        """
+        self.dictionaries[dictionary_id] = data
+        if use and self.compression == ZSTD:
+            self.dictionary_id = dictionary_id
+
+    def _dictionary(self, codec: str) -> Optional['zstandard.ZstdCompressionDict']:
+        if ':' not in codec:
+            return None
+        data = self.dictionaries.get(int(codec.split(':', 1)[1]))
+        if data is None:
+            raise LookupError(f"Missing zstd dictionary for {codec}")
+        return zstandard.ZstdCompressionDict(data)
+
+    def compress(self, data: bytes) -> Tuple[str, bytes]:
+        """
+        :return: The codec label and the compressed payload.
+        """
+        codec = self.codec
+        if codec == ZLIB:
+            return ZLIB, zlib.compress(data, self.level if 0 <= self.level <= 9 else 6)
+        compressors = self._local.__dict__.setdefault('compressors', {})
+        compressor = compressors.get(codec)
+        if compressor is None:
+            dictionary = self._dictionary(codec)
+            compressor = compressors[codec] = zstandard.ZstdCompressor(level=self.level, dict_data=dictionary)
+        return codec, compressor.compress(data)
+
+    def decompress(self, codec: str, payload: bytes) -> bytes:
+        """
+        Decompress a payload written by any BlobCodec.
+
+        :raises LookupError: If the codec or its dictionary is unavailable.
+        """
+        if codec == ZLIB:
+            return zlib.decompress(payload)
+        if not codec.startswith(ZSTD) or zstandard is None:
+            raise LookupError(f"Cannot decompress {codec} blobs")
+        decompressors = self._local.__dict__.setdefault('decompressors', {})
+        decompressor = decompressors.get(codec)
+        if decompressor is None:
+            dictionary = self._dictionary(codec)
+            decompressor = decompressors[codec] = zstandard.ZstdDecompressor(dict_data=dictionary)
+        return decompressor.decompress(payload)
+
+class DictionaryTrainer:
+    def __init__(self, samples: int = 1000, size: int = 112640, max_sample_bytes: int = 65536) -> None:
+        """
+        Collects the first bodies of a crawl and trains a zstd dictionary from them.
+        Pages of one site share most of their markup, which a dictionary lets even
+        small bodies compress well.
+
+        :param samples: Bodies collected before training.
+        :param size: Dictionary size in bytes.
+        :param max_sample_bytes: Bytes of each body used as a sample.
+        """
+        self.samples_needed = max(int(samples), 1)
+        self.size = int(size)
+        self.max_sample_bytes = int(max_sample_bytes)
+        self.samples: List[bytes] = []
+        self.done = zstandard is None
+
+    def add(self, data: bytes) -> Optional[bytes]:
+        """
+        Add a sample; once enough are collected, train and return the dictionary.
+
+        :return: The dictionary bytes, or None while still collecting (or if training failed).
+        """
+        if self.done:
+            return None
+        self.samples.append(data[:self.max_sample_bytes])
+        if len(self.samples) < self.samples_needed:
+            return None
+        self.done = True
+        samples, self.samples = self.samples, []
+        try:
+            return zstandard.train_dictionary(self.size, samples).as_bytes()
+        except zstandard.ZstdError as e:
+            logging.warning(f"Could not train a zstd dictionary: {e}")
+            return None
@@ -0,0 +1,68 @@
+from functools import lru_cache
+from typing import Iterable, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from spider.config import config
+
+SCHEMES = frozenset(('http', 'https'))
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Query parameters that only track the visitor or the campaign; links differing only
+# in them lead to the same page.
+TRACKING_PARAMS = frozenset((
+    'gclid', 'dclid', 'gbraid', 'wbraid', 'fbclid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid',
+    '_ga', '_gl', '_hsenc', '_hsmi', 'mkt_tok', 'phpsessid', 'jsessionid',
+))
+TRACKING_PREFIXES = ('utm_',)
+
+_settings = config.get('canonical') or {}
+_strip_params = TRACKING_PARAMS | {name.lower() for name in _settings.get('strip_params') or ()}
+
+def _is_tracking(name: str) -> bool:
+    name = name.lower()
+    return name in _strip_params or name.startswith(TRACKING_PREFIXES)
+
+@lru_cache(maxsize=int(_settings.get('cache_size', 65536)))
+def canonicalize(url: str) -> Optional[str]:
+    """
+    Canonical form of a URL, used as its identity for dedupe, the frontier and storage:
+    lowercase scheme and host, IDNA-encoded host, no default port, no fragment, no
+    trailing slash, tracking parameters removed and the remaining query parameters
+    sorted. Results are cached, since pages of one site link to the same URLs again
+    and again.
+
+    :param url: An absolute URL.
+    :return: The canonical URL, or None for non-HTTP(S) and malformed URLs.
+    """
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    host = parts.hostname
+    if scheme not in SCHEMES or not host:
+        return None
+    host = host.rstrip('.')
+    if not host.isascii():
+        try:
+            host = host.encode('idna').decode('ascii')
+        except UnicodeError:
+            return None
+    if ':' in host:
+        host = f"[{host}]"
+    netloc = host if port is None or port == _DEFAULT_PORTS[scheme] else f"{host}:{port}"
+    if '@' in parts.netloc:
+        netloc = f"{parts.netloc.rpartition('@')[0]}@{netloc}"
+    query = parts.query
+    if query:
+        query = urlencode(sorted((name, value) for name, value in parse_qsl(query) if not _is_tracking(name)))
+    return urlunsplit((scheme, netloc, parts.path.rstrip('/'), query, ''))
+
+def canonicalize_links(links: Iterable[str]) -> List[str]:
+    """
+    Canonicalize a page's links, dropping unusable ones and duplicates (keeping order).
+
+    :param links: Absolute URLs.
+    :return: Distinct canonical URLs.
+    """
+    return list(dict.fromkeys(filter(None, map(canonicalize, links))))
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+from urllib.parse import urlparse
+
+# Responses that mean "slow down".
+BACKOFF_STATUSES = frozenset({429, 503})
+
+class HostLimit:
+    def __init__(self, limit: float) -> None:
+        """
+        Concurrency state of one host.
+
+        :param limit: Current number of requests allowed in flight (fractional while growing).
+        """
+        self.limit = limit
+        self.in_flight = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.last_decrease = 0.0
+
+class AdaptiveConcurrency:
+    def __init__(self, initial: int = 2, minimum: int = 1, maximum: int = 16,
+                 increase: float = 1.0, decrease: float = 0.5, target_latency: float = 2.0) -> None:
+        """
+        AIMD controller of per-host concurrency. Each fast, successful response grows a
+        host's limit by ``increase / limit`` (about ``increase`` per round of requests);
+        a 429, 503, timeout or error, or a response slower than ``target_latency``,
+        multiplies it by ``decrease``, at most once per second.
+
+        :param initial: Starting limit for a new host.
+        :param minimum: Lowest limit.
+        :param maximum: Highest limit.
+        :param increase: Additive increase per round of successful requests.
+        :param decrease: Multiplicative decrease factor on congestion.
+        :param target_latency: Seconds above which a response counts as congestion.
+        """
+        self.initial = float(initial)
+        self.minimum = float(max(minimum, 1))
+        self.maximum = float(max(maximum, minimum, 1))
+        self.increase = float(increase)
+        self.decrease = float(decrease)
+        self.target_latency = float(target_latency)
+        self.hosts: Dict[str, HostLimit] = {}
+
+    @staticmethod
+    def _host(url: str) -> str:
+        return (urlparse(url).hostname or '').lower()
+
+    def _state(self, host: str) -> HostLimit:
+        state = self.hosts.get(host)
+        if state is None:
+            state = HostLimit(min(max(self.initial, self.minimum), self.maximum))
+            self.hosts[host] = state
+        return state
+
+    def limit(self, url: str) -> int:
+        """
+        The whole number of requests currently allowed in flight for a URL's host.
+        """
+        return int(self._state(self._host(url)).limit)
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        """
+        Hold one of the host's concurrency slots for the duration of the block.
+
+        :param url: The URL about to be fetched.
+        """
+        state = self._state(self._host(url))
+        if state.in_flight >= int(state.limit) or state.waiters:
+            future = asyncio.get_running_loop().create_future()
+            state.waiters.append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # The slot was handed to us; pass it on.
+                    state.in_flight -= 1
+                    self._wake(state)
+                raise
+        else:
+            state.in_flight += 1
+        try:
+            yield
+        finally:
+            state.in_flight -= 1
+            self._wake(state)
+
+    def _wake(self, state: HostLimit) -> None:
+        while state.waiters and state.in_flight < int(state.limit):
+            future = state.waiters.popleft()
+            if not future.done():
+                state.in_flight += 1
+                future.set_result(None)
+
+    def record(self, url: str, latency: float, status: Optional[int] = None, error: bool = False) -> None:
+        """
+        Feed the outcome of a request back into the host's limit.
+
+        :param url: The fetched URL.
+        :param latency: Seconds the request took.
+        :param status: The HTTP status, if a response was received.
+        :param error: True for timeouts and connection errors.
+        """
+        host = self._host(url)
+        state = self._state(host)
+        congested = error or status in BACKOFF_STATUSES or latency > self.target_latency
+        if congested:
+            now = time.monotonic()
+            if now - state.last_decrease >= 1.0:
+                state.last_decrease = now
+                state.limit = max(self.minimum, state.limit * self.decrease)
+                logging.debug(f"Concurrency for {host} lowered to {state.limit:.2f}")
+        else:
+            state.limit = min(self.maximum, state.limit + self.increase / state.limit)
+            self._wake(state)
+
+def create_adaptive_concurrency(config: dict) -> Optional[AdaptiveConcurrency]:
+    """
+    Build the per-host controller from ``config['adaptive']``, or None if disabled.
+
+    :param config: Configuration dictionary.
+    """
+    settings = config.get('adaptive') or {}
+    if not settings.get('enabled', True):
+        return None
+    return AdaptiveConcurrency(
+        initial=int(settings.get('initial', 2)),
+        minimum=int(settings.get('min', 1)),
+        maximum=int(settings.get('max', 16)),
+        increase=float(settings.get('increase', 1.0)),
+        decrease=float(settings.get('decrease', 0.5)),
+        target_latency=float(settings.get('target_latency', 2.0))
+    )
@@ -19,6 +19,67 @@ def load_config(config_path: str = 'config.yaml') -> Dict[str, Any]:
     config['user_agent'] = os.getenv("CRAWLER_USER_AGENT", config.get('user_agent', "MyCrawler/1.0"))
     config['timeout'] = int(os.getenv("CRAWLER_TIMEOUT", config.get('timeout', 10)))
     config['start_url'] = os.getenv("CRAWLER_START_URL", config.get('start_url'))
+    config['database'] = config.get('database') or {}
+    config['database']['url'] = os.getenv("CRAWLER_DATABASE_URL", config['database'].get('url'))
+    config['fetch'] = config.get('fetch') or {}
+    config['fetch']['max_bytes'] = int(os.getenv("CRAWLER_MAX_BYTES", config['fetch'].get('max_bytes', 5 * 1024 * 1024)))
+    config['http'] = config.get('http') or {}
+    config['http']['limit'] = int(os.getenv("CRAWLER_HTTP_LIMIT", config['http'].get('limit', 100)))
+    config['http']['limit_per_host'] = int(os.getenv("CRAWLER_HTTP_LIMIT_PER_HOST", config['http'].get('limit_per_host', 16)))
+    config['adaptive'] = config.get('adaptive') or {}
+    config['concurrency'] = config.get('concurrency') or {}
+    for stage in ('fetch', 'parse', 'plugins'):
+        env = os.getenv(f"CRAWLER_{stage.upper()}_CONCURRENCY")
+        config['concurrency'][stage] = int(env or config['concurrency'].get(stage) or config['threads'])
+    config['plugins'] = config.get('plugins') or {}
+    timeout = os.getenv("CRAWLER_PLUGIN_TIMEOUT", config['plugins'].get('timeout', 30))
+    config['plugins']['timeout'] = float(timeout) if timeout is not None else None
+    enabled = os.getenv("CRAWLER_PLUGINS")
+    if enabled is not None:
+        config['plugins']['enabled'] = [name.strip() for name in enabled.split(',') if name.strip()]
+    else:
+        config['plugins']['enabled'] = config['plugins'].get('enabled', ['entities', 'metrics', 'dynamic_scraper', 'titles'])
+    config['entities'] = config.get('entities') or {}
+    config['entities']['processes'] = int(os.getenv("CRAWLER_NLP_PROCESSES", config['entities'].get('processes', 2)))
+    config['parse'] = config.get('parse') or {}
+    config['parse']['processes'] = int(os.getenv("CRAWLER_PARSE_PROCESSES", config['parse'].get('processes', 2)))
+    config['warc'] = config.get('warc') or {}
+    config['warc']['enabled'] = os.getenv("CRAWLER_WARC", str(config['warc'].get('enabled', False))).lower() in ('1', 'true', 'yes')
+    config['warc']['directory'] = os.getenv("CRAWLER_WARC_DIR", config['warc'].get('directory', 'warc'))
+    config['storage'] = config.get('storage') or {}
+    config['storage']['batch_size'] = int(os.getenv("CRAWLER_STORAGE_BATCH_SIZE", config['storage'].get('batch_size', 500)))
+    config['storage']['flush_interval'] = float(os.getenv("CRAWLER_STORAGE_FLUSH_INTERVAL", config['storage'].get('flush_interval', 1.0)))
+    config['storage']['max_pending'] = int(config['storage'].get('max_pending', 5000))
+    config['storage']['body_mode'] = os.getenv("CRAWLER_BODY_MODE", config['storage'].get('body_mode', 'inline'))
+    config['recrawl'] = config.get('recrawl') or {}
+    config['recrawl']['conditional'] = os.getenv("CRAWLER_CONDITIONAL_GET", str(config['recrawl'].get('conditional', True))).lower() in ('1', 'true', 'yes')
+    config['robots'] = config.get('robots') or {}
+    config['robots']['enabled'] = os.getenv("CRAWLER_OBEY_ROBOTS", str(config['robots'].get('enabled', True))).lower() in ('1', 'true', 'yes')
+    config['sitemaps'] = config.get('sitemaps') or {}
+    config['sitemaps']['enabled'] = os.getenv("CRAWLER_SITEMAPS", str(config['sitemaps'].get('enabled', True))).lower() in ('1', 'true', 'yes')
+    config['scope'] = config.get('scope') or {}
+    config['scope']['same_site'] = os.getenv("CRAWLER_SAME_SITE", str(config['scope'].get('same_site', True))).lower() in ('1', 'true', 'yes')
+    config['near_duplicates'] = config.get('near_duplicates') or {}
+    config['near_duplicates']['enabled'] = os.getenv("CRAWLER_NEAR_DUPLICATES", str(config['near_duplicates'].get('enabled', True))).lower() in ('1', 'true', 'yes')
+    config['dedupe'] = config.get('dedupe') or {}
+    config['dedupe']['backend'] = os.getenv("CRAWLER_DEDUPE_BACKEND", config['dedupe'].get('backend', 'fingerprint'))
+    config['dedupe']['memory_budget_mb'] = float(os.getenv("CRAWLER_DEDUPE_MEMORY_MB", config['dedupe'].get('memory_budget_mb', 256)))
+    config['dedupe']['path'] = os.getenv("CRAWLER_DEDUPE_PATH", config['dedupe'].get('path'))
+    config['frontier'] = config.get('frontier') or {}
+    config['frontier']['backend'] = os.getenv("CRAWLER_FRONTIER_BACKEND", config['frontier'].get('backend', 'priority'))
+    for budget in ('max_depth', 'max_pages', 'domain_budget'):
+        value = os.getenv(f"CRAWLER_{budget.upper()}", config['frontier'].get(budget))
+        config['frontier'][budget] = int(value) if value not in (None, '') else None
+    config['frontier']['path'] = os.getenv("CRAWLER_FRONTIER_PATH", config['frontier'].get('path', 'crawl_frontier.db'))
+    config['frontier']['checkpoint_interval'] = float(config['frontier'].get('checkpoint_interval', 30))
+    config['distributed'] = config.get('distributed') or {}
+    config['distributed']['shards'] = int(os.getenv("CRAWLER_SHARDS", config['distributed'].get('shards', 4)))
+    config['distributed']['queue_prefix'] = config['distributed'].get('queue_prefix', 'crawl')
+    config['distributed']['redis_url'] = os.getenv("CRAWLER_REDIS_URL", config['distributed'].get('redis_url'))
+    config['politeness'] = config.get('politeness') or {}
+    config['politeness']['per_ip'] = os.getenv("CRAWLER_POLITENESS_PER_IP", str(config['politeness'].get('per_ip', False))).lower() in ('1', 'true', 'yes')
+    config['politeness']['burst'] = int(config['politeness'].get('burst', 1))
+    config['politeness']['domains'] = config['politeness'].get('domains') or {}
     return config
 
 config = load_config()
@@ -0,0 +1,81 @@
+import logging
+import threading
+from typing import Dict, Iterable, Optional, Set, Tuple
+from sqlalchemy import create_engine, inspect, text, MetaData, Table
+from sqlalchemy.engine import Engine
+from spider.config import config
+
+# One engine (and so one connection pool) per database URL, shared by every module.
+_engines: Dict[str, Engine] = {}
+# (database URL, id of the MetaData) pairs whose tables exist in this process.
+_schemas: Set[Tuple[str, int]] = set()
+_lock = threading.RLock()
+
+def get_engine(url: Optional[str] = None) -> Engine:
+    """
+    Return the shared engine for a database, creating it on first use. No connection is
+    opened until the engine is used.
+
+    :param url: The database URL; defaults to ``config['database']['url']``.
+    :return: The Engine.
+    """
+    url = url or config['database']['url']
+    engine = _engines.get(url)
+    if engine is None:
+        with _lock:
+            engine = _engines.get(url)
+            if engine is None:
+                settings = config.get('database') or {}
+                options = {}
+                if not url.startswith('sqlite'):
+                    options = {
+                        'pool_size': int(settings.get('pool_size', 5)),
+                        'max_overflow': int(settings.get('max_overflow', 10)),
+                        'pool_pre_ping': True,
+                    }
+                engine = _engines[url] = create_engine(url, echo=False, **options)
+    return engine
+
+def add_missing_columns(engine: Engine, table: Table) -> None:
+    """
+    Add nullable columns that were introduced after the table was first created.
+    """
+    existing = {c['name'] for c in inspect(engine).get_columns(table.name)}
+    with engine.begin() as conn:
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                logging.info(f"Added column {table.name}.{column.name}")
+
+def ensure_schema(metadata: MetaData, migrate: Iterable[Table] = (), url: Optional[str] = None) -> Engine:
+    """
+    Create the tables of ``metadata`` (and add missing columns to the ``migrate``
+    tables) the first time it is used in this process, then return the shared engine.
+    Later calls only cost a set lookup, so call it wherever the tables are needed.
+
+    :param metadata: The MetaData holding the tables.
+    :param migrate: Tables that may predate some of their nullable columns.
+    :param url: The database URL; defaults to ``config['database']['url']``.
+    :return: The Engine.
+    """
+    engine = get_engine(url)
+    key = (str(engine.url), id(metadata))
+    if key not in _schemas:
+        with _lock:
+            if key not in _schemas:
+                metadata.create_all(engine)
+                for table in migrate:
+                    add_missing_columns(engine, table)
+                _schemas.add(key)
+    return engine
+
+def dispose_engines(close: bool = False) -> None:
+    """
+    Drop every pooled connection, e.g. in a forked worker that inherited the parent's
+    pools. By default the connections are abandoned rather than closed, since the
+    parent process still uses them.
+    """
+    with _lock:
+        for engine in _engines.values():
+            engine.dispose(close=close)
@@ -0,0 +1,358 @@
+import asyncio
+import logging
+import math
+import os
+import struct
+import threading
+from array import array
+from hashlib import blake2b
+from typing import Optional, Tuple
+
+_MAGIC = b'SPDRVIS1'
+# count, table capacity, bloom bits, bloom hashes, bloom-only flag
+_HEADER = struct.Struct('<QQQIB')
+_MAX_LOAD = 0.7
+# Slots of the old table moved per add while a FingerprintSet grows; with the new
+# table twice as large, migration ends long before it fills up.
+_MIGRATE_STEP = 16
+
+def url_fingerprint(url: str) -> int:
+    """
+    Compute a non-zero 64-bit fingerprint of a URL.
+
+    :param url: The (normalized) URL.
+    :return: The fingerprint as an int.
+    """
+    fp = int.from_bytes(blake2b(url.encode('utf-8'), digest_size=8).digest(), 'little')
+    # Zero marks an empty slot in FingerprintSet.
+    return fp or 1
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.001, max_bytes: Optional[int] = None) -> None:
+        """
+        A Bloom filter over 64-bit fingerprints using double hashing.
+
+        :param capacity: Expected number of items.
+        :param error_rate: Target false-positive rate at ``capacity`` items.
+        :param max_bytes: Optional upper bound on the bit array size.
+        """
+        bits = int(-capacity * math.log(error_rate) / (math.log(2) ** 2)) or 8
+        if max_bytes:
+            bits = min(bits, max_bytes * 8)
+        self.size = max(bits, 8)
+        self.hashes = max(int(round(self.size / max(capacity, 1) * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, fp: int):
+        h1 = fp & 0xFFFFFFFF
+        h2 = (fp >> 32) | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, fp: int) -> None:
+        for pos in self._positions(fp):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, fp: int) -> bool:
+        bits = self.bits
+        for pos in self._positions(fp):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+class FingerprintSet:
+    def __init__(self, capacity: int = 1024) -> None:
+        """
+        An open-addressing hash set of 64-bit fingerprints stored in a flat array
+        (8 bytes per slot, linear probing).
+
+        Growing the table is incremental: resize() allocates the larger table and every
+        later add() moves a few slots of the old one, so no single add rehashes the set.
+
+        :param capacity: Initial number of slots; rounded up to a power of two.
+        """
+        size = 1
+        while size < max(capacity, 8):
+            size <<= 1
+        self.table = array('Q', bytes(8 * size))
+        self.mask = size - 1
+        self.count = 0
+        # The table being migrated by a resize, and how many of its slots were moved.
+        self.old: Optional[array] = None
+        self.moved = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.mask + 1
+
+    @property
+    def nbytes(self) -> int:
+        return self.capacity * 8
+
+    @staticmethod
+    def _find(table: array, mask: int, fp: int) -> int:
+        i = fp & mask
+        while True:
+            value = table[i]
+            if value == 0 or value == fp:
+                return i
+            i = (i + 1) & mask
+
+    def _slot(self, fp: int) -> int:
+        return self._find(self.table, self.mask, fp)
+
+    def __contains__(self, fp: int) -> bool:
+        if self.table[self._slot(fp)] == fp:
+            return True
+        old = self.old
+        return old is not None and old[self._find(old, len(old) - 1, fp)] == fp
+
+    def __len__(self) -> int:
+        return self.count
+
+    def needs_resize(self) -> bool:
+        return self.count + 1 > self.capacity * _MAX_LOAD
+
+    def add(self, fp: int) -> bool:
+        """
+        Insert a fingerprint.
+
+        :return: True if it was not present before.
+        """
+        if self.old is not None:
+            if fp in self:
+                return False
+            self._migrate(_MIGRATE_STEP)
+        i = self._slot(fp)
+        if self.table[i] == fp:
+            return False
+        self.table[i] = fp
+        self.count += 1
+        return True
+
+    def _migrate(self, slots: int) -> None:
+        old, table = self.old, self.table
+        end = min(self.moved + slots, len(old))
+        for i in range(self.moved, end):
+            fp = old[i]
+            if fp:
+                table[self._slot(fp)] = fp
+        self.moved = end
+        if end == len(old):
+            self.old = None
+
+    def resize(self, capacity: int) -> None:
+        """
+        Switch to a table of ``capacity`` slots; the current entries move over during
+        the following adds.
+        """
+        if self.old is not None:
+            self._migrate(len(self.old))
+        size = 1
+        while size < max(capacity, 8):
+            size <<= 1
+        self.old = self.table
+        self.moved = 0
+        self.table = array('Q', bytes(8 * size))
+        self.mask = size - 1
+
+    def entries(self) -> Tuple[array, Optional[array]]:
+        """
+        Copies of the table and of the table still being migrated, if any.
+        """
+        return array('Q', self.table), array('Q', self.old) if self.old is not None else None
+
+class VisitedIndex:
+    def __init__(self, expected_items: int = 1_000_000, memory_budget_mb: float = 256,
+                 bloom: bool = True, error_rate: float = 0.001, path: Optional[str] = None) -> None:
+        """
+        Memory-compact set of seen URLs keyed by 64-bit fingerprints, optionally fronted
+        by a Bloom filter. Behaves like a set of URL strings for ``in``, ``add`` and ``len``.
+
+        When the fingerprint table would outgrow the memory budget and a Bloom filter is
+        enabled, the index stops growing the table and answers from the filter alone,
+        accepting its false-positive rate instead of running out of memory.
+
+        :param expected_items: Expected number of URLs; sizes the Bloom filter.
+        :param memory_budget_mb: Memory budget for the filter and table together.
+        :param bloom: Whether to front the table with a Bloom filter.
+        :param error_rate: Bloom filter false-positive rate at ``expected_items``.
+        :param path: File used by save() and to resume a previous crawl.
+        """
+        self.budget = int(memory_budget_mb * 1024 * 1024)
+        self.path = path
+        self.bloom = BloomFilter(expected_items, error_rate, max_bytes=self.budget // 4) if bloom else None
+        # The table starts small and doubles as URLs are added, so short crawls stay small.
+        self.fingerprints = FingerprintSet(min(1024, self._table_budget() // 8))
+        self.bloom_only = False
+        self.count = 0
+        self._warned = False
+        # A save still running in a thread when the next one starts must not share its temp file.
+        self._save_lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def _table_budget(self) -> int:
+        return self.budget - (len(self.bloom.bits) if self.bloom else 0)
+
+    def __contains__(self, url: str) -> bool:
+        fp = url_fingerprint(url)
+        if self.bloom is not None:
+            if fp not in self.bloom:
+                return False
+            if self.bloom_only:
+                return True
+        return fp in self.fingerprints
+
+    def add(self, url: str) -> bool:
+        """
+        Mark a URL as seen.
+
+        :param url: The (normalized) URL.
+        :return: True if the URL had not been seen before.
+        """
+        fp = url_fingerprint(url)
+        if self.bloom is not None:
+            if fp not in self.bloom:
+                self.bloom.add(fp)
+                if not self.bloom_only:
+                    self._add_fingerprint(fp)
+                self.count += 1
+                return True
+            if self.bloom_only:
+                return False
+        if fp in self.fingerprints:
+            return False
+        self._add_fingerprint(fp)
+        self.count += 1
+        return True
+
+    def _add_fingerprint(self, fp: int) -> None:
+        table = self.fingerprints
+        if table.needs_resize():
+            if table.nbytes * 2 > self._table_budget():
+                if self.bloom is not None:
+                    logging.warning("Visited index reached its memory budget; continuing with the Bloom filter only")
+                    self.bloom_only = True
+                    self.fingerprints = FingerprintSet(8)
+                    return
+                if not self._warned:
+                    logging.warning("Visited index exceeds its memory budget; enable the Bloom filter to cap memory")
+                    self._warned = True
+            table.resize(table.capacity * 2)
+        table.add(fp)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _snapshot(self) -> Tuple[bytes, array, Optional[array], Optional[bytes]]:
+        # The table is copied before the Bloom filter: every fingerprint is added to the
+        # filter first, so the copies stay consistent even if adds happen in between.
+        table, old = self.fingerprints.entries()
+        bits = bytes(self.bloom.bits) if self.bloom is not None else None
+        header = _HEADER.pack(self.count, len(table), self.bloom.size if self.bloom else 0,
+                              self.bloom.hashes if self.bloom else 0, int(self.bloom_only))
+        return header, table, old, bits
+
+    def _write(self, path: str, snapshot: Tuple[bytes, array, Optional[array], Optional[bytes]]) -> None:
+        header, table, old, bits = snapshot
+        if old is not None:
+            # Finish a resize in progress on the copy, off the event loop.
+            for fp in old:
+                if fp:
+                    table[FingerprintSet._find(table, len(table) - 1, fp)] = fp
+        tmp_path = f"{path}.tmp"
+        with self._save_lock:
+            with open(tmp_path, 'wb') as f:
+                f.write(_MAGIC)
+                f.write(header)
+                table.tofile(f)
+                if bits is not None:
+                    f.write(bits)
+            os.replace(tmp_path, path)
+
+    def save(self, path: Optional[str] = None) -> None:
+        """
+        Persist the index atomically so a crawl can resume from it.
+
+        :param path: Target file; defaults to the path given at construction.
+        """
+        path = path or self.path
+        if not path:
+            return
+        self._write(path, self._snapshot())
+        logging.debug(f"Saved visited index ({len(self)} fingerprints) to {path}")
+
+    async def save_async(self, path: Optional[str] = None) -> None:
+        """
+        Like save(), but only the in-memory copy is taken on the event loop; the file is
+        written in a worker thread, so fetches keep running during large checkpoints.
+
+        :param path: Target file; defaults to the path given at construction.
+        """
+        path = path or self.path
+        if not path:
+            return
+        await asyncio.to_thread(self._write, path, self._snapshot())
+        logging.debug(f"Saved visited index ({len(self)} fingerprints) to {path}")
+
+    def load(self, path: str) -> None:
+        """
+        Load an index written by save().
+
+        :param path: The file to read.
+        """
+        with open(path, 'rb') as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"{path} is not a visited index file")
+            count, capacity, bloom_bits, bloom_hashes, bloom_only = _HEADER.unpack(f.read(_HEADER.size))
+            table = array('Q')
+            table.fromfile(f, capacity)
+            self.fingerprints = FingerprintSet(8)
+            self.fingerprints.table = table
+            self.fingerprints.mask = capacity - 1
+            self.fingerprints.count = capacity - table.count(0)
+            self.count = count
+            if bloom_bits:
+                self.bloom = BloomFilter(1)
+                self.bloom.size = bloom_bits
+                self.bloom.hashes = bloom_hashes
+                self.bloom.bits = bytearray(f.read((bloom_bits + 7) // 8))
+            else:
+                self.bloom = None
+            self.bloom_only = bool(bloom_only)
+        logging.info(f"Loaded visited index with {count} fingerprints from {path}")
+
+class SetIndex(set):
+    """
+    Plain in-memory set of URL strings with the VisitedIndex interface.
+    """
+    def add(self, url: str) -> bool:
+        if url in self:
+            return False
+        super().add(url)
+        return True
+
+    def save(self, path: Optional[str] = None) -> None:
+        pass
+
+    async def save_async(self, path: Optional[str] = None) -> None:
+        pass
+
+def create_visited_index(config: dict):
+    """
+    Build the visited-URL index selected by ``config['dedupe']['backend']``.
+
+    :param config: Configuration dictionary.
+    :return: A VisitedIndex or SetIndex.
+    """
+    settings = config.get('dedupe') or {}
+    if settings.get('backend', 'fingerprint') == 'set':
+        return SetIndex()
+    return VisitedIndex(
+        expected_items=int(settings.get('expected_urls', 1_000_000)),
+        memory_budget_mb=float(settings.get('memory_budget_mb', 256)),
+        bloom=bool(settings.get('bloom', True)),
+        error_rate=float(settings.get('error_rate', 0.001)),
+        path=settings.get('path')
+    )
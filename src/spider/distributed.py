@@ -0,0 +1,147 @@
+from hashlib import blake2b
+from typing import Callable, List, Optional
+from urllib.parse import urlparse
+from spider.dedupe import url_fingerprint
+from spider.scheduler import HostScheduler
+
+def shard_for(url: str, shards: int) -> int:
+    """
+    Map a URL to a shard by a stable hash of its host, so every URL of a host is
+    crawled by the same set of workers.
+
+    :param url: The URL.
+    :param shards: Number of shards.
+    :return: The shard number in ``range(shards)``.
+    """
+    host = (urlparse(url).hostname or '').lower()
+    digest = blake2b(host.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') % max(shards, 1)
+
+def queue_for(url: str, config: dict) -> str:
+    """
+    Return the Celery queue that handles a URL's host.
+
+    :param url: The URL.
+    :param config: Configuration dictionary; reads ``distributed.shards`` and ``distributed.queue_prefix``.
+    :return: The queue name, e.g. ``crawl.3``.
+    """
+    settings = config.get('distributed') or {}
+    return f"{settings.get('queue_prefix', 'crawl')}.{shard_for(url, int(settings.get('shards', 4)))}"
+
+class RedisVisitedIndex:
+    def __init__(self, client, key: str = 'spider:seen') -> None:
+        """
+        Seen-URL index shared between machines: a Redis set of 64-bit URL fingerprints.
+
+        :param client: A redis.Redis-compatible client.
+        :param key: The Redis key of the set.
+        """
+        self.client = client
+        self.key = key
+
+    @staticmethod
+    def _member(url: str) -> bytes:
+        return url_fingerprint(url).to_bytes(8, 'little')
+
+    def add(self, url: str) -> bool:
+        """
+        Atomically mark a URL as seen.
+
+        :return: True if no worker had seen the URL before.
+        """
+        return bool(self.client.sadd(self.key, self._member(url)))
+
+    def __contains__(self, url: str) -> bool:
+        return bool(self.client.sismember(self.key, self._member(url)))
+
+    def __len__(self) -> int:
+        return int(self.client.scard(self.key))
+
+    def save(self, path: Optional[str] = None) -> None:
+        pass
+
+    async def save_async(self, path: Optional[str] = None) -> None:
+        pass
+
+class RedisPoliteness:
+    def __init__(self, client, config: dict, prefix: str = 'spider:polite') -> None:
+        """
+        Per-host politeness shared between machines. Each fetch takes a Redis lease on
+        its host that expires after the host's delay.
+
+        :param client: A redis.Redis-compatible client.
+        :param config: Configuration dictionary; delays come from ``rate_limit`` and ``politeness``.
+        :param prefix: Prefix of the per-host lease keys.
+        """
+        self.client = client
+        self.prefix = prefix
+        self.settings = HostScheduler(config)
+
+    def acquire(self, url: str) -> float:
+        """
+        Try to take the host's lease.
+
+        :param url: The URL about to be fetched.
+        :return: 0 if the lease was taken, otherwise seconds until it can be retried.
+        """
+        host = (urlparse(url).hostname or '').lower()
+        delay_ms = int(float(self.settings.settings_for(host)['rate_limit']) * 1000)
+        if delay_ms <= 0:
+            return 0.0
+        key = f"{self.prefix}:{host}"
+        if self.client.set(key, 1, nx=True, px=delay_ms):
+            return 0.0
+        ttl = self.client.pttl(key)
+        return max(ttl, 1) / 1000.0
+
+class CeleryFrontier:
+    def __init__(self, dispatch: Callable[[str], None]) -> None:
+        """
+        Frontier that hands new URLs to Celery tasks on their host's shard queue instead
+        of queueing them locally. URLs are collected while the page is processed and
+        sent by flush() once the task's event loop has finished, which also lets eager
+        (in-process) Celery run the follow-up tasks.
+
+        :param dispatch: Callable that sends one URL to the workers.
+        """
+        self.dispatch = dispatch
+        self.pending: List[str] = []
+        self.sent = 0
+
+    def put_nowait(self, url: str, parent: Optional[str] = None, anchor: Optional[str] = None,
+                   lastmod: Optional[float] = None) -> None:
+        self.pending.append(url)
+
+    async def put(self, url: str, parent: Optional[str] = None, anchor: Optional[str] = None,
+                  lastmod: Optional[float] = None) -> None:
+        self.put_nowait(url)
+
+    def note_inlink(self, url: str) -> None:
+        pass
+
+    def qsize(self) -> int:
+        return len(self.pending)
+
+    def empty(self) -> bool:
+        return not self.pending
+
+    def task_done(self, url: Optional[str] = None) -> None:
+        pass
+
+    def checkpoint(self) -> None:
+        pass
+
+    async def checkpoint_async(self) -> None:
+        pass
+
+    def flush(self) -> None:
+        """
+        Dispatch every collected URL.
+        """
+        pending, self.pending = self.pending, []
+        for url in pending:
+            self.dispatch(url)
+            self.sent += 1
+
+    def close(self) -> None:
+        pass
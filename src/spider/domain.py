@@ -1,15 +1,15 @@
 from urllib.parse import urlparse
+from spider.scope import load_public_suffix_list
 
 def get_domain_name(url: str) -> str:
     """
-    Extract the main domain name from a URL.
+    Extract the registered domain of a URL's host, using the Public Suffix List.
 
     :param url: The URL to process.
-    :return: The domain name (e.g., example.com).
+    :return: The domain name (e.g., example.com, or bbc.co.uk for www.bbc.co.uk).
     """
     try:
-        results = get_sub_domain_name(url).split('.')
-        return results[-2] + '.' + results[-1]
+        return load_public_suffix_list().registered_domain(urlparse(url).hostname or '')
     except Exception:
         return ''
 
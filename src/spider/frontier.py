@@ -0,0 +1,509 @@
+import asyncio
+import fnmatch
+import heapq
+import itertools
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, List, Mapping, Optional, Pattern, Tuple
+from spider.domain import get_domain_name
+
+class MemoryFrontier(asyncio.Queue):
+    """
+    In-memory FIFO frontier: an asyncio.Queue with the frontier interface.
+    """
+    def put_nowait(self, url: str, parent: Optional[str] = None, anchor: Optional[str] = None,
+                   lastmod: Optional[float] = None) -> None:
+        super().put_nowait(url)
+
+    async def put(self, url: str, parent: Optional[str] = None, anchor: Optional[str] = None,
+                  lastmod: Optional[float] = None) -> None:
+        await super().put(url)
+
+    def note_inlink(self, url: str) -> None:
+        pass
+
+    def task_done(self, url: Optional[str] = None) -> None:
+        super().task_done()
+
+    def checkpoint(self) -> None:
+        pass
+
+    async def checkpoint_async(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+class DiskFrontier:
+    def __init__(self, path: str, hot_size: int = 1000, write_batch: int = 500) -> None:
+        """
+        FIFO frontier persisted in a SQLite file. Only a window of ``hot_size`` URLs and
+        small write/delete batches are kept in memory, so memory stays flat no matter how
+        many URLs are queued.
+
+        A URL's row is deleted only once it has been processed (task_done). Changes are
+        committed by checkpoint(); after a crash or restart every URL that was not
+        completed at the last checkpoint, including those in flight, is queued again.
+
+        :param path: The SQLite file holding the frontier.
+        :param hot_size: Number of URLs read from disk at a time.
+        :param write_batch: Pending inserts or deletes that trigger a write to disk.
+        """
+        self.path = path
+        self.hot_size = max(int(hot_size), 1)
+        self.write_batch = max(int(write_batch), 1)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS frontier (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL)")
+        self.conn.commit()
+        self._hot: Deque[Tuple[int, str]] = deque()
+        self._writes: List[Tuple[str]] = []
+        self._done: List[Tuple[int]] = []
+        self._leased: Dict[str, List[int]] = {}
+        self._last_loaded = 0
+        self._size = self.conn.execute("SELECT COUNT(*) FROM frontier").fetchone()[0]
+        self._unfinished = self._size
+        self._not_empty = asyncio.Event()
+        self._finished = asyncio.Event()
+        if self._size:
+            logging.info(f"Resuming frontier with {self._size} queued URLs from {path}")
+            self._not_empty.set()
+        else:
+            self._finished.set()
+
+    def qsize(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return self._size == 0
+
+    def put_nowait(self, url: str, parent: Optional[str] = None, anchor: Optional[str] = None,
+                   lastmod: Optional[float] = None) -> None:
+        self._writes.append((url,))
+        self._size += 1
+        self._unfinished += 1
+        self._finished.clear()
+        self._not_empty.set()
+        if len(self._writes) >= self.write_batch:
+            self._flush_writes()
+
+    async def put(self, url: str, parent: Optional[str] = None, anchor: Optional[str] = None,
+                  lastmod: Optional[float] = None) -> None:
+        self.put_nowait(url)
+
+    def note_inlink(self, url: str) -> None:
+        pass
+
+    def get_nowait(self) -> str:
+        if self._size == 0:
+            raise asyncio.QueueEmpty
+        if not self._hot:
+            self._refill()
+        row_id, url = self._hot.popleft()
+        self._leased.setdefault(url, []).append(row_id)
+        self._size -= 1
+        return url
+
+    async def get(self) -> str:
+        while self._size == 0:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        return self.get_nowait()
+
+    def task_done(self, url: Optional[str] = None) -> None:
+        """
+        Mark a URL returned by get() as processed.
+
+        :param url: The URL; required so its row can be removed from disk.
+        """
+        if self._unfinished <= 0:
+            raise ValueError("task_done() called too many times")
+        ids = self._leased.get(url)
+        if ids:
+            self._done.append((ids.pop(0),))
+            if not ids:
+                del self._leased[url]
+            if len(self._done) >= self.write_batch:
+                self._flush_done()
+        self._unfinished -= 1
+        if self._unfinished == 0:
+            self._finished.set()
+
+    async def join(self) -> None:
+        await self._finished.wait()
+
+    def _flush_writes(self) -> None:
+        if self._writes:
+            self.conn.executemany("INSERT INTO frontier (url) VALUES (?)", self._writes)
+            self._writes = []
+
+    def _flush_done(self) -> None:
+        if self._done:
+            self.conn.executemany("DELETE FROM frontier WHERE id = ?", self._done)
+            self._done = []
+
+    def _refill(self) -> None:
+        self._flush_writes()
+        rows = self.conn.execute(
+            "SELECT id, url FROM frontier WHERE id > ? ORDER BY id LIMIT ?",
+            (self._last_loaded, self.hot_size)
+        ).fetchall()
+        if rows:
+            self._last_loaded = rows[-1][0]
+        self._hot.extend(rows)
+
+    def checkpoint(self) -> None:
+        """
+        Write pending inserts and deletes and commit them.
+        """
+        self._flush_writes()
+        self._flush_done()
+        self.conn.commit()
+        logging.debug(f"Frontier checkpoint: {self._size} queued, {len(self._leased)} in flight")
+
+    async def checkpoint_async(self) -> None:
+        # The connection belongs to the event loop's thread, and a commit is small.
+        self.checkpoint()
+
+    def close(self) -> None:
+        """
+        Checkpoint and close the database.
+        """
+        self.checkpoint()
+        self.conn.close()
+
+class UrlScorer:
+    def __init__(self, depth: float = -1.0, inlinks: float = 0.5, freshness: float = 2.0, half_life: float = 30.0,
+                 url_patterns: Optional[Mapping[str, float]] = None,
+                 anchor_terms: Optional[Mapping[str, float]] = None) -> None:
+        """
+        Scores URLs for best-first crawling; higher scores are fetched first.
+
+        The score adds ``depth`` per link hop from a seed, ``inlinks`` times log2(1 +
+        links seen to the URL while it waited), the weight of every ``url_patterns`` glob
+        the URL matches and of every ``anchor_terms`` word in its anchor text, and a
+        ``freshness`` bonus for a sitemap lastmod that halves every ``half_life`` days.
+
+        :param depth: Weight per hop; negative values favour shallow pages.
+        :param inlinks: Weight of the inlink term.
+        :param freshness: Bonus for a page modified just now.
+        :param half_life: Days after which the freshness bonus has halved.
+        :param url_patterns: URL glob -> weight, e.g. ``{"*/docs/*": 2, "*?page=*": -1}``.
+        :param anchor_terms: Lowercase word -> weight, e.g. ``{"pricing": 2}``.
+        """
+        self.depth = float(depth)
+        self.inlinks = float(inlinks)
+        self.freshness = float(freshness)
+        self.half_life = max(float(half_life), 1e-3) * 86400
+        # Patterns sharing a weight are compiled into one regex.
+        by_weight: Dict[float, List[str]] = {}
+        for pattern, weight in (url_patterns or {}).items():
+            by_weight.setdefault(float(weight), []).append(fnmatch.translate(pattern))
+        self.url_patterns: List[Tuple[Pattern, float]] = [
+            (re.compile('|'.join(f"(?:{regex})" for regex in regexes)), weight)
+            for weight, regexes in by_weight.items()
+        ]
+        self.anchor_terms = {term.lower(): float(weight) for term, weight in (anchor_terms or {}).items()}
+
+    def static_score(self, url: str, depth: int, anchor: Optional[str] = None, lastmod: Optional[float] = None) -> float:
+        """
+        The part of the score that does not change while the URL waits.
+        """
+        score = self.depth * depth
+        for regex, weight in self.url_patterns:
+            if regex.match(url):
+                score += weight
+        if anchor and self.anchor_terms:
+            words = set(anchor.lower().split())
+            score += sum(weight for term, weight in self.anchor_terms.items() if term in words)
+        if lastmod is not None and self.freshness:
+            age = max(time.time() - lastmod, 0.0)
+            score += self.freshness * 0.5 ** (age / self.half_life)
+        return score
+
+    def score(self, static: float, inlinks: int) -> float:
+        return static + self.inlinks * math.log2(1 + inlinks)
+
+class PriorityFrontier:
+    def __init__(self, scorer: Optional[UrlScorer] = None, max_depth: Optional[int] = None,
+                 max_pages: Optional[int] = None, domain_budget: Optional[int] = None,
+                 domain_budgets: Optional[Mapping[str, int]] = None, path: Optional[str] = None) -> None:
+        """
+        In-memory best-first frontier: get() returns the queued URL with the highest
+        score (FIFO among equal scores), and links found to a queued URL raise its score.
+
+        With a ``path``, checkpoint() writes the queued URLs, the URLs in flight and the
+        budget counters to that file, and a new frontier resumes from it; URLs that were
+        in flight at the last checkpoint are queued again.
+
+        Budgets are enforced when URLs are queued, so the crawl ends by itself once they
+        are used up: URLs deeper than ``max_depth`` link hops, beyond ``max_pages``
+        queued in total, or beyond their registered domain's budget are dropped.
+
+        :param scorer: The UrlScorer; defaults to favouring shallow, often-linked pages.
+        :param max_depth: Largest depth queued; seeds have depth 0.
+        :param max_pages: Largest number of URLs queued over the crawl.
+        :param domain_budget: Largest number of URLs queued per registered domain.
+        :param domain_budgets: Per-domain overrides of ``domain_budget``.
+        :param path: File the frontier is checkpointed to and resumed from.
+        """
+        self.scorer = scorer or UrlScorer()
+        self.path = path
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.domain_budget = domain_budget
+        self.domain_budgets = dict(domain_budgets or {})
+        self.scores_anchors = bool(self.scorer.anchor_terms)
+        # Heap of [-score, sequence, url]; entries replaced by a rescore get url None.
+        self._heap: List[list] = []
+        self._entries: Dict[str, list] = {}
+        # depth, static score and inlinks of every queued URL; depth of URLs in flight.
+        self._queued: Dict[str, List] = {}
+        self._depths: Dict[str, int] = {}
+        self._sequence = itertools.count()
+        self.accepted = 0
+        self.dropped: Counter = Counter()
+        self.domain_pages: Counter = Counter()
+        self._unfinished = 0
+        # URLs queued while a checkpoint is being written; None when none is.
+        self._late: Optional[List[str]] = None
+        self._save_lock = threading.Lock()
+        self._not_empty = asyncio.Event()
+        self._finished = asyncio.Event()
+        self._finished.set()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def qsize(self) -> int:
+        return len(self._entries)
+
+    def empty(self) -> bool:
+        return not self._entries
+
+    def _drop(self, reason: str, url: str) -> bool:
+        if not self.dropped[reason]:
+            logging.info(f"Frontier {reason} budget reached at {url}; further URLs over it are skipped")
+        self.dropped[reason] += 1
+        return False
+
+    def _push(self, url: str, score: float) -> None:
+        entry = [-score, next(self._sequence), url]
+        self._entries[url] = entry
+        heapq.heappush(self._heap, entry)
+
+    def put_nowait(self, url: str, parent: Optional[str] = None, anchor: Optional[str] = None,
+                   lastmod: Optional[float] = None) -> bool:
+        """
+        Queue a URL unless it is already queued or exceeds a budget.
+
+        :param url: The URL.
+        :param parent: The page the link was found on; seeds have none.
+        :param anchor: The link's anchor text.
+        :param lastmod: Last modification time (epoch seconds), e.g. from a sitemap.
+        :return: Whether the URL was queued.
+        """
+        if url in self._entries:
+            return False
+        depth = self._depths.get(parent, 0) + 1 if parent is not None else 0
+        if self.max_depth is not None and depth > self.max_depth:
+            return self._drop('depth', url)
+        if self.max_pages is not None and self.accepted >= self.max_pages:
+            return self._drop('page', url)
+        domain = get_domain_name(url)
+        budget = self.domain_budgets.get(domain, self.domain_budget)
+        if budget is not None and self.domain_pages[domain] >= budget:
+            return self._drop('domain', url)
+        self.accepted += 1
+        self.domain_pages[domain] += 1
+        static = self.scorer.static_score(url, depth, anchor, lastmod)
+        self._queued[url] = [depth, static, 0]
+        self._push(url, self.scorer.score(static, 0))
+        if self._late is not None:
+            self._late.append(url)
+        self._unfinished += 1
+        self._finished.clear()
+        self._not_empty.set()
+        return True
+
+    async def put(self, url: str, parent: Optional[str] = None, anchor: Optional[str] = None,
+                  lastmod: Optional[float] = None) -> bool:
+        return self.put_nowait(url, parent, anchor, lastmod)
+
+    def note_inlink(self, url: str) -> None:
+        """
+        Record another link to an already seen URL; raises its score while it is queued.
+        """
+        state = self._queued.get(url)
+        if state is None or not self.scorer.inlinks:
+            return
+        state[2] += 1
+        self._entries[url][2] = None
+        self._push(url, self.scorer.score(state[1], state[2]))
+        # Rescoring leaves dead entries behind; rebuild the heap once they dominate.
+        if len(self._heap) > 2 * len(self._entries) + 1024:
+            self._heap = [entry for entry in self._heap if entry[2] is not None]
+            heapq.heapify(self._heap)
+
+    def get_nowait(self) -> str:
+        while self._heap:
+            url = heapq.heappop(self._heap)[2]
+            if url is not None:
+                del self._entries[url]
+                self._depths[url] = self._queued.pop(url)[0]
+                return url
+        raise asyncio.QueueEmpty
+
+    async def get(self) -> str:
+        while not self._entries:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        return self.get_nowait()
+
+    def task_done(self, url: Optional[str] = None) -> None:
+        """
+        Mark a URL returned by get() as processed.
+
+        :param url: The URL; its depth is forgotten once its links have been queued.
+        """
+        if self._unfinished <= 0:
+            raise ValueError("task_done() called too many times")
+        self._depths.pop(url, None)
+        self._unfinished -= 1
+        if self._unfinished == 0:
+            self._finished.set()
+
+    async def join(self) -> None:
+        await self._finished.wait()
+
+    def _snapshot(self) -> Tuple[List[list], List[tuple]]:
+        # Only copied here; sorting happens in the writer thread.
+        self._late = []
+        queued = self._queued
+        in_flight = [[url, depth, None, 0] for url, depth in self._depths.items()]
+        return in_flight, [(entry[1], entry[2], *queued[entry[2]]) for entry in self._heap if entry[2] is not None]
+
+    def _write(self, path: str, snapshot: Tuple[List[list], List[tuple]]) -> None:
+        in_flight, queued = snapshot
+        # In flight first, then queued in push order, so equal scores keep their FIFO order.
+        queued.sort()
+        # The thread of a cancelled checkpoint may still be writing when the next one starts.
+        with self._save_lock, open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            for row in in_flight:
+                f.write(json.dumps(row) + '\n')
+            for _, url, depth, static, inlinks in queued:
+                f.write(json.dumps([url, depth, static, inlinks]) + '\n')
+
+    def _finish(self, path: str) -> None:
+        # URLs queued while the snapshot was written are appended, so the file matches
+        # the visited index saved right after it.
+        late, self._late = self._late, None
+        with self._save_lock:
+            with open(f"{path}.tmp", 'a', encoding='utf-8') as f:
+                for url in dict.fromkeys(late):
+                    if url in self._queued:
+                        f.write(json.dumps([url, *self._queued[url]]) + '\n')
+                    elif url in self._depths:
+                        f.write(json.dumps([url, self._depths[url], None, 0]) + '\n')
+                f.write(json.dumps({'accepted': self.accepted, 'domain_pages': self.domain_pages}) + '\n')
+            os.replace(f"{path}.tmp", path)
+        logging.debug(f"Frontier checkpoint: {len(self._entries)} queued, {len(self._depths)} in flight")
+
+    def checkpoint(self) -> None:
+        """
+        Write the frontier to ``path`` atomically; a no-op without a path.
+        """
+        if self.path:
+            self._write(self.path, self._snapshot())
+            self._finish(self.path)
+
+    async def checkpoint_async(self) -> None:
+        """
+        Like checkpoint(), but the bulk of the file is written in a worker thread.
+        """
+        if self.path:
+            try:
+                await asyncio.to_thread(self._write, self.path, self._snapshot())
+            except BaseException:
+                self._late = None
+                raise
+            self._finish(self.path)
+
+    def load(self, path: str) -> None:
+        """
+        Queue the URLs of a checkpoint written by checkpoint(); URLs that were in
+        flight are queued again.
+        """
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                row = json.loads(line)
+                if isinstance(row, dict):
+                    self.accepted = int(row.get('accepted', 0))
+                    self.domain_pages = Counter(row.get('domain_pages') or {})
+                    continue
+                url, depth, static, inlinks = row
+                if url in self._entries:
+                    continue
+                if static is None:
+                    static = self.scorer.static_score(url, depth)
+                self._queued[url] = [depth, static, inlinks]
+                self._push(url, self.scorer.score(static, inlinks))
+        self._unfinished = len(self._entries)
+        if self._entries:
+            logging.info(f"Resuming frontier with {len(self._entries)} queued URLs from {path}")
+            self._finished.clear()
+            self._not_empty.set()
+
+    def close(self) -> None:
+        # The crawl writes its final checkpoint itself, before closing the frontier.
+        if self.dropped:
+            logging.info(f"Frontier skipped URLs over budget: {dict(self.dropped)}")
+
+def _optional_int(value) -> Optional[int]:
+    return int(value) if value is not None else None
+
+def create_frontier(config: dict):
+    """
+    Build the frontier selected by ``config['frontier']['backend']``.
+
+    :param config: Configuration dictionary.
+    :return: A PriorityFrontier, MemoryFrontier or DiskFrontier.
+    """
+    settings = config.get('frontier') or {}
+    backend = settings.get('backend', 'priority')
+    index_path = (config.get('dedupe') or {}).get('path')
+    if backend == 'priority':
+        scoring = settings.get('scoring') or {}
+        return PriorityFrontier(
+            UrlScorer(
+                depth=float(scoring.get('depth', -1.0)),
+                inlinks=float(scoring.get('inlinks', 0.5)),
+                freshness=float(scoring.get('freshness', 2.0)),
+                half_life=float(scoring.get('half_life', 30)),
+                url_patterns=scoring.get('url_patterns') or {},
+                anchor_terms=scoring.get('anchor_terms') or {}
+            ),
+            max_depth=_optional_int(settings.get('max_depth')),
+            max_pages=_optional_int(settings.get('max_pages')),
+            domain_budget=_optional_int(settings.get('domain_budget')),
+            domain_budgets={domain: int(budget) for domain, budget in (settings.get('domain_budgets') or {}).items()},
+            # A resumable crawl needs the frontier that matches the persisted index.
+            path=f"{index_path}.frontier" if index_path else None
+        )
+    if backend == 'disk':
+        return DiskFrontier(
+            settings.get('path', 'crawl_frontier.db'),
+            hot_size=int(settings.get('hot_size', 1000)),
+            write_batch=int(settings.get('write_batch', 500))
+        )
+    if index_path:
+        logging.warning("dedupe.path is set but the memory frontier is not persisted: a resumed crawl "
+                        "would skip every URL queued before the restart. Use the priority or disk backend.")
+    return MemoryFrontier()
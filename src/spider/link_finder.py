@@ -1,18 +1,43 @@
-from bs4 import BeautifulSoup
+from lxml import etree, html as lxml_html
 from urllib.parse import urljoin
-from typing import Set
+from typing import Dict, Optional, Set
+
+# Compiled once; returns the raw href of every anchor in a parsed document.
+_HREF_XPATH = etree.XPath('//a/@href')
+_BASE_XPATH = etree.XPath('(//base/@href)[1]')
+_ANCHOR_XPATH = etree.XPath('//a[@href]')
+
+def parse_html(content: str) -> Optional[etree._Element]:
+    """
+    Parse HTML content into an lxml tree.
+
+    :param content: HTML content as a string.
+    :return: The document root, or None if the content cannot be parsed.
+    """
+    if not content or not content.strip():
+        return None
+    try:
+        return lxml_html.document_fromstring(content)
+    except (etree.ParserError, ValueError):
+        # ValueError: str input that carries an XML encoding declaration.
+        try:
+            return lxml_html.document_fromstring(content.encode('utf-8', 'replace'))
+        except etree.ParserError:
+            return None
 
 class LinkFinder:
     def __init__(self, base_url: str, page_url: str) -> None:
         """
-        Initialize the LinkFinder.
+        Initialize the LinkFinder. Relative links are resolved against the page's
+        ``<base href>`` if it has one, otherwise against the page URL.
 
-        :param base_url: The base URL to resolve relative links.
+        :param base_url: The URL relative links are resolved against when ``page_url`` is empty.
         :param page_url: The URL of the page being parsed.
         """
         self.base_url = base_url
         self.page_url = page_url
         self.links: Set[str] = set()
+        self.anchors: Dict[str, str] = {}
 
     def feed(self, html: str) -> None:
         """
@@ -20,10 +45,44 @@ class LinkFinder:
 
         :param html: HTML content as a string.
         """
-        soup = BeautifulSoup(html, 'lxml')
-        for tag in soup.find_all('a', href=True):
-            absolute_link = urljoin(self.base_url, tag['href'])
-            self.links.add(absolute_link)
+        tree = parse_html(html)
+        if tree is not None:
+            self.feed_tree(tree)
+
+    def feed_tree(self, tree: etree._Element) -> None:
+        """
+        Extract links from an already parsed lxml tree.
+
+        :param tree: The document root.
+        """
+        base = self._base(tree)
+        for href in _HREF_XPATH(tree):
+            href = href.strip()
+            if href:
+                self.links.add(urljoin(base, href))
+
+    def feed_anchors(self, tree: etree._Element) -> None:
+        """
+        Collect the anchor text of every link (the first non-empty one per URL) from a
+        parsed tree into ``anchors``.
+
+        :param tree: The document root.
+        """
+        base = self._base(tree)
+        for anchor in _ANCHOR_XPATH(tree):
+            href = anchor.get('href', '').strip()
+            if not href:
+                continue
+            url = urljoin(base, href)
+            if not self.anchors.get(url):
+                self.anchors[url] = ' '.join(anchor.text_content().split())
+
+    def _base(self, tree: etree._Element) -> str:
+        base = self.page_url or self.base_url
+        base_href = _BASE_XPATH(tree)
+        if base_href and base_href[0].strip():
+            base = urljoin(base, base_href[0].strip())
+        return base
 
     def page_links(self) -> Set[str]:
         """
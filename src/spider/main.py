@@ -1,25 +1,44 @@
 import asyncio
+import importlib
 import logging
+from typing import Iterable
 from spider.config import config
 from spider.spider import Spider
 from spider.plugin import PluginManager
-from spider.plugins.entity_extraction import EntityExtractionPlugin
-from spider.plugins.real_time_metrics import RealTimeMetricsPlugin
-from spider.plugins.dynamic_scraper import DynamicScraperPlugin
 from spider.utils import init_logging
-from spider.plugins.title_logger_plugin import TitleLoggerPlugin
+
+# Plugins that can be enabled by name in config['plugins']['enabled']. They are
+# imported only when enabled, so disabled plugins add nothing to startup time.
+PLUGINS = {
+    'entities': 'spider.plugins.entity_extraction:EntityExtractionPlugin',
+    'metrics': 'spider.plugins.real_time_metrics:RealTimeMetricsPlugin',
+    'dynamic_scraper': 'spider.plugins.dynamic_scraper:DynamicScraperPlugin',
+    'titles': 'spider.plugins.title_logger_plugin:TitleLoggerPlugin',
+}
+
+def build_plugin_manager(enabled: Iterable[str]) -> PluginManager:
+    """
+    Build a plugin manager with the named plugins registered, in the order given.
+
+    :param enabled: Names from PLUGINS.
+    :return: The PluginManager.
+    """
+    plugin_manager = PluginManager(timeout=config['plugins']['timeout'])
+    for name in enabled:
+        if name not in PLUGINS:
+            logging.warning(f"Unknown plugin '{name}'; expected one of {', '.join(PLUGINS)}")
+            continue
+        module_name, class_name = PLUGINS[name].split(':')
+        plugin_class = getattr(importlib.import_module(module_name), class_name)
+        plugin_manager.register(plugin_class())
+    return plugin_manager
 
 def main() -> None:
     """
     Entry point for the crawler.
     """
     init_logging(logging.INFO)
-    plugin_manager = PluginManager()
-    # Register custom plugins here, e.g.:
-    plugin_manager.register(EntityExtractionPlugin())
-    plugin_manager.register(RealTimeMetricsPlugin())
-    plugin_manager.register(DynamicScraperPlugin())
-    plugin_manager.register(TitleLoggerPlugin())
+    plugin_manager = build_plugin_manager(config['plugins']['enabled'])
     crawler = Spider(config['start_url'], config, plugin_manager)
     asyncio.run(crawler.crawl())
 
@@ -0,0 +1,267 @@
+import bisect
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from sub-millisecond parsing to slow fetches.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        """
+        Base class of a named metric with optional labels.
+
+        :param name: Prometheus metric name.
+        :param documentation: HELP text.
+        :param labelnames: Names of the labels; values are passed as keyword arguments.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self.values.get(self._key(labels), 0)
+
+    def items(self) -> List[Tuple[LabelValues, float]]:
+        # A copy: the dashboard reads metrics from its own thread while the crawler adds label sets.
+        # dict.copy() is a single call under the GIL; iterating the live dict is not.
+        return list(self.values.copy().items())
+
+    def total(self) -> float:
+        return sum(value for _, value in self.items())
+
+    def samples(self) -> List[str]:
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {value}' for key, value in self.items()]
+
+    def snapshot(self):
+        if not self.labelnames:
+            return self.get()
+        return {','.join(key): value for key, value in self.items()}
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels: str) -> None:
+        self.values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (+Inf last), sum, count].
+        self.values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        state = self.values.get(key)
+        if state is None:
+            state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def time(self, **labels: str) -> 'Timer':
+        """
+        Context manager that observes the elapsed time of its block.
+        """
+        return Timer(self, labels)
+
+    def count(self, **labels: str) -> int:
+        state = self.values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def quantile(self, q: float, **labels: str) -> Optional[float]:
+        """
+        Estimate a quantile by linear interpolation inside the matching bucket.
+
+        :param q: The quantile, e.g. 0.99.
+        :return: The estimate in seconds, or None without observations.
+        """
+        state = self.values.get(self._key(labels))
+        if not state or not state[2]:
+            return None
+        rank = q * state[2]
+        seen = 0
+        for i, bucket_count in enumerate(state[0]):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def fraction_below(self, bound: float, **labels: str) -> Optional[float]:
+        """
+        Fraction of observations in buckets up to ``bound``.
+        """
+        state = self.values.get(self._key(labels))
+        if not state or not state[2]:
+            return None
+        index = bisect.bisect_right(self.buckets, bound)
+        return sum(state[0][:index]) / state[2]
+
+    def items(self) -> List[Tuple[LabelValues, list]]:
+        # Copies of the label sets and their states, safe to read from another thread.
+        return [(key, [list(counts), total, count]) for key, (counts, total, count) in self.values.copy().items()]
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total, count) in self.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                labels = _format_labels(self.labelnames, key, 'le="' + le + '"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {count}')
+        return lines
+
+    def snapshot(self):
+        result = {}
+        for key, (_, total, count) in self.items():
+            labels = dict(zip(self.labelnames, key))
+            result[','.join(key) or self.name] = {
+                'count': count,
+                'avg': total / count if count else 0.0,
+                'p50': self.quantile(0.5, **labels),
+                'p99': self.quantile(0.99, **labels),
+            }
+        return result
+
+class Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]) -> None:
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> 'Timer':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        """
+        A collection of metrics that renders to Prometheus text or a JSON-friendly dict.
+        Updates are plain dict operations, cheap enough to leave on at full crawl rate.
+        """
+        self.metrics: Dict[str, Metric] = {}
+        self.started = time.time()
+
+    def _register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render_prometheus(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self.metrics.copy().values():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> Dict[str, object]:
+        """
+        Current values of every metric, keyed by name.
+        """
+        return {name: metric.snapshot() for name, metric in self.metrics.copy().items()}
+
+registry = MetricsRegistry()
+
+pages_fetched = registry.counter('spider_pages_fetched_total', 'HTML pages fetched successfully.')
+pages_unchanged = registry.counter('spider_pages_unchanged_total', 'Recrawled pages skipped as unchanged.')
+fetch_errors = registry.counter('spider_fetch_errors_total', 'Fetches that failed or were skipped, by type.', ('type',))
+response_bytes = registry.counter('spider_response_bytes_total', 'Body bytes read from HTML responses.')
+near_duplicates = registry.counter('spider_near_duplicates_total', 'Pages stored as aliases of a near-duplicate page.')
+robots_blocked = registry.counter('spider_robots_blocked_total', 'URLs skipped because robots.txt disallows them.')
+out_of_scope = registry.counter('spider_out_of_scope_total', 'Discovered links dropped by the scope filter.')
+frontier_depth = registry.gauge('spider_frontier_depth', 'URLs waiting in the frontier.')
+requests_in_flight = registry.gauge('spider_requests_in_flight', 'HTTP requests currently in flight.')
+stage_seconds = registry.histogram(
+    'spider_stage_seconds',
+    'Time spent per crawl stage (dns, connect, ttfb, fetch, parse, simhash, plugins, db_flush).',
+    ('stage',)
+)
+plugin_seconds = registry.histogram('spider_plugin_seconds', 'Time spent per plugin and page.', ('plugin',))
+body_bytes = registry.counter('spider_body_bytes_total', 'Page body bytes in blob mode, raw and as stored.', ('kind',))
+warc_bytes = registry.counter('spider_warc_bytes_total', 'Compressed bytes of responses written to WARC files.')
+db_rows_written = registry.counter('spider_db_rows_written_total', 'Rows written by the storage sink.', ('table',))
+
+def create_trace_config():
+    """
+    Build an aiohttp TraceConfig that records DNS, connect and time-to-first-byte
+    latencies into ``spider_stage_seconds``.
+    """
+    import aiohttp
+
+    async def on_request_start(session, ctx, params):
+        ctx.start = time.perf_counter()
+
+    async def on_dns_start(session, ctx, params):
+        ctx.dns_start = time.perf_counter()
+
+    async def on_dns_end(session, ctx, params):
+        stage_seconds.observe(time.perf_counter() - ctx.dns_start, stage='dns')
+
+    async def on_connect_start(session, ctx, params):
+        ctx.connect_start = time.perf_counter()
+
+    async def on_connect_end(session, ctx, params):
+        stage_seconds.observe(time.perf_counter() - ctx.connect_start, stage='connect')
+
+    async def on_request_end(session, ctx, params):
+        # Fired once the response headers have arrived.
+        stage_seconds.observe(time.perf_counter() - ctx.start, stage='ttfb')
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_dns_resolvehost_start.append(on_dns_start)
+    trace_config.on_dns_resolvehost_end.append(on_dns_end)
+    trace_config.on_connection_create_start.append(on_connect_start)
+    trace_config.on_connection_create_end.append(on_connect_end)
+    trace_config.on_request_end.append(on_request_end)
+    return trace_config
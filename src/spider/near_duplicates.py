@@ -0,0 +1,169 @@
+from collections import deque
+from hashlib import blake2b
+from typing import Deque, Dict, List, Optional, Tuple
+
+FINGERPRINT_BITS = 64
+# _BIT_TABLES[k] maps a byte to 1 if its bit k is set, else 0.
+_BIT_TABLES = [bytes((value >> k) & 1 for value in range(256)) for k in range(8)]
+
+def simhash(text: str, shingle_size: int = 3) -> Tuple[int, int]:
+    """
+    64-bit SimHash of a text over overlapping word shingles. Texts that share most of
+    their shingles get fingerprints a small Hamming distance apart.
+
+    Shingles are hashed with an 8-byte BLAKE2b digest rather than the built-in hash,
+    which is salted per process: fingerprints are stable across processes and runs, so
+    parse workers and Celery workers agree on them.
+
+    :param text: The page text.
+    :param shingle_size: Words per shingle.
+    :return: The fingerprint and the number of words it was computed from.
+    """
+    words = text.lower().split()
+    if not words:
+        return 0, 0
+    size = max(min(shingle_size, len(words)), 1)
+    shingles = zip(*(words[i:] for i in range(size)))
+    packed = b''.join(blake2b(' '.join(shingle).encode('utf-8', 'surrogatepass'), digest_size=8).digest()
+                      for shingle in shingles)
+    half = len(packed) // 16
+    # Per-bit vote, counted in C: column j holds byte j of every hash, and each bit
+    # table turns a column into 0/1 bytes whose set bits are then counted at once.
+    fingerprint = 0
+    for j in range(8):
+        column = packed[j::8]
+        for k, table in enumerate(_BIT_TABLES):
+            if int.from_bytes(column.translate(table), 'little').bit_count() > half:
+                fingerprint |= 1 << (8 * j + k)
+    return fingerprint, len(words)
+
+class SimHashIndex:
+    def __init__(self, max_distance: int = 3, max_entries: int = 1000000) -> None:
+        """
+        Index of SimHash fingerprints that finds a stored fingerprint within
+        ``max_distance`` bits of a query.
+
+        The 64 bits are split into ``max_distance + 1`` blocks. Two fingerprints that
+        differ in at most ``max_distance`` bits agree exactly on at least one block, so
+        one table per block, keyed by that block's value, yields every candidate; only
+        those few are compared bit by bit.
+
+        :param max_distance: Largest Hamming distance treated as a near duplicate.
+        :param max_entries: Fingerprints kept; the oldest are evicted first.
+        """
+        self.max_distance = max(int(max_distance), 0)
+        self.max_entries = max(int(max_entries), 1)
+        blocks = self.max_distance + 1
+        width = FINGERPRINT_BITS // blocks
+        # (shift, mask) of each block; the last one takes the remaining bits.
+        self.blocks: List[Tuple[int, int]] = [
+            (i * width, (1 << (width if i < blocks - 1 else FINGERPRINT_BITS - i * width)) - 1)
+            for i in range(blocks)
+        ]
+        self.tables: List[Dict[int, List[Tuple[int, str]]]] = [{} for _ in self.blocks]
+        self.order: Deque[Tuple[int, str]] = deque()
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def find(self, fingerprint: int, url: Optional[str] = None) -> Optional[Tuple[str, int]]:
+        """
+        Look up the closest stored fingerprint within ``max_distance``.
+
+        :param fingerprint: The query fingerprint.
+        :param url: The query's own URL, which is never reported as its duplicate.
+        :return: ``(url, distance)`` of the best match, or None.
+        """
+        best = None
+        for (shift, mask), table in zip(self.blocks, self.tables):
+            for candidate, candidate_url in table.get((fingerprint >> shift) & mask, ()):
+                if candidate_url == url:
+                    continue
+                distance = (fingerprint ^ candidate).bit_count()
+                if distance <= self.max_distance and (best is None or distance < best[1]):
+                    best = (candidate_url, distance)
+                    if distance == 0:
+                        return best
+        return best
+
+    def add(self, fingerprint: int, url: str) -> None:
+        entry = (fingerprint, url)
+        for (shift, mask), table in zip(self.blocks, self.tables):
+            table.setdefault((fingerprint >> shift) & mask, []).append(entry)
+        self.order.append(entry)
+        if len(self.order) > self.max_entries:
+            self._evict(self.order.popleft())
+
+    def _evict(self, entry: Tuple[int, str]) -> None:
+        fingerprint = entry[0]
+        for (shift, mask), table in zip(self.blocks, self.tables):
+            key = (fingerprint >> shift) & mask
+            bucket = table.get(key)
+            if bucket:
+                bucket.remove(entry)
+                if not bucket:
+                    del table[key]
+
+    def find_or_add(self, fingerprint: int, url: str) -> Optional[Tuple[str, int]]:
+        """
+        Return the near duplicate of ``url`` if one is indexed; otherwise index ``url``.
+        Both steps run without yielding to the event loop, so two concurrent copies of a
+        page cannot both become canonical.
+
+        :return: ``(canonical_url, distance)``, or None if the page is new.
+        """
+        match = self.find(fingerprint, url)
+        if match is None:
+            self.add(fingerprint, url)
+        return match
+
+class NearDuplicateDetector:
+    def __init__(self, max_distance: int = 3, shingle_size: int = 3, min_words: int = 20,
+                 max_entries: int = 1000000, follow_links: bool = True) -> None:
+        """
+        Detect pages whose visible text nearly matches an earlier page, so the copy can
+        be recorded as an alias instead of being processed and stored again.
+
+        :param max_distance: Largest SimHash Hamming distance treated as a duplicate.
+        :param shingle_size: Words per shingle.
+        :param min_words: Pages with less text are never treated as duplicates.
+        :param max_entries: Fingerprints kept in memory.
+        :param follow_links: Whether links found on duplicates are still queued.
+        """
+        self.index = SimHashIndex(max_distance, max_entries)
+        self.shingle_size = max(int(shingle_size), 1)
+        self.min_words = int(min_words)
+        self.follow_links = follow_links
+
+    def fingerprint(self, text: str) -> Optional[int]:
+        """
+        Fingerprint page text; None when it is too short to compare. CPU-bound, so call
+        it off the event loop.
+        """
+        fingerprint, words = simhash(text, self.shingle_size)
+        return fingerprint if words >= self.min_words else None
+
+    def check(self, url: str, fingerprint: Optional[int]) -> Optional[Tuple[str, int]]:
+        """
+        :return: ``(canonical_url, distance)`` if ``url`` duplicates an indexed page.
+        """
+        if fingerprint is None:
+            return None
+        return self.index.find_or_add(fingerprint, url)
+
+def create_near_duplicate_detector(config: dict) -> Optional[NearDuplicateDetector]:
+    """
+    Build the detector from ``config['near_duplicates']``, or None when disabled.
+
+    :param config: Configuration dictionary.
+    """
+    settings = config.get('near_duplicates') or {}
+    if not settings.get('enabled', True):
+        return None
+    return NearDuplicateDetector(
+        max_distance=int(settings.get('max_distance', 3)),
+        shingle_size=int(settings.get('shingle_size', 3)),
+        min_words=int(settings.get('min_words', 20)),
+        max_entries=int(settings.get('max_entries', 1000000)),
+        follow_links=bool(settings.get('follow_links', True))
+    )
@@ -0,0 +1,139 @@
+from typing import Dict, NamedTuple, Optional, Set, Tuple
+from lxml import etree
+from spider.link_finder import LinkFinder, parse_html
+
+# Visible text: every text node outside script, style and noscript elements.
+_TEXT_XPATH = etree.XPath('//body//text()[not(ancestor::script or ancestor::style or ancestor::noscript)]')
+_TITLE_XPATH = etree.XPath('string(//title)')
+
+class ParsedPage(NamedTuple):
+    """
+    What the crawler needs from a parsed page, small enough to send between processes.
+    """
+    links: Tuple[str, ...]
+    title: str
+    text: str
+    # Anchor text per link; only filled when requested.
+    anchors: Optional[Dict[str, str]] = None
+
+class PageContext:
+    def __init__(self, url: str, content: str, base_url: Optional[str] = None,
+                 tree: Optional[etree._Element] = None, parsed: Optional[ParsedPage] = None) -> None:
+        """
+        Per-page state shared by the crawler and plugins. The HTML is parsed at most
+        once into an lxml tree; text, title and links are derived from that tree on
+        first access and cached until the content changes.
+
+        :param url: The URL of the page.
+        :param content: The HTML content.
+        :param base_url: The URL relative links are resolved against if ``url`` is empty (defaults to ``url``).
+        :param tree: An already parsed tree of ``content``, e.g. from incremental parsing.
+        :param parsed: Links, title and text of ``content`` parsed elsewhere, e.g. by the
+            parse pool; the tree is then only built if a plugin asks for it.
+        """
+        self.url = url
+        self.base_url = base_url or url
+        self._content = content
+        self._reset()
+        if tree is not None:
+            self._tree = tree
+            self._parsed = True
+        if parsed is not None:
+            self._links = set(parsed.links)
+            self._title = parsed.title
+            self._text = parsed.text
+            self._anchors = parsed.anchors
+
+    def _reset(self) -> None:
+        self._parsed = False
+        self._tree: Optional[etree._Element] = None
+        self._text: Optional[str] = None
+        self._title: Optional[str] = None
+        self._links: Optional[Set[str]] = None
+        self._anchors: Optional[Dict[str, str]] = None
+
+    @property
+    def content(self) -> str:
+        return self._content
+
+    @content.setter
+    def content(self, value: str) -> None:
+        # Plugins that return the content unchanged keep the cached tree.
+        if value is not self._content:
+            self._content = value
+            self._reset()
+
+    def parse(self) -> Optional[etree._Element]:
+        """
+        Build the lxml tree if it has not been built yet. Safe to call from a worker thread.
+
+        :return: The document root, or None if the content is not parseable HTML.
+        """
+        if not self._parsed:
+            self._tree = parse_html(self._content)
+            self._parsed = True
+        return self._tree
+
+    @property
+    def tree(self) -> Optional[etree._Element]:
+        return self.parse()
+
+    @property
+    def text(self) -> str:
+        """
+        Visible text of the page with whitespace collapsed.
+        """
+        if self._text is None:
+            tree = self.tree
+            self._text = ' '.join(' '.join(_TEXT_XPATH(tree)).split()) if tree is not None else ''
+        return self._text
+
+    @property
+    def title(self) -> Optional[str]:
+        """
+        The stripped <title> of the page, or None if missing or empty.
+        """
+        if self._title is None and self.tree is not None:
+            self._title = _TITLE_XPATH(self.tree).strip()
+        return self._title or None
+
+    def extract_links(self) -> Set[str]:
+        """
+        Extract the links if they have not been extracted yet, parsing the page if needed.
+        Safe to call from a worker thread.
+
+        :return: Absolute URLs of every anchor on the page.
+        """
+        if self._links is None:
+            finder = LinkFinder(self.base_url, self.url)
+            if self.tree is not None:
+                finder.feed_tree(self.tree)
+            self._links = finder.page_links()
+        return self._links
+
+    @property
+    def links(self) -> Set[str]:
+        """
+        Absolute URLs of every anchor on the page.
+        """
+        return self.extract_links()
+
+    @property
+    def anchors(self) -> Dict[str, str]:
+        """
+        Anchor text of each link, keyed by the same absolute URLs as ``links``.
+        """
+        if self._anchors is None:
+            finder = LinkFinder(self.base_url, self.url)
+            if self.tree is not None:
+                finder.feed_anchors(self.tree)
+            self._anchors = finder.anchors
+        return self._anchors
+
+    def summarize(self, anchors: bool = False) -> ParsedPage:
+        """
+        Links, title and text of the page, e.g. to send back from a parse worker.
+
+        :param anchors: Also include the anchor text of each link.
+        """
+        return ParsedPage(tuple(self.links), self.title or '', self.text, self.anchors if anchors else None)
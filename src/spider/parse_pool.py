@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from spider.page import PageContext, ParsedPage
+
+def parse_batch(batch: List[Tuple[str, str, bool]]) -> List[ParsedPage]:
+    """
+    Parse a batch of pages; runs in a worker process.
+
+    :param batch: ``(url, content, anchors)`` triples.
+    :return: One ParsedPage per page.
+    """
+    return [PageContext(url, content).summarize(anchors) for url, content, anchors in batch]
+
+class ParsePool:
+    def __init__(self, processes: int = 2, batch_size: int = 8, batch_timeout: float = 0.005,
+                 max_pending: int = 64) -> None:
+        """
+        Parses pages in worker processes, so HTML parsing, link extraction and text
+        extraction use several cores and never hold the event loop's GIL. Pages are
+        queued, grouped into batches (amortizing the round trip to a worker) and come
+        back as compact ParsedPage tuples.
+
+        The queue is bounded: parse() waits once ``max_pending`` pages are queued, and
+        at most two batches per process are in flight.
+
+        :param processes: Worker processes.
+        :param batch_size: Pages per batch.
+        :param batch_timeout: Seconds to wait for a batch to fill before sending it anyway.
+        :param max_pending: Queued pages above which parse() waits.
+        """
+        self.processes = max(int(processes), 1)
+        self.batch_size = max(int(batch_size), 1)
+        self.batch_timeout = float(batch_timeout)
+        self.max_pending = max(int(max_pending), 1)
+        self.executor: Optional[Executor] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.batcher: Optional[asyncio.Task] = None
+        self.in_flight: Optional[asyncio.Semaphore] = None
+        self.batches: set = set()
+
+    def _start(self) -> None:
+        if self.executor is None:
+            if multiprocessing.current_process().daemon:
+                # Daemonic processes (e.g. Celery prefork workers) cannot have children.
+                logging.info("Parsing pages in threads: this process cannot start worker processes")
+                self.executor = ThreadPoolExecutor(max_workers=self.processes)
+            else:
+                self.executor = ProcessPoolExecutor(max_workers=self.processes)
+        # Queue and batcher belong to the running event loop.
+        if self.batcher is None or self.batcher.done():
+            self.queue = asyncio.Queue(maxsize=self.max_pending)
+            self.in_flight = asyncio.Semaphore(self.processes * 2)
+            self.batcher = asyncio.create_task(self._batch_loop())
+
+    async def parse(self, url: str, content: str, anchors: bool = False) -> ParsedPage:
+        """
+        Parse a page in a worker process.
+
+        :param url: The page URL, which relative links are resolved against.
+        :param content: The HTML.
+        :param anchors: Also collect the anchor text of each link.
+        :return: The page's links, title and text.
+        """
+        self._start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((url, content, anchors, future))
+        return await future
+
+    async def _batch_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.batch_timeout
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait() if deadline <= loop.time() else \
+                        await asyncio.wait_for(self.queue.get(), deadline - loop.time())
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            await self.in_flight.acquire()
+            task = asyncio.create_task(self._parse(batch))
+            self.batches.add(task)
+            task.add_done_callback(self.batches.discard)
+            if stop:
+                break
+
+    async def _parse(self, batch: list) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(
+                self.executor, parse_batch, [(url, content, anchors) for url, content, anchors, _ in batch]
+            )
+            for (_, _, _, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self.in_flight.release()
+
+    async def close(self) -> None:
+        """
+        Parse every queued page and wait for outstanding batches. The worker processes
+        stay alive for the next crawl in this process.
+        """
+        if self.batcher is None or self.batcher.done():
+            return
+        await self.queue.put(None)
+        await self.batcher
+        if self.batches:
+            await asyncio.gather(*self.batches)
+
+    def shutdown(self) -> None:
+        """
+        Stop the worker processes.
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+# One pool per process, shared by every Spider (e.g. one per Celery task).
+_pool: Optional[ParsePool] = None
+
+def get_parse_pool(config: dict) -> Optional[ParsePool]:
+    """
+    Return this process's parse pool, configured from ``config['parse']``, or None when
+    ``processes`` is 0 and pages are parsed in a thread instead.
+
+    :param config: Configuration dictionary.
+    """
+    global _pool
+    settings = config.get('parse') or {}
+    processes = int(settings.get('processes', 2))
+    if processes <= 0:
+        return None
+    if _pool is None:
+        _pool = ParsePool(
+            processes=processes,
+            batch_size=int(settings.get('batch_size', 8)),
+            batch_timeout=float(settings.get('batch_timeout', 0.005)),
+            max_pending=int(settings.get('max_pending', 64))
+        )
+    return _pool
@@ -1,7 +1,23 @@
 import asyncio
 import logging
+import time
+from typing import Dict, List, Optional
+from spider.page import PageContext
+from spider.metrics import plugin_seconds
+
+# Plugin modes: transformers may change the page content and run one after another;
+# observers only read the page and run concurrently once all transformers are done.
+TRANSFORM = 'transform'
+OBSERVE = 'observe'
 
 class Plugin:
+    # Override in subclasses; see TRANSFORM and OBSERVE.
+    mode = TRANSFORM
+    # Seconds a single page may spend in this plugin; None uses the manager's default.
+    timeout: Optional[float] = None
+    # Pages this plugin may process at once; None means no limit.
+    max_concurrency: Optional[int] = None
+
     async def should_run(self, url: str, content: str) -> bool:
         """
         Determine if the plugin should run for the given URL and content.
@@ -16,25 +32,125 @@ class Plugin:
         """
         raise NotImplementedError("Plugins must implement the async process method.")
 
+    async def process_page(self, page: PageContext) -> None:
+        """
+        Process a page through its shared context. Override this to reuse the parsed
+        tree, text or links instead of parsing ``page.content`` again.
+
+        The default adapts string-based plugins: it calls should_run() and process()
+        and, for transformers, stores the returned content back on the page.
+        """
+        if await self.should_run(page.url, page.content):
+            content = await self.process(page.url, page.content)
+            if self.mode == TRANSFORM:
+                page.content = content
+
+    async def close(self) -> None:
+        """
+        Finish any background work. Called once when the crawl ends; defaults to a no-op.
+        """
+        pass
+
+class PluginStats:
+    def __init__(self) -> None:
+        """
+        Latency and outcome counters for one plugin.
+        """
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def record(self, elapsed: float) -> None:
+        self.calls += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'total_time': self.total_time,
+            'avg_time': self.total_time / self.calls if self.calls else 0.0,
+            'max_time': self.max_time,
+        }
+
 class PluginManager:
-    def __init__(self):
-        self.plugins = []
+    def __init__(self, timeout: Optional[float] = None):
+        """
+        :param timeout: Default seconds a plugin may spend on one page; None means no limit.
+        """
+        self.plugins: List[Plugin] = []
+        self.timeout = timeout
+        self.plugin_stats: Dict[str, PluginStats] = {}
+        self.semaphores: Dict[str, asyncio.Semaphore] = {}
 
     def register(self, plugin: Plugin) -> None:
         """
         Registers a plugin to be used by the crawler.
         """
         self.plugins.append(plugin)
+        name = plugin.__class__.__name__
+        self.plugin_stats.setdefault(name, PluginStats())
+        if plugin.max_concurrency:
+            self.semaphores[name] = asyncio.Semaphore(plugin.max_concurrency)
+
+    async def _run(self, plugin: Plugin, page: PageContext) -> None:
+        name = plugin.__class__.__name__
+        stats = self.plugin_stats[name]
+        timeout = plugin.timeout if plugin.timeout is not None else self.timeout
+        semaphore = self.semaphores.get(name)
+        start = time.perf_counter()
+        try:
+            if semaphore:
+                async with semaphore:
+                    await asyncio.wait_for(plugin.process_page(page), timeout)
+            else:
+                await asyncio.wait_for(plugin.process_page(page), timeout)
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            logging.warning(f"Plugin {name} timed out after {timeout}s on {page.url}")
+        except Exception as e:
+            stats.errors += 1
+            logging.error(f"Error in plugin {name}: {e}")
+        finally:
+            elapsed = time.perf_counter() - start
+            stats.record(elapsed)
+            plugin_seconds.observe(elapsed, plugin=name)
 
-    async def run_plugins(self, url: str, content: str) -> str:
+    async def run_plugins(self, page: PageContext) -> str:
         """
-        Iterates through all registered plugins and runs those whose should_run() method returns True.
-        The plugins are executed asynchronously, and their output (if any) is passed along.
+        Runs every registered plugin against the shared page context. Transformers run
+        in registration order, each seeing the previous one's output; observers then run
+        concurrently on the final page. Each plugin is bounded by its timeout.
+
+        :param page: The page context, carrying the content and its parsed tree.
+        :return: The (optionally modified) content.
+        """
+        for plugin in self.plugins:
+            if plugin.mode != OBSERVE:
+                await self._run(plugin, page)
+        observers = [plugin for plugin in self.plugins if plugin.mode == OBSERVE]
+        if observers:
+            await asyncio.gather(*(self._run(plugin, page) for plugin in observers))
+        return page.content
+
+    async def close(self) -> None:
+        """
+        Close every plugin, e.g. to flush batched work before storage is closed.
         """
         for plugin in self.plugins:
             try:
-                if await plugin.should_run(url, content):
-                    content = await plugin.process(url, content)
+                await plugin.close()
             except Exception as e:
-                logging.error(f"Error in plugin {plugin.__class__.__name__}: {e}")
-        return content
+                logging.error(f"Error closing plugin {plugin.__class__.__name__}: {e}")
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Per-plugin latency, error and timeout counters.
+
+        :return: A dict keyed by plugin class name.
+        """
+        return {name: stats.as_dict() for name, stats in self.plugin_stats.items()}
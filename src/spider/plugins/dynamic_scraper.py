@@ -1,9 +1,21 @@
-import asyncio
 import logging
-from playwright.async_api import async_playwright
-from spider.plugin import Plugin
+from typing import Optional
+from spider.config import config
+from spider.plugin import Plugin, TRANSFORM
+from spider.renderer import Renderer, create_renderer
 
 class DynamicScraperPlugin(Plugin):
+    mode = TRANSFORM
+    # Rendering waits for network idle; give up on pages that never settle.
+    timeout = 90
+
+    def __init__(self, renderer: Optional[Renderer] = None):
+        """
+        :param renderer: The renderer to use; defaults to a pooled Playwright renderer
+            configured from ``config['renderer']``, created on first use.
+        """
+        self.renderer = renderer
+
     async def should_run(self, url: str, content: str) -> bool:
         """
         Determine if this plugin should run. Here we assume that if the content length
@@ -13,36 +25,26 @@ class DynamicScraperPlugin(Plugin):
 
     async def process(self, url: str, content: str) -> str:
         """
-        Uses Playwright to render the page and extract text and image URLs.
+        Renders the page in the shared browser pool and extracts text and image URLs.
         Returns the fully rendered HTML content.
         """
         logging.info(f"DynamicScraperPlugin: Rendering {url} with Playwright")
         try:
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(headless=True)
-                page = await browser.new_page()
-                await page.goto(url, timeout=60000)
-                await page.wait_for_load_state("networkidle")
-                rendered_html = await page.content()
-
-                # Extract visible text content from the page.
-                text = await page.evaluate("() => document.body.innerText")
-
-                # Extract all image URLs using query selectors.
-                image_elements = await page.query_selector_all("img")
-                images = []
-                for img in image_elements:
-                    src = await img.get_attribute("src")
-                    if src:
-                        images.append(src)
-
-                await browser.close()
-
-                logging.info(
-                    f"DynamicScraperPlugin: {url} - Rendered text length: {len(text)}; "
-                    f"Found {len(images)} images: {images}"
-                )
-                return rendered_html
+            if self.renderer is None:
+                self.renderer = create_renderer(config)
+            result = await self.renderer.render(url)
+            logging.info(
+                f"DynamicScraperPlugin: {url} - Rendered text length: {len(result.text)}; "
+                f"Found {len(result.images)} images: {result.images}"
+            )
+            return result.html
         except Exception as e:
             logging.error(f"DynamicScraperPlugin: Error processing {url}: {e}")
             return content
+
+    async def close(self) -> None:
+        """
+        Shut down the browser pool.
+        """
+        if self.renderer is not None:
+            await self.renderer.close()
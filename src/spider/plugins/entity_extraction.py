@@ -1,53 +1,277 @@
 import asyncio
 import logging
-import spacy
-from sqlalchemy import create_engine, Column, String, JSON, MetaData, Table
-from sqlalchemy.dialects.postgresql import insert as pg_insert
-from sqlalchemy.exc import SQLAlchemyError
+import multiprocessing
+from collections import Counter, OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import select, BigInteger, Column, Date, DateTime, String, JSON, MetaData, Table
+from sqlalchemy.engine import Engine
 from spider.config import config
-from spider.plugin import Plugin
+from spider.db import ensure_schema
+from spider.domain import get_domain_name
+from spider.page import PageContext
+from spider.plugin import Plugin, OBSERVE
+from spider.sink import INCREMENT, UPDATE
+from spider.storage import get_sink
 
-# Set up the database engine and metadata.
-engine = create_engine(config['database']['url'], echo=False)
 metadata = MetaData()
 entities_table = Table(
     'entities', metadata,
     Column('url', String, primary_key=True),
-    Column('entities', JSON, nullable=False)
+    Column('entities', JSON, nullable=False),
+    Column('domain', String, nullable=True, index=True),
+    Column('extracted_at', DateTime, nullable=True, index=True)
 )
-metadata.create_all(engine)
+
+# Aggregates kept up to date as pages are extracted, per UTC day and domain, so
+# top-N queries read a few rows per day instead of every extracted page.
+label_counts_table = Table(
+    'entity_label_counts', metadata,
+    Column('day', Date, primary_key=True),
+    Column('domain', String, primary_key=True),
+    Column('label', String, primary_key=True),
+    Column('count', BigInteger, nullable=False)
+)
+text_counts_table = Table(
+    'entity_text_counts', metadata,
+    Column('day', Date, primary_key=True),
+    Column('domain', String, primary_key=True),
+    Column('label', String, primary_key=True),
+    Column('text', String, primary_key=True),
+    Column('count', BigInteger, nullable=False)
+)
+
+def get_engine() -> Engine:
+    """
+    Return the shared engine, creating the entity tables on first use.
+    """
+    return ensure_schema(metadata, migrate=[entities_table])
+
+# Day of rows extracted before extracted_at was recorded.
+UNKNOWN_DAY = date(1970, 1, 1)
+
+def count_entities(counts: Tuple[Counter, Counter], entities: Iterable[Dict[str, str]], day: date,
+                   domain: str, sign: int = 1) -> None:
+    """
+    Add (or with ``sign=-1`` subtract) one page's entities to label and text counters
+    keyed like the aggregate tables.
+
+    :param counts: ``(label_counts, text_counts)``.
+    :param entities: The page's {"text", "label"} dicts.
+    :param day: The extraction day.
+    :param domain: The page's domain.
+    :param sign: 1 to add, -1 to subtract.
+    """
+    labels, texts = counts
+    for entity in entities:
+        label = entity.get('label')
+        if label:
+            labels[(day, domain, label)] += sign
+            texts[(day, domain, label, entity.get('text', ''))] += sign
+
+class Extraction(NamedTuple):
+    """
+    The stored entities of a page, as read from the entities table.
+    """
+    url: str
+    entities: Any
+    domain: Optional[str]
+    extracted_at: Optional[datetime]
+
+def _previous_entities(urls: List[str]) -> Dict[str, tuple]:
+    with get_engine().connect() as conn:
+        rows = conn.execute(
+            select(entities_table.c.url, entities_table.c.entities, entities_table.c.domain, entities_table.c.extracted_at)
+            .where(entities_table.c.url.in_(urls))
+        ).all()
+    return {row.url: row for row in rows}
+
+# The spaCy model of the current (worker) process, loaded once by load_model().
+_nlp = None
+
+def load_model(model: str) -> None:
+    """
+    Load the spaCy model into this process. Used as the process pool initializer.
+
+    :param model: The spaCy model name.
+    """
+    global _nlp
+    import spacy
+    # Only the entity recognizer is needed.
+    _nlp = spacy.load(model, disable=["parser", "lemmatizer"])
+
+def extract_batch(texts: List[str], batch_size: int) -> List[List[Dict[str, str]]]:
+    """
+    Run the loaded model over a batch of texts with nlp.pipe.
+
+    :param texts: Plain-text documents.
+    :param batch_size: spaCy's internal batch size.
+    :return: One list of {"text", "label"} dicts per document.
+    """
+    return [
+        [{"text": ent.text, "label": ent.label_} for ent in doc.ents]
+        for doc in _nlp.pipe(texts, batch_size=batch_size)
+    ]
 
 class EntityExtractionPlugin(Plugin):
-    def __init__(self):
-        # Load spaCy's small English model.
-        self.nlp = spacy.load("en_core_web_sm")
-        self.engine = engine
+    mode = OBSERVE
+
+    def __init__(self, model: Optional[str] = None, processes: Optional[int] = None,
+                 batch_size: Optional[int] = None, batch_timeout: Optional[float] = None,
+                 max_chars: Optional[int] = None, max_pending: Optional[int] = None,
+                 recent_pages: Optional[int] = None):
+        """
+        Extract named entities from the visible text of each page. Pages are queued,
+        grouped into batches and run through ``nlp.pipe`` in a pool of processes that
+        each load the model once; results are written back through the shared sink.
+        Unset arguments come from ``config['entities']``.
+
+        :param model: The spaCy model name.
+        :param processes: Worker processes; 0 runs the model in a thread of this process.
+        :param batch_size: Documents per batch.
+        :param batch_timeout: Seconds to wait for a batch to fill before sending it anyway.
+        :param max_chars: Characters of text kept per page.
+        :param max_pending: Queued pages above which process_page() waits.
+        :param recent_pages: Pages whose latest entities are remembered in-process, so a
+            re-extraction replaces the right counts while the last write is still buffered.
+        """
+        settings = config.get('entities') or {}
+        self.model = model or settings.get('model', 'en_core_web_sm')
+        self.processes = int(processes if processes is not None else settings.get('processes', 2))
+        self.batch_size = int(batch_size or settings.get('batch_size', 32))
+        self.batch_timeout = float(batch_timeout or settings.get('batch_timeout', 0.5))
+        self.max_chars = int(max_chars or settings.get('max_chars', 100_000))
+        self.max_pending = int(max_pending or settings.get('max_pending', 256))
+        self.recent_pages = int(recent_pages or settings.get('recent_pages', 100_000))
+        # Latest extraction per URL; consulted before the database, which may lag the sink.
+        self.latest: 'OrderedDict[str, Extraction]' = OrderedDict()
+        self.executor: Optional[Executor] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.batcher: Optional[asyncio.Task] = None
+        self.in_flight: Optional[asyncio.Semaphore] = None
+        self.counting: Optional[asyncio.Lock] = None
+        self.batches: set = set()
+
+    def _start(self) -> None:
+        if self.executor is None:
+            daemonic = multiprocessing.current_process().daemon
+            if self.processes > 0 and not daemonic:
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.processes, initializer=load_model, initargs=(self.model,)
+                )
+            else:
+                if self.processes > 0:
+                    # Daemonic processes (e.g. Celery prefork workers) cannot have children.
+                    logging.info("Extracting entities in a thread: this process cannot start worker processes")
+                load_model(self.model)
+                self.executor = ThreadPoolExecutor(max_workers=1)
+        # Queue and batcher belong to the running event loop.
+        if self.batcher is None or self.batcher.done():
+            self.queue = asyncio.Queue(maxsize=self.max_pending)
+            self.in_flight = asyncio.Semaphore(max(self.processes, 1) * 2)
+            self.counting = asyncio.Lock()
+            self.batcher = asyncio.create_task(self._batch_loop())
 
     async def should_run(self, url: str, content: str) -> bool:
         return True
 
     async def process(self, url: str, content: str) -> str:
         """
-        Extract named entities from the content using spaCy and store them in the database.
-        Synchronous database operations are run in a separate thread for efficiency.
-        """
-        def sync_process():
-            try:
-                doc = self.nlp(content)
-                extracted_entities = [{"text": ent.text, "label": ent.label_} for ent in doc.ents]
-                stmt = pg_insert(entities_table).values(url=url, entities=extracted_entities)
-                stmt = stmt.on_conflict_do_update(
-                    index_elements=['url'],
-                    set_={'entities': extracted_entities}
-                )
-                with self.engine.connect() as conn:
-                    conn.execute(stmt)
-                    conn.commit()
-                logging.info(f"Extracted and stored entities for {url}")
-            except SQLAlchemyError as db_err:
-                logging.error(f"Database error storing entities for {url}: {db_err}")
-            except Exception as e:
-                logging.error(f"Error processing entities for {url}: {e}")
-            return content
-
-        return await asyncio.to_thread(sync_process)
+        String-based entry point; wraps the content in a PageContext.
+        """
+        await self.process_page(PageContext(url, content))
+        return content
+
+    async def process_page(self, page: PageContext) -> None:
+        """
+        Queue the page's visible text (capped at ``max_chars``) for extraction.
+        Waits when ``max_pending`` pages are already queued.
+        """
+        text = page.text[:self.max_chars]
+        if not text:
+            return
+        self._start()
+        await self.queue.put((page.url, text))
+
+    async def _batch_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                break
+            batch: List[Tuple[str, str]] = [item]
+            deadline = loop.time() + self.batch_timeout
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            await self.in_flight.acquire()
+            task = asyncio.create_task(self._extract(batch))
+            self.batches.add(task)
+            task.add_done_callback(self.batches.discard)
+            if stop:
+                break
+
+    async def _extract(self, batch: List[Tuple[str, str]]) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+            texts = [text for _, text in batch]
+            urls = [url for url, _ in batch]
+            results = await loop.run_in_executor(self.executor, extract_batch, texts, self.batch_size)
+            # One batch at a time, in the order extraction finished: each batch reads what
+            # the previous one remembered, and a slow database read cannot let an older
+            # extraction of a page overwrite a newer one.
+            async with self.counting:
+                # Entities of re-extracted pages are replaced, so their old counts are removed.
+                unknown = [url for url in urls if url not in self.latest]
+                previous = await asyncio.to_thread(_previous_entities, unknown) if unknown else {}
+                extracted_at = datetime.now(timezone.utc).replace(tzinfo=None)
+                counts: Tuple[Counter, Counter] = (Counter(), Counter())
+                sink = get_sink()
+                for url, extracted_entities in zip(urls, results):
+                    domain = get_domain_name(url)
+                    old = self.latest.pop(url, None) or previous.pop(url, None)
+                    if old is not None:
+                        old_day = old.extracted_at.date() if old.extracted_at else UNKNOWN_DAY
+                        count_entities(counts, old.entities or [], old_day, old.domain or get_domain_name(url), -1)
+                    count_entities(counts, extracted_entities, extracted_at.date(), domain)
+                    self._remember(Extraction(url, extracted_entities, domain, extracted_at))
+                    row = {'url': url, 'entities': extracted_entities, 'domain': domain, 'extracted_at': extracted_at}
+                    await sink.write(entities_table, row, UPDATE)
+                for (day, domain, label), count in counts[0].items():
+                    if count:
+                        row = {'day': day, 'domain': domain, 'label': label, 'count': count}
+                        await sink.write(label_counts_table, row, INCREMENT)
+                for (day, domain, label, text), count in counts[1].items():
+                    if count:
+                        row = {'day': day, 'domain': domain, 'label': label, 'text': text, 'count': count}
+                        await sink.write(text_counts_table, row, INCREMENT)
+            logging.info(f"Extracted entities for {len(batch)} pages")
+        except Exception as e:
+            logging.error(f"Error extracting entities for {len(batch)} pages: {e}")
+        finally:
+            self.in_flight.release()
+
+    def _remember(self, extraction: Extraction) -> None:
+        self.latest[extraction.url] = extraction
+        if len(self.latest) > self.recent_pages:
+            self.latest.popitem(last=False)
+
+    async def close(self) -> None:
+        """
+        Process every queued page and wait for outstanding batches.
+        The process pool stays alive for the next crawl in this process.
+        """
+        if self.batcher is None or self.batcher.done():
+            return
+        await self.queue.put(None)
+        await self.batcher
+        if self.batches:
+            await asyncio.gather(*self.batches)
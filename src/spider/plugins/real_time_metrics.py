@@ -1,83 +1,204 @@
 import asyncio
+import logging
 import threading
 import time
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-import uvicorn
-from starlette.websockets import WebSocketState
-from spider.plugin import Plugin
-
-# Global metrics store and a set of connected WebSocket clients.
-metrics_data = {
-    "queueSize": 0,
-    "crawled": 0,
-    "errors": 0,
-    "performance": 0,
-    "timestamp": 0,
-}
-connected_clients = set()
-
-app = FastAPI()
-
-@app.get("/api/metrics")
-async def get_metrics():
-    """Return the current crawl metrics."""
-    return metrics_data
-
-@app.websocket("/ws/metrics")
-async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket endpoint to push live metrics updates."""
-    await websocket.accept()
-    connected_clients.add(websocket)
-    try:
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Set
+from spider import metrics
+from spider.plugin import Plugin, OBSERVE
+
+# Fetches slower than this count against the dashboard's performance score.
+PERFORMANCE_LATENCY = 2.5
+
+def dashboard_metrics() -> dict:
+    """
+    Summarize the crawl metrics registry into the fields the dashboard displays.
+    """
+    fetched = metrics.pages_fetched.get()
+    errors = metrics.fetch_errors.total()
+    attempts = fetched + errors
+    fast = metrics.stage_seconds.fraction_below(PERFORMANCE_LATENCY, stage='fetch')
+    return {
+        "queueSize": int(metrics.frontier_depth.get()),
+        "crawled": int(fetched),
+        # Percentage of fetch attempts that failed.
+        "errors": round(100 * errors / attempts, 1) if attempts else 0,
+        # Percentage of fetches completed within PERFORMANCE_LATENCY.
+        "performance": round(100 * fast, 1) if fast is not None else 100,
+        "timestamp": int(time.time() * 1000),
+    }
+
+class MetricsBroadcaster:
+    def __init__(self, interval: float = 1.0, history: int = 300, client_queue: int = 32) -> None:
+        """
+        Fan out dashboard snapshots to WebSocket clients at a fixed tick rate.
+
+        publish() may be called from any thread (the crawler runs on its own event loop)
+        and only replaces the latest snapshot, so any number of updates between two ticks
+        costs one message. The ticker runs on the server's loop, keeps the last
+        ``history`` snapshots for clients that connect late and sends each client only
+        the fields that changed. A client whose queue fills up is disconnected instead
+        of slowing everyone else down.
+
+        :param interval: Seconds between ticks.
+        :param history: Number of recent snapshots replayed to new clients.
+        :param client_queue: Messages buffered per client before it is dropped.
+        """
+        self.interval = float(interval)
+        self.client_queue = max(int(client_queue), 1)
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=max(int(history), 1))
+        self.clients: Set[asyncio.Queue] = set()
+        self._lock = threading.Lock()
+        self._latest: Optional[Dict[str, Any]] = None
+        self._sent: Dict[str, Any] = {}
+        self._ticker: Optional[asyncio.Task] = None
+
+    def publish(self, snapshot: Dict[str, Any]) -> None:
+        """
+        Offer a new snapshot; thread-safe and non-blocking.
+        """
+        with self._lock:
+            self._latest = snapshot
+
+    def start(self) -> None:
+        """
+        Start the ticker on the running (server) event loop.
+        """
+        if self._ticker is None or self._ticker.done():
+            self._ticker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._ticker:
+            self._ticker.cancel()
+            try:
+                await self._ticker
+            except asyncio.CancelledError:
+                pass
+            self._ticker = None
+
+    async def _run(self) -> None:
         while True:
-            await asyncio.sleep(0.1)
-    except WebSocketDisconnect:
-        connected_clients.discard(websocket)
+            await asyncio.sleep(self.interval)
+            self.tick()
 
-async def broadcast_metrics(new_metrics: dict):
+    def tick(self) -> None:
+        """
+        Send the changes since the previous tick to every client.
+        """
+        with self._lock:
+            snapshot, self._latest = self._latest, None
+        if snapshot is None:
+            return
+        delta = {k: v for k, v in snapshot.items() if self._sent.get(k) != v}
+        if set(delta) <= {"timestamp"}:
+            return
+        delta["timestamp"] = snapshot.get("timestamp")
+        self._sent = snapshot
+        self.history.append(snapshot)
+        for queue in list(self.clients):
+            try:
+                queue.put_nowait(delta)
+            except asyncio.QueueFull:
+                self.drop(queue)
+
+    def drop(self, queue: asyncio.Queue) -> None:
+        # Discard the backlog and wake the sender with the disconnect sentinel.
+        self.clients.discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+        logging.info("Dropped slow metrics client")
+
+    def subscribe(self) -> asyncio.Queue:
+        """
+        Register a client; its queue starts with the recent history as full snapshots.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.client_queue + len(self.history))
+        for snapshot in self.history:
+            queue.put_nowait(snapshot)
+        self.clients.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self.clients.discard(queue)
+
+broadcaster = MetricsBroadcaster()
+
+def create_app():
     """
-    Update the global metrics_data and send the new metrics as JSON to all connected clients.
-    Checks if a client is still connected before sending.
+    Build the dashboard's FastAPI app. FastAPI is imported here rather than at module
+    level, so the crawler only pays for it when the metrics server actually runs.
     """
-    metrics_data.update(new_metrics)
-    for client in list(connected_clients):
-        if client.client_state != WebSocketState.CONNECTED:
-            connected_clients.discard(client)
-            continue
+    from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+    from fastapi.responses import PlainTextResponse
+
+    app = FastAPI()
+
+    @app.get("/api/metrics")
+    async def get_metrics():
+        """Return the current crawl metrics: dashboard summary plus every raw metric."""
+        return {**dashboard_metrics(), "metrics": metrics.registry.snapshot()}
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def get_prometheus_metrics():
+        """Return every crawl metric in the Prometheus text format."""
+        return PlainTextResponse(metrics.registry.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+    @app.on_event("startup")
+    async def start_broadcaster():
+        broadcaster.start()
+
+    @app.on_event("shutdown")
+    async def stop_broadcaster():
+        await broadcaster.stop()
+
+    @app.websocket("/ws/metrics")
+    async def websocket_endpoint(websocket: WebSocket):
+        """WebSocket endpoint to push live metrics updates."""
+        await websocket.accept()
+        queue = broadcaster.subscribe()
         try:
-            await client.send_json(new_metrics)
-        except Exception:
-            connected_clients.discard(client)
+            while True:
+                message = await queue.get()
+                if message is None:
+                    # Too slow to keep up; the client may reconnect and replay the history.
+                    await websocket.close(code=1013)
+                    break
+                await websocket.send_json(message)
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        finally:
+            broadcaster.unsubscribe(queue)
+
+    return app
 
 class RealTimeMetricsPlugin(Plugin):
-    def __init__(self, host: str = "0.0.0.0", port: int = 3001):
+    mode = OBSERVE
+
+    def __init__(self, host: str = "0.0.0.0", port: int = 3001, interval: float = 1.0):
         self.host = host
         self.port = port
+        self.interval = interval
+        broadcaster.interval = interval
+        self._next_publish = 0.0
         # Start the FastAPI server in a background thread.
         thread = threading.Thread(target=self.run_server, daemon=True)
         thread.start()
 
     def run_server(self):
-        uvicorn.run(app, host=self.host, port=self.port, log_level="info")
+        import uvicorn
+        uvicorn.run(create_app(), host=self.host, port=self.port, log_level="info")
 
     async def should_run(self, url: str, content: str) -> bool:
         return True
 
     async def process(self, url: str, content: str) -> str:
         """
-        Simulates a metrics update based on the URL's length and broadcasts the updated metrics
-        via WebSocket. Returns the content unmodified.
+        Hands the current crawl metrics to the broadcaster, at most once per tick.
+        Returns the content unmodified.
         """
-        new_metrics = {
-            "queueSize": len(url) % 50,
-            "crawled": (len(url) + 10) % 100,
-            "errors": len(url) % 5,
-            "performance": 100 - (len(url) % 20),
-            "timestamp": int(time.time() * 1000)
-        }
-        # Schedule asynchronous broadcast without blocking.
-        asyncio.create_task(self.async_broadcast(new_metrics))
+        now = time.monotonic()
+        if now >= self._next_publish:
+            self._next_publish = now + self.interval
+            broadcaster.publish(dashboard_metrics())
         return content
-
-    async def async_broadcast(self, new_metrics: dict):
-        await broadcast_metrics(new_metrics)
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+from typing import Any, List, Optional, Sequence
+
+class RenderResult:
+    def __init__(self, url: str, html: str, text: str = '', images: Optional[List[str]] = None) -> None:
+        """
+        The outcome of rendering a page in a browser.
+
+        :param url: The rendered URL.
+        :param html: The rendered HTML.
+        :param text: The visible text of the page.
+        :param images: Image URLs found on the page.
+        """
+        self.url = url
+        self.html = html
+        self.text = text
+        self.images = images or []
+
+class Renderer:
+    """
+    Interface for rendering pages that need JavaScript. Implementations must be safe to
+    call concurrently; tests can substitute a stub.
+    """
+    async def render(self, url: str) -> RenderResult:
+        raise NotImplementedError("Renderers must implement the async render method.")
+
+    async def close(self) -> None:
+        pass
+
+class _Slot:
+    def __init__(self, context: Any, page: Any) -> None:
+        self.context = context
+        self.page = page
+        self.uses = 0
+
+class PlaywrightRenderer(Renderer):
+    def __init__(self, max_contexts: int = 2, recycle_after: int = 50,
+                 block_resources: Sequence[str] = ('image', 'font', 'media'),
+                 max_queue: int = 16, timeout: int = 60000, wait_until: str = 'networkidle') -> None:
+        """
+        Long-lived pool of headless Chromium contexts. One browser is launched on first
+        use; each context keeps one page that is reused for many renders and recycled
+        after ``recycle_after`` uses to bound memory growth.
+
+        :param max_contexts: Browser contexts (and so pages rendered at once).
+        :param recycle_after: Renders after which a context is closed and replaced.
+        :param block_resources: Playwright resource types that are aborted, e.g. images.
+        :param max_queue: Render requests allowed in flight or waiting; further callers wait.
+        :param timeout: Navigation timeout in milliseconds.
+        :param wait_until: Load state to wait for before reading the page.
+        """
+        self.max_contexts = max(int(max_contexts), 1)
+        self.recycle_after = max(int(recycle_after), 1)
+        self.block_resources = frozenset(block_resources or ())
+        self.timeout = timeout
+        self.wait_until = wait_until
+        self.max_queue = max(int(max_queue), self.max_contexts)
+        self.queue_slots = asyncio.Semaphore(self.max_queue)
+        self._playwright = None
+        self._browser = None
+        self._slots: Optional[asyncio.Queue] = None
+        self._start_lock = asyncio.Lock()
+
+    async def _start(self) -> None:
+        async with self._start_lock:
+            if self._browser is not None:
+                return
+            self._browser = await self._launch()
+            self._slots = asyncio.Queue()
+            for _ in range(self.max_contexts):
+                self._slots.put_nowait(None)
+            logging.info(f"PlaywrightRenderer: launched Chromium with {self.max_contexts} contexts")
+
+    async def _launch(self) -> Any:
+        """
+        Start Playwright and launch headless Chromium. Tests override this to pool stub
+        browsers instead.
+        """
+        from playwright.async_api import async_playwright
+        self._playwright = await async_playwright().start()
+        return await self._playwright.chromium.launch(headless=True)
+
+    async def _new_slot(self) -> _Slot:
+        context = await self._browser.new_context()
+        if self.block_resources:
+            async def block(route):
+                if route.request.resource_type in self.block_resources:
+                    await route.abort()
+                else:
+                    await route.continue_()
+            await context.route("**/*", block)
+        page = await context.new_page()
+        return _Slot(context, page)
+
+    async def _discard(self, slot: Optional[_Slot]) -> None:
+        if slot is not None:
+            try:
+                await slot.context.close()
+            except Exception as e:
+                logging.debug(f"PlaywrightRenderer: error closing context: {e}")
+
+    async def render(self, url: str) -> RenderResult:
+        """
+        Render a URL in a pooled browser context.
+
+        :param url: The URL to render.
+        :return: The rendered HTML, visible text and image URLs.
+        """
+        async with self.queue_slots:
+            if self._browser is None:
+                await self._start()
+            slot = await self._slots.get()
+            try:
+                if slot is None:
+                    slot = await self._new_slot()
+                page = slot.page
+                await page.goto(url, timeout=self.timeout, wait_until=self.wait_until)
+                html = await page.content()
+                text = await page.evaluate("() => document.body ? document.body.innerText : ''")
+                images = await page.eval_on_selector_all(
+                    "img[src]", "imgs => imgs.map(img => img.getAttribute('src'))"
+                )
+                slot.uses += 1
+                return RenderResult(url, html, text, images)
+            except BaseException:
+                # A failed or timed-out (cancelled) page may be left in a bad state; start fresh next time.
+                await self._discard(slot)
+                slot = None
+                raise
+            finally:
+                if slot is not None and slot.uses >= self.recycle_after:
+                    await self._discard(slot)
+                    slot = None
+                self._slots.put_nowait(slot)
+
+    async def close(self) -> None:
+        """
+        Close every context, the browser and Playwright.
+        """
+        if self._browser is None:
+            return
+        while not self._slots.empty():
+            await self._discard(self._slots.get_nowait())
+        await self._browser.close()
+        if self._playwright is not None:
+            await self._playwright.stop()
+        self._browser = None
+        self._playwright = None
+        self._slots = None
+        # Fresh primitives, in case the renderer is reused from another event loop.
+        self.queue_slots = asyncio.Semaphore(self.max_queue)
+        self._start_lock = asyncio.Lock()
+
+def create_renderer(config: dict) -> Renderer:
+    """
+    Build the Playwright renderer pool from ``config['renderer']``.
+
+    :param config: Configuration dictionary.
+    :return: A PlaywrightRenderer.
+    """
+    settings = config.get('renderer') or {}
+    return PlaywrightRenderer(
+        max_contexts=int(settings.get('max_contexts', 2)),
+        recycle_after=int(settings.get('recycle_after', 50)),
+        block_resources=settings.get('block_resources', ('image', 'font', 'media')),
+        max_queue=int(settings.get('max_queue', 16)),
+        timeout=int(settings.get('timeout', 60000))
+    )
@@ -0,0 +1,143 @@
+import argparse
+import asyncio
+import itertools
+import logging
+import re
+import time
+from typing import Dict, Iterable, List, Optional
+from spider.config import config
+from spider.main import build_plugin_manager
+from spider.page import PageContext
+from spider.parse_pool import ParsePool, get_parse_pool
+from spider.plugin import PluginManager
+from spider.storage import close_sink, content_hash, save_page
+from spider.streaming import sniff_charset
+from spider.warc import HttpResponse, iter_response_records, parse_http_response
+
+# Records read from the WARC files per hop to the reader thread.
+READ_BATCH_SIZE = 64
+
+_CHARSET = re.compile(r'charset\s*=\s*["\']?([^"\';\s]+)', re.IGNORECASE)
+
+def decode_body(response: HttpResponse) -> str:
+    """
+    Decode a recorded body the way the crawler decoded it when fetching.
+    """
+    match = _CHARSET.search(response.headers.get('Content-Type', ''))
+    return response.body.decode(sniff_charset(response.body, match.group(1) if match else None), errors='replace')
+
+async def replay_response(response: HttpResponse, plugin_manager: PluginManager,
+                          parse_pool: Optional[ParsePool] = None, store: bool = True) -> None:
+    """
+    Run one recorded response through parsing, the plugins and storage, as process_url
+    does for a fetched page.
+
+    :param response: A response read from a WARC file.
+    :param plugin_manager: The plugins to run.
+    :param parse_pool: Parse in worker processes; None parses in a thread.
+    :param store: Save the processed page.
+    """
+    content = await asyncio.to_thread(decode_body, response)
+    if parse_pool:
+        page = PageContext(response.url, content, parsed=await parse_pool.parse(response.url, content))
+    else:
+        page = PageContext(response.url, content)
+        await asyncio.to_thread(page.parse)
+    processed_content = await plugin_manager.run_plugins(page)
+    if store:
+        headers = {name.lower(): value for name, value in response.headers.items()}
+        await save_page(
+            response.url, processed_content,
+            etag=headers.get('etag'),
+            last_modified=headers.get('last-modified'),
+            content_hash=content_hash(content)
+        )
+
+async def replay(paths: Iterable[str], plugin_manager: PluginManager, workers: int = 8, store: bool = True,
+                 limit: Optional[int] = None, parse_pool: Optional[ParsePool] = None) -> Dict[str, int]:
+    """
+    Reprocess the pages recorded in WARC files without touching the network. The files
+    are read in a worker thread and ``workers`` pages are processed at once.
+
+    :param paths: WARC files and directories of them.
+    :param plugin_manager: The plugins to run.
+    :param workers: Pages processed concurrently.
+    :param store: Save the processed pages.
+    :param limit: Stop after this many recorded responses.
+    :param parse_pool: Parse in worker processes; None parses in a thread.
+    :return: Counts of replayed, skipped and failed pages; records that cannot be
+        parsed count as failed.
+    """
+    workers = max(int(workers), 1)
+    counts = {'pages': 0, 'skipped': 0, 'errors': 0}
+    queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 4)
+    records = iter_response_records(paths)
+    if limit is not None:
+        records = itertools.islice(records, limit)
+
+    async def read() -> None:
+        try:
+            while True:
+                batch = await asyncio.to_thread(list, itertools.islice(records, READ_BATCH_SIZE))
+                if not batch:
+                    break
+                for record in batch:
+                    await queue.put(record)
+        finally:
+            for _ in range(workers):
+                await queue.put(None)
+
+    async def work() -> None:
+        while True:
+            record = await queue.get()
+            if record is None:
+                return
+            try:
+                response = parse_http_response(record)
+                if response.status != 200 or not response.body:
+                    counts['skipped'] += 1
+                    continue
+                await replay_response(response, plugin_manager, parse_pool, store)
+                counts['pages'] += 1
+            except Exception as e:
+                counts['errors'] += 1
+                logging.error(f"Error replaying {record.url}: {e}")
+
+    try:
+        await asyncio.gather(read(), *(work() for _ in range(workers)))
+    finally:
+        try:
+            await plugin_manager.close()
+            if parse_pool:
+                await parse_pool.close()
+        finally:
+            await close_sink()
+    return counts
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Re-run the plugins and storage over pages recorded in WARC files, without crawling."
+    )
+    parser.add_argument('paths', nargs='+', help="WARC files or directories of them")
+    parser.add_argument('--plugins', nargs='*', help="plugins to run (default: plugins.enabled)")
+    parser.add_argument('--workers', type=int, default=config.get('threads', 8), help="pages processed at once")
+    parser.add_argument('--limit', type=int, help="stop after this many recorded responses")
+    parser.add_argument('--no-store', action='store_true', help="run the plugins without saving pages")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    plugin_manager = build_plugin_manager(config['plugins']['enabled'] if args.plugins is None else args.plugins)
+    start = time.perf_counter()
+    counts = asyncio.run(replay(
+        args.paths, plugin_manager, workers=args.workers, store=not args.no_store,
+        limit=args.limit, parse_pool=get_parse_pool(config)
+    ))
+    elapsed = time.perf_counter() - start
+    logging.info(f"Replayed {counts['pages']} pages in {elapsed:.1f}s ({counts['pages'] / max(elapsed, 1e-9):.1f} pages/s), "
+                 f"{counts['skipped']} skipped, {counts['errors']} errors")
+    for name, stats in plugin_manager.stats().items():
+        logging.info(f"Plugin {name}: {stats['calls']} calls, avg {stats['avg_time']:.3f}s, "
+                     f"max {stats['max_time']:.3f}s, {stats['errors']} errors, {stats['timeouts']} timeouts")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+import asyncio
+import async_timeout
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Pattern, Tuple
+from urllib.parse import urlparse
+
+# RFC 9309: crawlers must read at least 500 KiB of robots.txt; anything beyond is ignored.
+MAX_ROBOTS_BYTES = 500 * 1024
+
+def _compile(pattern: str) -> Pattern:
+    """
+    Compile a robots.txt path pattern: ``*`` matches any run of characters and a
+    trailing ``$`` anchors the end of the path.
+    """
+    anchored = pattern.endswith('$')
+    if anchored:
+        pattern = pattern[:-1]
+    regex = '.*'.join(re.escape(part) for part in pattern.split('*'))
+    return re.compile(regex + ('$' if anchored else ''))
+
+class RobotsRules:
+    def __init__(self, rules: Optional[List[Tuple[bool, str]]] = None, crawl_delay: Optional[float] = None,
+                 sitemaps: Optional[List[str]] = None) -> None:
+        """
+        The rules of one robots.txt group, compiled once. The longest matching pattern
+        decides; on a tie, Allow wins.
+
+        :param rules: ``(allow, pattern)`` pairs.
+        :param crawl_delay: The group's Crawl-delay in seconds, if any.
+        :param sitemaps: Sitemap URLs listed anywhere in the file.
+        """
+        self.crawl_delay = crawl_delay
+        self.sitemaps = sitemaps or []
+        # Most specific first, so the first match is the deciding one.
+        ordered = sorted((rule for rule in rules or [] if rule[1]), key=lambda rule: (-len(rule[1]), not rule[0]))
+        self.rules: List[Tuple[bool, Optional[Pattern], str]] = [
+            (allow, _compile(pattern) if ('*' in pattern or pattern.endswith('$')) else None, pattern)
+            for allow, pattern in ordered
+        ]
+
+    def allowed(self, path: str) -> bool:
+        """
+        Check a path (with query string) against the rules.
+        """
+        if path == '/robots.txt':
+            return True
+        for allow, regex, prefix in self.rules:
+            if regex.match(path) if regex else path.startswith(prefix):
+                return allow
+        return True
+
+ALLOW_ALL = RobotsRules()
+DISALLOW_ALL = RobotsRules([(False, '/')])
+
+def parse_robots(text: str, user_agent: str) -> RobotsRules:
+    """
+    Parse robots.txt and return the rules that apply to ``user_agent``: those of the
+    groups whose User-agent equals the crawler's product token (compared
+    case-insensitively, as RFC 9309 requires), otherwise those of the ``*`` groups.
+    Several matching groups are combined.
+
+    :param text: The robots.txt body.
+    :param user_agent: The crawler's User-Agent header.
+    :return: The compiled rules.
+    """
+    token = user_agent.split('/')[0].strip().lower()
+    groups: List[Tuple[List[str], List[Tuple[bool, str]], List[Optional[float]]]] = []
+    sitemaps: List[str] = []
+    agents: List[str] = []
+    rules: List[Tuple[bool, str]] = []
+    delay: List[Optional[float]] = [None]
+    in_rules = False
+    for line in text.splitlines():
+        line = line.split('#', 1)[0].strip()
+        if ':' not in line:
+            continue
+        field, value = (part.strip() for part in line.split(':', 1))
+        field = field.lower()
+        if field == 'user-agent':
+            if in_rules:
+                # A User-agent after rules starts a new group.
+                groups.append((agents, rules, delay))
+                agents, rules, delay = [], [], [None]
+                in_rules = False
+            # Product token only: "ExampleBot/2.1" names the same crawler as "examplebot".
+            agents.append(value.split('/')[0].strip().lower())
+        elif field in ('allow', 'disallow'):
+            in_rules = True
+            if agents:
+                rules.append((field == 'allow', value))
+        elif field == 'crawl-delay':
+            in_rules = True
+            try:
+                delay[0] = float(value)
+            except ValueError:
+                pass
+        elif field == 'sitemap' and value:
+            sitemaps.append(value)
+    if agents:
+        groups.append((agents, rules, delay))
+
+    matched = [group for group in groups if token in group[0]]
+    if not matched:
+        matched = [group for group in groups if '*' in group[0]]
+    if not matched:
+        return RobotsRules(sitemaps=sitemaps)
+    rules = [rule for _, group_rules, _ in matched for rule in group_rules]
+    delays = [group_delay[0] for _, _, group_delay in matched if group_delay[0] is not None]
+    return RobotsRules(rules, delays[0] if delays else None, sitemaps)
+
+def _origin(url: str) -> str:
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}".lower()
+
+def _path(url: str) -> str:
+    parsed = urlparse(url)
+    return (parsed.path or '/') + (f"?{parsed.query}" if parsed.query else '')
+
+class RobotsCache:
+    def __init__(self, user_agent: str, ttl: float = 86400, error_ttl: float = 600, max_hosts: int = 10000,
+                 timeout: float = 10, scheduler=None, max_crawl_delay: float = 60) -> None:
+        """
+        Per-host cache of parsed robots.txt files. Each host's file is fetched once per
+        ``ttl`` (concurrent lookups share the fetch) and its Crawl-delay is passed to the
+        politeness scheduler.
+
+        Following RFC 9309, a 4xx answer allows everything and a 5xx answer or network
+        error disallows everything; those results are retried after ``error_ttl``.
+
+        :param user_agent: The crawler's User-Agent, used to pick the rule group.
+        :param ttl: Seconds a fetched robots.txt is trusted.
+        :param error_ttl: Seconds an unreachable robots.txt blocks its host.
+        :param max_hosts: Hosts kept in the cache; the least recently used are evicted.
+        :param timeout: Seconds allowed for fetching robots.txt.
+        :param scheduler: Optional HostScheduler that receives Crawl-delay values.
+        :param max_crawl_delay: Upper bound applied to Crawl-delay values.
+        """
+        self.user_agent = user_agent
+        self.ttl = float(ttl)
+        self.error_ttl = float(error_ttl)
+        self.max_hosts = max(int(max_hosts), 1)
+        self.timeout = float(timeout)
+        self.scheduler = scheduler
+        self.max_crawl_delay = float(max_crawl_delay)
+        self.entries: 'OrderedDict[str, Tuple[RobotsRules, float]]' = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    async def rules_for(self, session, url: str) -> RobotsRules:
+        """
+        Return the robots rules of the URL's host, fetching robots.txt if needed.
+
+        :param session: The aiohttp session.
+        :param url: Any URL on the host.
+        """
+        origin = _origin(url)
+        entry = self.entries.get(origin)
+        if entry and entry[1] > time.monotonic():
+            self.entries.move_to_end(origin)
+            return entry[0]
+        pending = self._pending.get(origin)
+        if pending:
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[origin] = future
+        try:
+            rules, ttl = await self._fetch(session, origin)
+            self.entries[origin] = (rules, time.monotonic() + ttl)
+            self.entries.move_to_end(origin)
+            while len(self.entries) > self.max_hosts:
+                self.entries.popitem(last=False)
+            if rules.crawl_delay and self.scheduler:
+                self._apply_crawl_delay(urlparse(origin).hostname or '', rules.crawl_delay)
+            future.set_result(rules)
+            return rules
+        except asyncio.CancelledError:
+            # Only happens on shutdown; waiters are cancelled along with the fetch.
+            future.cancel()
+            raise
+        finally:
+            del self._pending[origin]
+
+    def _apply_crawl_delay(self, host: str, delay: float) -> None:
+        # Crawl-delay can only slow a host down below its configured rate.
+        configured = float(self.scheduler.settings_for(host)['rate_limit'])
+        delay = min(delay, self.max_crawl_delay)
+        if delay > configured:
+            self.scheduler.set_rate_limit(host, delay)
+
+    async def _fetch(self, session, origin: str) -> Tuple[RobotsRules, float]:
+        url = f"{origin}/robots.txt"
+        try:
+            async with async_timeout.timeout(self.timeout):
+                async with session.get(url, headers={'User-Agent': self.user_agent}) as response:
+                    if response.status >= 500:
+                        logging.warning(f"robots.txt at {url} returned {response.status}; not crawling host for now")
+                        return DISALLOW_ALL, self.error_ttl
+                    if response.status >= 400:
+                        return ALLOW_ALL, self.ttl
+                    body = await response.content.read(MAX_ROBOTS_BYTES)
+        except Exception as e:
+            logging.warning(f"Could not fetch {url}: {e}; not crawling host for now")
+            return DISALLOW_ALL, self.error_ttl
+        rules = parse_robots(body.decode('utf-8', 'replace'), self.user_agent)
+        logging.debug(f"Loaded {url}: {len(rules.rules)} rules, crawl delay {rules.crawl_delay}")
+        return rules, self.ttl
+
+    async def allowed(self, session, url: str) -> bool:
+        """
+        Check whether robots.txt allows fetching a URL.
+        """
+        rules = await self.rules_for(session, url)
+        return rules.allowed(_path(url))
+
+    async def filter(self, session, urls: List[str]) -> List[str]:
+        """
+        Keep the URLs robots.txt allows, looking up each host's rules once.
+
+        :param session: The aiohttp session.
+        :param urls: URLs, possibly on many hosts.
+        :return: The allowed URLs, in their original order.
+        """
+        origins = {_origin(url) for url in urls}
+        rules = dict(zip(origins, await asyncio.gather(*(self.rules_for(session, origin) for origin in origins))))
+        return [url for url in urls if rules[_origin(url)].allowed(_path(url))]
+
+def create_robots_cache(config: dict, scheduler=None) -> Optional[RobotsCache]:
+    """
+    Build the robots.txt cache from ``config['robots']``, or None when disabled.
+
+    :param config: Configuration dictionary.
+    :param scheduler: Optional HostScheduler that receives Crawl-delay values.
+    """
+    settings = config.get('robots') or {}
+    if not settings.get('enabled', True):
+        return None
+    return RobotsCache(
+        config.get('user_agent', 'MyCrawler/1.0'),
+        ttl=float(settings.get('ttl', 86400)),
+        error_ttl=float(settings.get('error_ttl', 600)),
+        max_hosts=int(settings.get('max_hosts', 10000)),
+        timeout=float(config.get('timeout', 10)),
+        scheduler=scheduler if settings.get('crawl_delay', True) else None,
+        max_crawl_delay=float(settings.get('max_crawl_delay', 60))
+    )
@@ -0,0 +1,218 @@
+import asyncio
+import heapq
+import logging
+import socket
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+class TokenBucket:
+    def __init__(self, rate_limit: float, burst: int = 1) -> None:
+        """
+        A token bucket that refills one token every ``rate_limit`` seconds.
+
+        :param rate_limit: Seconds between requests once the burst is used up.
+        :param burst: Maximum number of tokens (back-to-back requests) the bucket holds.
+        """
+        self.rate_limit = max(float(rate_limit), 0.0)
+        self.burst = max(int(burst), 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        if self.rate_limit <= 0:
+            self.tokens = float(self.burst)
+        else:
+            self.tokens = min(float(self.burst), self.tokens + (now - self.updated) / self.rate_limit)
+        self.updated = now
+
+    def ready_at(self, now: float) -> float:
+        """
+        Return the monotonic time at which the next token becomes available.
+        """
+        self._refill(now)
+        if self.tokens >= 1:
+            return max(now, self.blocked_until)
+        return max(now + (1 - self.tokens) * self.rate_limit, self.blocked_until)
+
+    def consume(self, now: float) -> bool:
+        """
+        Take one token if available.
+
+        :return: True if a token was taken.
+        """
+        self._refill(now)
+        if self.tokens >= 1 and now >= self.blocked_until:
+            self.tokens -= 1
+            return True
+        return False
+
+class HostScheduler:
+    def __init__(self, config: dict) -> None:
+        """
+        Politeness scheduler that keeps one wait queue and one token bucket per host
+        (or per IP address), and releases waiters from a heap ordered by ready time.
+        Requests to different hosts proceed in parallel; each host only sees its own delay.
+
+        :param config: Configuration dictionary; reads ``rate_limit`` and ``politeness``.
+        """
+        politeness = config.get('politeness') or {}
+        self.default_rate_limit = float(config.get('rate_limit', 1))
+        self.default_burst = int(politeness.get('burst', 1))
+        self.per_ip = bool(politeness.get('per_ip', False))
+        self.overrides: Dict[str, Dict[str, Any]] = {
+            domain.lower().lstrip('.'): settings or {}
+            for domain, settings in (politeness.get('domains') or {}).items()
+        }
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.waiters: Dict[str, Deque[asyncio.Future]] = {}
+        self.ready: List[Tuple[float, str]] = []
+        self.scheduled: set = set()
+        self.ip_cache: Dict[str, str] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def settings_for(self, host: str) -> Dict[str, Any]:
+        """
+        Resolve the politeness settings for a host, applying the most specific domain override.
+
+        :param host: The host name.
+        :return: A dict with ``rate_limit`` and ``burst``.
+        """
+        settings = {'rate_limit': self.default_rate_limit, 'burst': self.default_burst}
+        labels = host.lower().split('.')
+        # Walk from the full host up to the registrable suffix; first match wins.
+        for i in range(len(labels)):
+            override = self.overrides.get('.'.join(labels[i:]))
+            if override:
+                settings.update(override)
+                break
+        return settings
+
+    def set_rate_limit(self, host: str, rate_limit: float) -> None:
+        """
+        Override the delay for a host at runtime (e.g., from a robots.txt Crawl-delay).
+
+        :param host: The host name.
+        :param rate_limit: Seconds between requests.
+        """
+        host = host.lower()
+        self.overrides.setdefault(host, {})['rate_limit'] = rate_limit
+        bucket = self.buckets.get(self.ip_cache.get(host, host) if self.per_ip else host)
+        if bucket:
+            bucket.rate_limit = max(float(rate_limit), 0.0)
+
+    def penalize(self, url: str, seconds: float) -> None:
+        """
+        Pause a host, e.g. for the Retry-After of a 429 or 503 response.
+
+        :param url: A URL on the host.
+        :param seconds: How long to send the host no requests.
+        """
+        host = (urlparse(url).hostname or '').lower()
+        key = self.ip_cache.get(host, host) if self.per_ip else host
+        bucket = self._bucket(key, host)
+        bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + seconds)
+        logging.info(f"Pausing {host} for {seconds:.1f}s")
+
+    async def _key(self, host: str) -> str:
+        if not self.per_ip:
+            return host
+        if host not in self.ip_cache:
+            try:
+                loop = asyncio.get_running_loop()
+                infos = await loop.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+                self.ip_cache[host] = infos[0][4][0] if infos else host
+            except OSError:
+                self.ip_cache[host] = host
+        return self.ip_cache[host]
+
+    def _bucket(self, key: str, host: str) -> TokenBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            settings = self.settings_for(host)
+            bucket = TokenBucket(settings['rate_limit'], settings['burst'])
+            self.buckets[key] = bucket
+        return bucket
+
+    def _schedule(self, key: str, now: float) -> None:
+        if key in self.scheduled:
+            return
+        self.scheduled.add(key)
+        heapq.heappush(self.ready, (self.buckets[key].ready_at(now), key))
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def acquire(self, url: str) -> None:
+        """
+        Wait until the host of ``url`` may be contacted again.
+
+        :param url: The URL about to be fetched.
+        """
+        host = (urlparse(url).hostname or '').lower()
+        key = await self._key(host)
+        bucket = self._bucket(key, host)
+        now = time.monotonic()
+        if not self.waiters.get(key) and bucket.consume(now):
+            return
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(key, deque()).append(future)
+        self._schedule(key, now)
+        await future
+
+    async def _dispatch(self) -> None:
+        """
+        Release waiters as their host's ready time comes up.
+        """
+        while True:
+            if not self.ready:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            ready_at, key = self.ready[0]
+            now = time.monotonic()
+            if ready_at > now:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), ready_at - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self.ready)
+            self.scheduled.discard(key)
+            queue = self.waiters.get(key)
+            while queue and queue[0].done():
+                queue.popleft()
+            if not queue:
+                self.waiters.pop(key, None)
+                continue
+            if self.buckets[key].consume(now):
+                queue.popleft().set_result(None)
+            if queue:
+                self._schedule(key, now)
+            else:
+                self.waiters.pop(key, None)
+
+    async def close(self) -> None:
+        """
+        Stop the dispatcher task and cancel any remaining waiters.
+        """
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        for queue in self.waiters.values():
+            for future in queue:
+                future.cancel()
+        self.waiters.clear()
+        self.ready.clear()
+        self.scheduled.clear()
+        logging.debug("HostScheduler closed")
@@ -0,0 +1,230 @@
+import fnmatch
+import ipaddress
+import logging
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Pattern, Sequence, Set
+
+# Where distributions install Mozilla's Public Suffix List (e.g. Debian's publicsuffix package).
+SYSTEM_SUFFIX_LISTS = (
+    '/usr/share/publicsuffix/public_suffix_list.dat',
+    '/usr/local/share/publicsuffix/public_suffix_list.dat',
+)
+
+# Used when no list file is available: common multi-label suffixes, so at least
+# example.co.uk and user.github.io get the right registered domain.
+FALLBACK_SUFFIXES = (
+    'co.uk', 'org.uk', 'ac.uk', 'gov.uk', 'ltd.uk', 'plc.uk', 'me.uk', 'net.uk',
+    'com.au', 'net.au', 'org.au', 'edu.au', 'gov.au', 'co.nz', 'org.nz', 'govt.nz',
+    'co.jp', 'ne.jp', 'or.jp', 'ac.jp', 'go.jp', 'co.kr', 'or.kr', 'com.cn', 'net.cn', 'org.cn', 'gov.cn',
+    'com.br', 'net.br', 'org.br', 'gov.br', 'co.in', 'net.in', 'org.in', 'gov.in', 'ac.in',
+    'com.mx', 'com.ar', 'com.tr', 'com.tw', 'com.hk', 'com.sg', 'com.my', 'co.za', 'co.il', 'ac.il',
+    'github.io', 'gitlab.io', 'herokuapp.com', 'blogspot.com', 'appspot.com', 'pages.dev', 'netlify.app',
+    'vercel.app', 'cloudfront.net', 's3.amazonaws.com',
+)
+
+_RULE = '$'
+_EXCEPTION = '!'
+
+class PublicSuffixList:
+    def __init__(self, rules: Iterable[str]) -> None:
+        """
+        Public Suffix List rules compiled into a trie keyed by labels from the right, so a
+        host is resolved in one walk over its labels. Supports ``*`` wildcards and ``!``
+        exceptions; unknown TLDs count as one-label suffixes.
+
+        :param rules: Lines of a public_suffix_list.dat file, or bare suffixes.
+        """
+        self.root: Dict[str, dict] = {}
+        for line in rules:
+            line = line.strip()
+            if not line or line.startswith('//'):
+                continue
+            rule = line.split()[0].lower()
+            marker = _RULE
+            if rule.startswith('!'):
+                marker, rule = _EXCEPTION, rule[1:]
+            node = self.root
+            for label in reversed(rule.split('.')):
+                node = node.setdefault(label, {})
+            node[marker] = True
+
+    def suffix_labels(self, labels: Sequence[str]) -> int:
+        """
+        Number of trailing labels that form the public suffix.
+
+        :param labels: The host's labels, right to left.
+        """
+        best = 1
+        node = self.root
+        for depth, label in enumerate(labels):
+            child = node.get(label)
+            if child is not None and _EXCEPTION in child:
+                return depth
+            wildcard = node.get('*')
+            if wildcard is not None and _RULE in wildcard:
+                best = max(best, depth + 1)
+            if child is None:
+                break
+            if _RULE in child:
+                best = max(best, depth + 1)
+            node = child
+        return best
+
+    def registered_domain(self, host: str) -> str:
+        """
+        The registrable domain of a host: its public suffix plus one label, e.g.
+        ``bbc.co.uk`` for ``www.bbc.co.uk``. IP addresses are returned as they are.
+
+        :return: The registered domain, or '' if the host is itself a public suffix.
+        """
+        host = host.strip('[]').rstrip('.').lower()
+        if not host:
+            return ''
+        try:
+            ipaddress.ip_address(host)
+            return host
+        except ValueError:
+            pass
+        labels = host.split('.')
+        size = self.suffix_labels(labels[::-1])
+        if len(labels) <= size:
+            return ''
+        return '.'.join(labels[-size - 1:])
+
+@lru_cache(maxsize=None)
+def load_public_suffix_list(path: Optional[str] = None) -> PublicSuffixList:
+    """
+    Load and compile the Public Suffix List once per process: from ``path``, else from
+    the copy installed by the system, else the small built-in fallback.
+
+    :param path: A public_suffix_list.dat file.
+    """
+    for candidate in ([path] if path else []) + list(SYSTEM_SUFFIX_LISTS):
+        if os.path.exists(candidate):
+            with open(candidate, encoding='utf-8') as f:
+                return PublicSuffixList(f)
+    if path:
+        logging.warning(f"Public suffix list {path} not found; using built-in suffixes")
+    else:
+        logging.info("No public suffix list installed; using built-in suffixes")
+    return PublicSuffixList(FALLBACK_SUFFIXES)
+
+def _compile_globs(patterns: Iterable[str]) -> Optional[Pattern]:
+    patterns = [pattern for pattern in patterns if pattern]
+    if not patterns:
+        return None
+    return re.compile('|'.join(f"(?:{fnmatch.translate(pattern)})" for pattern in patterns))
+
+def _split(url: str):
+    # Canonical URLs always look like scheme://[userinfo@]host[:port][/path][?query].
+    parts = url.split('/', 3)
+    netloc = parts[2].rpartition('@')[2] if len(parts) > 2 else ''
+    if netloc.startswith('['):
+        host = netloc[1:netloc.find(']')]
+    else:
+        host = netloc.partition(':')[0]
+    return host, '/' + (parts[3] if len(parts) > 3 else '')
+
+class ScopeFilter:
+    def __init__(self, sites: Iterable[str] = (), same_site: bool = True, allow_hosts: Iterable[str] = (),
+                 deny_hosts: Iterable[str] = (), allow_paths: Iterable[str] = (), deny_paths: Iterable[str] = (),
+                 suffixes: Optional[PublicSuffixList] = None, max_hosts: int = 100000) -> None:
+        """
+        Decides which discovered links belong to the crawl. A URL is in scope when its
+        host matches no ``deny_hosts`` pattern and either matches an ``allow_hosts``
+        pattern or, with ``same_site``, shares a registered domain with one of the
+        sites; its path (with query) must then match no ``deny_paths`` pattern and, if
+        any are given, one of ``allow_paths``. Patterns are shell globs compiled into
+        one regex per list, and host decisions are cached.
+
+        :param sites: URLs or hosts whose registered domains are in scope.
+        :param same_site: Keep the crawl on the sites' registered domains.
+        :param allow_hosts: Host globs in scope, e.g. ``*.example.org``.
+        :param deny_hosts: Host globs never crawled.
+        :param allow_paths: Path globs; if given, only matching paths are crawled.
+        :param deny_paths: Path globs never crawled, e.g. ``*/logout*``.
+        :param suffixes: The public suffix list; loaded on first use by default.
+        :param max_hosts: Host decisions cached before the cache is reset.
+        """
+        self.same_site = same_site
+        self.suffixes = suffixes or load_public_suffix_list()
+        self.sites: Set[str] = set()
+        self.allow_hosts = _compile_globs(host.lower() for host in allow_hosts)
+        self.deny_hosts = _compile_globs(host.lower() for host in deny_hosts)
+        self.allow_paths = _compile_globs(allow_paths)
+        self.deny_paths = _compile_globs(deny_paths)
+        self.max_hosts = max(int(max_hosts), 1)
+        self._hosts: Dict[str, bool] = {}
+        for site in sites:
+            self.add_site(site)
+
+    def add_site(self, site: str) -> None:
+        """
+        Put a site's registered domain in scope.
+
+        :param site: A URL or a bare host.
+        """
+        host = _split(site)[0] if '://' in site else site
+        domain = self.suffixes.registered_domain(host) or host.lower()
+        if domain and domain not in self.sites:
+            self.sites.add(domain)
+            self._hosts.clear()
+
+    def host_allowed(self, host: str) -> bool:
+        allowed = self._hosts.get(host)
+        if allowed is None:
+            if self.deny_hosts and self.deny_hosts.match(host):
+                allowed = False
+            elif self.allow_hosts and self.allow_hosts.match(host):
+                allowed = True
+            elif self.same_site:
+                allowed = (self.suffixes.registered_domain(host) or host) in self.sites
+            else:
+                allowed = self.allow_hosts is None
+            if len(self._hosts) >= self.max_hosts:
+                self._hosts.clear()
+            self._hosts[host] = allowed
+        return allowed
+
+    def path_allowed(self, path: str) -> bool:
+        if self.deny_paths and self.deny_paths.match(path):
+            return False
+        return self.allow_paths is None or bool(self.allow_paths.match(path))
+
+    def allowed(self, url: str) -> bool:
+        """
+        Check a canonical URL against the scope.
+        """
+        host, path = _split(url)
+        return self.host_allowed(host) and self.path_allowed(path)
+
+    def filter(self, urls: Iterable[str]) -> List[str]:
+        """
+        Keep the canonical URLs that are in scope, in their original order.
+        """
+        if self.deny_paths is None and self.allow_paths is None:
+            host_allowed = self.host_allowed
+            return [url for url in urls if host_allowed(_split(url)[0])]
+        return [url for url in urls if self.allowed(url)]
+
+def create_scope_filter(config: dict, sites: Iterable[str] = ()) -> Optional[ScopeFilter]:
+    """
+    Build the scope filter from ``config['scope']``, or None when disabled.
+
+    :param config: Configuration dictionary.
+    :param sites: URLs whose sites are in scope, e.g. the start URL.
+    """
+    settings = config.get('scope') or {}
+    if not settings.get('enabled', True):
+        return None
+    return ScopeFilter(
+        sites=list(settings.get('sites') or []) + list(sites),
+        same_site=bool(settings.get('same_site', True)),
+        allow_hosts=settings.get('allow_hosts') or [],
+        deny_hosts=settings.get('deny_hosts') or [],
+        allow_paths=settings.get('allow_paths') or [],
+        deny_paths=settings.get('deny_paths') or [],
+        suffixes=load_public_suffix_list(settings.get('public_suffix_list'))
+    )
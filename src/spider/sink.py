@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import Table
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from spider.metrics import db_rows_written, stage_seconds
+
+# Conflict handling for buffered rows: keep the existing row, overwrite it, or add the
+# new row's non-key columns to the existing ones (counters).
+IGNORE = 'ignore'
+UPDATE = 'update'
+INCREMENT = 'increment'
+
+def upsert_statement(engine: Engine, table: Table, mode: str):
+    """
+    Build a multi-row INSERT ... ON CONFLICT statement for the engine's dialect.
+
+    :param engine: The SQLAlchemy engine the statement will run against.
+    :param table: The target table; its primary key is the conflict target.
+    :param mode: IGNORE, UPDATE or INCREMENT.
+    :return: An executable insert statement.
+    """
+    insert = sqlite_insert if engine.dialect.name == 'sqlite' else pg_insert
+    stmt = insert(table)
+    keys = [c.name for c in table.primary_key.columns]
+    if mode == INCREMENT:
+        updates = {c.name: table.c[c.name] + stmt.excluded[c.name] for c in table.columns if c.name not in keys}
+        return stmt.on_conflict_do_update(index_elements=keys, set_=updates)
+    if mode == UPDATE:
+        updates = {c.name: stmt.excluded[c.name] for c in table.columns if c.name not in keys}
+        if updates:
+            return stmt.on_conflict_do_update(index_elements=keys, set_=updates)
+    return stmt.on_conflict_do_nothing(index_elements=keys)
+
+class WriteBehindSink:
+    def __init__(self, engine: Engine, batch_size: int = 500, flush_interval: float = 1.0,
+                 max_pending: int = 5000) -> None:
+        """
+        Buffer rows in memory and write them to the database in multi-row upserts,
+        flushing when a batch fills up or ``flush_interval`` seconds pass.
+
+        Rows for the same primary key are coalesced in the buffer. When ``max_pending``
+        rows are waiting (including a flush in progress), writers block until the
+        database catches up.
+
+        :param engine: The SQLAlchemy engine to write to.
+        :param batch_size: Rows per table that trigger an immediate flush.
+        :param flush_interval: Maximum seconds a row waits in the buffer.
+        :param max_pending: Buffered rows above which write() applies backpressure.
+        """
+        self.engine = engine
+        self.batch_size = max(int(batch_size), 1)
+        self.flush_interval = float(flush_interval)
+        self.max_pending = max(int(max_pending), self.batch_size)
+        self.buffers: Dict[Tuple[Table, str], Dict[tuple, Dict[str, Any]]] = {}
+        self.pending = 0
+        self.loop = asyncio.get_running_loop()
+        self._space = asyncio.Condition()
+        self._flush_needed = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._closed = False
+        self._flusher = asyncio.create_task(self._run())
+
+    async def write(self, table: Table, row: Dict[str, Any], mode: str = IGNORE) -> None:
+        """
+        Queue a row for writing.
+
+        :param table: The target table.
+        :param row: Column values; must include the primary key.
+        :param mode: IGNORE to keep existing rows, UPDATE to overwrite them, INCREMENT
+            to add the row's non-key values to the stored ones.
+        """
+        if self._closed:
+            raise RuntimeError("WriteBehindSink is closed")
+        if self.pending >= self.max_pending:
+            async with self._space:
+                self._flush_needed.set()
+                await self._space.wait_for(lambda: self.pending < self.max_pending)
+        buffer = self.buffers.setdefault((table, mode), {})
+        key_names = [c.name for c in table.primary_key.columns]
+        key = tuple(row[name] for name in key_names)
+        if key in buffer:
+            if mode == UPDATE:
+                buffer[key] = row
+            elif mode == INCREMENT:
+                buffered = buffer[key]
+                for name, value in row.items():
+                    if name not in key_names:
+                        buffered[name] += value
+            return
+        # Counters are summed in place, so keep a copy of the caller's row.
+        buffer[key] = dict(row) if mode == INCREMENT else row
+        self.pending += 1
+        if len(buffer) >= self.batch_size:
+            self._flush_needed.set()
+
+    async def _run(self) -> None:
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._flush_needed.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_needed.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                # Keep flushing later batches; the failed rows are already dropped from pending.
+                logging.exception(f"Error flushing buffered rows: {e}")
+
+    async def flush(self) -> None:
+        """
+        Write every buffered row now.
+        """
+        async with self._flush_lock:
+            if not self.buffers:
+                return
+            batches = self.buffers
+            self.buffers = {}
+            count = sum(len(rows) for rows in batches.values())
+            start = time.perf_counter()
+            try:
+                written = await asyncio.to_thread(self._write_batches, batches)
+                elapsed = time.perf_counter() - start
+                stage_seconds.observe(elapsed, stage='db_flush')
+                for table, rows in written.items():
+                    db_rows_written.inc(rows, table=table)
+                logging.debug(f"Flushed {count} rows in {elapsed:.3f}s")
+            finally:
+                # Rows that failed to write are dropped too, so writers never wait on them.
+                async with self._space:
+                    self.pending -= count
+                    self._space.notify_all()
+
+    def _write_batches(self, batches: Dict[Tuple[Table, str], Dict[tuple, Dict[str, Any]]]) -> Dict[str, int]:
+        written: Dict[str, int] = {}
+        for (table, mode), rows in batches.items():
+            values: List[Dict[str, Any]] = list(rows.values())
+            try:
+                with self.engine.begin() as conn:
+                    stmt = upsert_statement(self.engine, table, mode)
+                    for i in range(0, len(values), self.batch_size):
+                        conn.execute(stmt, values[i:i + self.batch_size])
+            except SQLAlchemyError as e:
+                logging.error(f"Error writing {len(values)} rows to {table.name}: {e}")
+            except Exception as e:
+                # e.g. a row value the driver cannot adapt; the other tables are still written.
+                logging.exception(f"Error writing {len(values)} rows to {table.name}: {e}")
+            else:
+                written[table.name] = written.get(table.name, 0) + len(values)
+        return written
+
+    async def close(self) -> None:
+        """
+        Flush remaining rows and stop the background flusher.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._flush_needed.set()
+        await self._flusher
+        await self.flush()
@@ -0,0 +1,160 @@
+import async_timeout
+import logging
+import zlib
+from datetime import datetime, timezone
+from typing import Iterator, List, NamedTuple, Optional, Set
+from urllib.parse import urlparse
+from lxml import etree
+
+# Sitemaps are limited to 50 MB uncompressed by the protocol.
+MAX_SITEMAP_BYTES = 50 * 1024 * 1024
+
+class SitemapEntry(NamedTuple):
+    loc: str
+    # Seconds since the epoch, or None when the sitemap gives no (valid) lastmod.
+    lastmod: Optional[float] = None
+
+def parse_lastmod(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a W3C datetime (``2024-05-01``, ``2024-05-01T10:00:00+02:00``, ``...Z``).
+
+    :return: A UTC timestamp, or None if the value is missing or malformed.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def _local(tag) -> str:
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
+
+class SitemapParser:
+    def __init__(self) -> None:
+        """
+        Incremental parser for ``<urlset>`` and ``<sitemapindex>`` documents. Feed it
+        chunks as they arrive; each ``<url>``/``<sitemap>`` becomes an entry as soon as
+        it is complete and its element is freed, so memory stays flat for 50,000-URL
+        sitemaps.
+        """
+        self._parser = etree.XMLPullParser(events=('end',), resolve_entities=False, no_network=True)
+        self.entries: List[SitemapEntry] = []
+        self.is_index = False
+
+    def feed(self, data: bytes) -> None:
+        try:
+            self._parser.feed(data)
+        except etree.XMLSyntaxError as e:
+            logging.warning(f"Malformed sitemap: {e}")
+        self.entries.extend(self._drain())
+
+    def close(self) -> None:
+        try:
+            self._parser.close()
+        except etree.XMLSyntaxError as e:
+            logging.warning(f"Malformed sitemap: {e}")
+        self.entries.extend(self._drain())
+
+    def _drain(self) -> Iterator[SitemapEntry]:
+        try:
+            for _, element in self._parser.read_events():
+                name = _local(element.tag)
+                if name not in ('url', 'sitemap'):
+                    continue
+                self.is_index = name == 'sitemap'
+                loc = lastmod = None
+                for child in element:
+                    child_name = _local(child.tag)
+                    if child_name == 'loc':
+                        loc = (child.text or '').strip()
+                    elif child_name == 'lastmod':
+                        lastmod = child.text
+                element.clear()
+                # Drop references from the root to elements already handled.
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+                if loc:
+                    yield SitemapEntry(loc, parse_lastmod(lastmod))
+        except etree.XMLSyntaxError as e:
+            logging.warning(f"Malformed sitemap: {e}")
+
+async def read_sitemap(session, url: str, user_agent: str, timeout: float = 30,
+                       max_bytes: int = MAX_SITEMAP_BYTES) -> SitemapParser:
+    """
+    Stream one sitemap (plain or gzipped) through a SitemapParser.
+
+    :param session: The aiohttp session.
+    :param url: The sitemap URL.
+    :param user_agent: The crawler's User-Agent.
+    :param timeout: Seconds allowed for the download.
+    :param max_bytes: Maximum uncompressed size read.
+    :return: The parser, with ``entries`` holding what was found.
+    """
+    parser = SitemapParser()
+    read = 0
+    decompressor = None
+    async with async_timeout.timeout(timeout):
+        async with session.get(url, headers={'User-Agent': user_agent}) as response:
+            if response.status != 200:
+                logging.info(f"Skipping sitemap {url}: status {response.status}")
+                return parser
+            async for chunk in response.content.iter_chunked(65536):
+                if decompressor is None:
+                    # .xml.gz files are served as-is rather than with Content-Encoding.
+                    gzipped = chunk[:2] == b'\x1f\x8b'
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else False
+                if decompressor:
+                    chunk = decompressor.decompress(chunk, max_bytes - read)
+                read += len(chunk)
+                parser.feed(chunk)
+                if read >= max_bytes:
+                    logging.warning(f"Sitemap {url} exceeds {max_bytes} bytes; truncated")
+                    break
+    parser.close()
+    return parser
+
+async def collect_sitemap_urls(session, sitemap_urls: List[str], user_agent: str, max_urls: int = 100000,
+                               max_sitemaps: int = 50, timeout: float = 30) -> List[SitemapEntry]:
+    """
+    Read sitemaps, following sitemap indexes, and return their page URLs with the most
+    recently modified first (entries without lastmod last). As the protocol requires,
+    only URLs on the same host as the sitemap listing them are kept.
+
+    :param session: The aiohttp session.
+    :param sitemap_urls: Sitemap or sitemap index URLs, e.g. from robots.txt.
+    :param user_agent: The crawler's User-Agent.
+    :param max_urls: Maximum number of page URLs collected.
+    :param max_sitemaps: Maximum number of sitemap documents fetched.
+    :param timeout: Seconds allowed per sitemap.
+    :return: Entries ordered by lastmod, newest first.
+    """
+    queue = list(sitemap_urls)
+    fetched: Set[str] = set()
+    entries: List[SitemapEntry] = []
+    seen: Set[str] = set()
+    while queue and len(fetched) < max_sitemaps and len(entries) < max_urls:
+        url = queue.pop(0)
+        if url in fetched:
+            continue
+        fetched.add(url)
+        try:
+            parser = await read_sitemap(session, url, user_agent, timeout)
+        except Exception as e:
+            logging.warning(f"Could not read sitemap {url}: {e}")
+            continue
+        if parser.is_index:
+            queue.extend(entry.loc for entry in parser.entries)
+            continue
+        host = urlparse(url).hostname
+        for entry in parser.entries:
+            if entry.loc not in seen and urlparse(entry.loc).hostname == host:
+                seen.add(entry.loc)
+                entries.append(entry)
+        logging.info(f"Read {len(parser.entries)} URLs from sitemap {url}")
+    entries = entries[:max_urls]
+    entries.sort(key=lambda entry: -entry.lastmod if entry.lastmod is not None else float('inf'))
+    return entries
@@ -1,51 +1,191 @@
 import asyncio
 import aiohttp
+import contextlib
 import async_timeout
 import logging
-from typing import Optional
+import signal
+import time
+from typing import Dict, List, Mapping, Optional, Tuple
+from urllib.parse import urlparse
 from spider.utils import normalize_url
-from spider.link_finder import LinkFinder
+from spider.canonical import canonicalize, canonicalize_links
+from spider.page import PageContext
 from spider.plugin import PluginManager
-from spider.storage import save_page
+from spider.storage import save_page, save_alias, close_sink, content_hash, load_page, load_validators
+from spider.scheduler import HostScheduler
+from spider.concurrency import BACKOFF_STATUSES, create_adaptive_concurrency
+from spider.dedupe import create_visited_index
+from spider.frontier import create_frontier
+from spider.streaming import BodyTooLarge, NotHtml, read_html
+from spider.robots import create_robots_cache
+from spider.sitemap import collect_sitemap_urls
+from spider.near_duplicates import create_near_duplicate_detector
+from spider.scope import create_scope_filter
+from spider.parse_pool import get_parse_pool
+from spider.warc import get_warc_writer
+from spider import metrics
+
+class FetchResult:
+    def __init__(self, url: str, status: int, content: Optional[str] = None,
+                 headers: Optional[Mapping[str, str]] = None, tree=None) -> None:
+        """
+        The outcome of a successful fetch.
+
+        :param url: The fetched URL.
+        :param status: The HTTP status (200, or 304 for a conditional request).
+        :param content: The decoded body; None for 304 responses.
+        :param headers: The response headers.
+        :param tree: The lxml tree, when the body was parsed while streaming.
+        """
+        self.url = url
+        self.status = status
+        self.content = content
+        self.headers = headers or {}
+        self.tree = tree
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status == 304
 
 class Spider:
-    def __init__(self, start_url: str, config: dict, plugin_manager: Optional[PluginManager] = None) -> None:
+    def __init__(self, start_url: str, config: dict, plugin_manager: Optional[PluginManager] = None,
+                 frontier=None, visited=None, robots=None, near_duplicates=None) -> None:
         """
         Initialize the Spider.
 
         :param start_url: The starting URL for crawling.
         :param config: Configuration dictionary.
         :param plugin_manager: Optional PluginManager for processing pages.
+        :param frontier: Optional frontier to use instead of the configured backend.
+        :param visited: Optional seen-URL index to use instead of the configured backend.
+        :param robots: Optional robots.txt cache to share between Spider instances.
+        :param near_duplicates: Optional near-duplicate detector to share between Spider instances.
         """
         self.start_url = normalize_url(start_url)
         self.config = config
-        self.visited = set()
-        self.to_visit: asyncio.Queue[str] = asyncio.Queue()
-        self.to_visit.put_nowait(self.start_url)
+        # URLs seen so far (queued or processed); a URL is enqueued only the first time it is added.
+        self.visited = visited if visited is not None else create_visited_index(config)
+        # Resumes from disk when the frontier backend persists its state.
+        self.to_visit = frontier if frontier is not None else create_frontier(config)
+        # Send stored validators and skip unchanged pages on recrawls.
+        self.conditional = bool((config.get('recrawl') or {}).get('conditional', True))
+        self.checkpoint_interval = float((config.get('frontier') or {}).get('checkpoint_interval', 30))
+        if self.visited.add(self.start_url):
+            self.to_visit.put_nowait(self.start_url)
         self.plugin_manager = plugin_manager if plugin_manager else PluginManager()
-        # Limit concurrent connections.
-        self.semaphore = asyncio.Semaphore(10)
+        # Separate limits for each stage; the worker count bounds the total in flight.
+        concurrency = config.get('concurrency') or {}
+        self.workers = max(int(config.get('threads', 8)), 1)
+        self.fetch_semaphore = asyncio.Semaphore(concurrency.get('fetch') or self.workers)
+        self.parse_semaphore = asyncio.Semaphore(concurrency.get('parse') or self.workers)
+        self.plugin_semaphore = asyncio.Semaphore(concurrency.get('plugins') or self.workers)
+        self.stopping = asyncio.Event()
+        self._idle: Dict[asyncio.Task, bool] = {}
+        # Per-host politeness replaces a global delay between requests.
+        self.scheduler = HostScheduler(config)
+        # Per-host concurrency that adapts to latency and errors; None when disabled.
+        self.host_limits = create_adaptive_concurrency(config)
+        # Cached robots.txt rules; Crawl-delay values are applied to the scheduler.
+        self.robots = robots if robots is not None else create_robots_cache(config, self.scheduler)
+        # SimHash index of page text; near-duplicate pages are stored as aliases.
+        self.near_duplicates = near_duplicates if near_duplicates is not None else create_near_duplicate_detector(config)
+        # Keeps discovered links on the start URL's site (and the configured hosts and paths).
+        self.scope = create_scope_filter(config, [self.start_url])
+        # Worker processes for parsing and link extraction; None parses in a thread.
+        self.parse_pool = get_parse_pool(config)
+        # Raw responses are appended to rotating WARC files for offline replay; None when disabled.
+        self.warc = get_warc_writer(config)
 
-    async def fetch(self, session: aiohttp.ClientSession, url: str) -> Optional[str]:
+    async def fetch(self, session: aiohttp.ClientSession, url: str,
+                    validators: Optional[Dict[str, Optional[str]]] = None) -> Optional[FetchResult]:
         """
         Fetch a URL asynchronously.
 
         :param session: The aiohttp session.
         :param url: The URL to fetch.
-        :return: The response text if successful; None otherwise.
+        :param validators: Stored ``etag``/``last_modified`` of the page, sent as a conditional request.
+        :return: A FetchResult for HTML pages and 304 responses; None otherwise.
         """
+        start = time.monotonic()
+        metrics.requests_in_flight.inc()
         try:
             async with async_timeout.timeout(self.config['timeout']):
                 headers = {'User-Agent': self.config['user_agent']}
+                if validators:
+                    if validators.get('etag'):
+                        headers['If-None-Match'] = validators['etag']
+                    if validators.get('last_modified'):
+                        headers['If-Modified-Since'] = validators['last_modified']
                 async with session.get(url, headers=headers) as response:
-                    if response.status == 200 and 'text/html' in response.headers.get('Content-Type', ''):
-                        return await response.text()
-                    else:
-                        logging.warning(f"Skipping URL {url}: status {response.status} or invalid content type")
+                    self._record(url, time.monotonic() - start, response)
+                    if response.status == 304 and validators:
+                        return FetchResult(url, 304, headers=response.headers)
+                    if response.status != 200:
+                        metrics.fetch_errors.inc(type=f'http_{response.status}')
+                        logging.warning(f"Skipping URL {url}: status {response.status}")
                         return None
+                    if 'text/html' not in response.headers.get('Content-Type', ''):
+                        # Abort before reading the body.
+                        metrics.fetch_errors.inc(type='content_type')
+                        logging.warning(f"Skipping URL {url}: invalid content type")
+                        return None
+                    fetch_settings = self.config.get('fetch') or {}
+                    max_bytes = int(fetch_settings.get('max_bytes', 5 * 1024 * 1024))
+                    truncate = bool(fetch_settings.get('truncate', True))
+                    if response.content_length and response.content_length > max_bytes and not truncate:
+                        raise BodyTooLarge(f"Content-Length {response.content_length} exceeds {max_bytes}")
+                    raw = bytearray() if self.warc else None
+                    content, tree, size = await read_html(
+                        response, max_bytes,
+                        chunk_size=int(fetch_settings.get('chunk_size', 65536)),
+                        truncate=truncate,
+                        incremental=bool(fetch_settings.get('incremental_parse', False)),
+                        raw=raw
+                    )
+                    if raw is not None:
+                        await self._capture(url, response, bytes(raw), max_bytes)
+                    metrics.pages_fetched.inc()
+                    metrics.response_bytes.inc(size)
+                    metrics.stage_seconds.observe(time.monotonic() - start, stage='fetch')
+                    return FetchResult(url, 200, content, response.headers, tree)
+        except (BodyTooLarge, NotHtml) as e:
+            metrics.fetch_errors.inc(type='too_large' if isinstance(e, BodyTooLarge) else 'not_html')
+            logging.warning(f"Skipping URL {url}: {e}")
+            return None
         except Exception as e:
+            if self.host_limits:
+                self.host_limits.record(url, time.monotonic() - start, error=True)
+            metrics.fetch_errors.inc(type=e.__class__.__name__)
             logging.error(f"Exception fetching {url}: {e}")
             return None
+        finally:
+            metrics.requests_in_flight.dec()
+
+    async def _capture(self, url: str, response: aiohttp.ClientResponse, body: bytes, max_bytes: int) -> None:
+        """
+        Append a fetched response to the WARC files; failures are logged, never raised.
+        """
+        truncated = len(body) >= max_bytes and (response.content_length or 0) != len(body)
+        try:
+            size = await asyncio.to_thread(
+                self.warc.write_response, url, response.status, response.reason, response.raw_headers, body, truncated
+            )
+        except Exception as e:
+            metrics.fetch_errors.inc(type='warc')
+            logging.error(f"Failed to write WARC record for {url}: {e}")
+            return
+        metrics.warc_bytes.inc(size)
+
+    def _record(self, url: str, latency: float, response: aiohttp.ClientResponse) -> None:
+        """
+        Feed time-to-headers and status into the adaptive limits, and honour Retry-After.
+        """
+        if self.host_limits:
+            self.host_limits.record(url, latency, response.status)
+        if response.status in BACKOFF_STATUSES:
+            retry_after = response.headers.get('Retry-After', '')
+            seconds = float(retry_after) if retry_after.strip().isdigit() else self.config['rate_limit'] * 10
+            self.scheduler.penalize(url, min(seconds, 600))
 
     async def process_url(self, session: aiohttp.ClientSession, url: str) -> None:
         """
@@ -55,35 +195,310 @@ class Spider:
         :param url: The URL to process.
         """
         normalized_url = normalize_url(url)
-        if normalized_url in self.visited:
+        if self.robots and not await self.robots.allowed(session, normalized_url):
+            # Seeds and resumed URLs were not filtered when they were queued.
+            metrics.robots_blocked.inc()
+            logging.info(f"Disallowed by robots.txt: {normalized_url}")
             return
-        self.visited.add(normalized_url)
         logging.info(f"Processing {normalized_url}")
-        async with self.semaphore:
-            content = await self.fetch(session, normalized_url)
+        validators = await load_validators(normalized_url) if self.conditional else None
+        async with self.fetch_semaphore, self.host_slot(normalized_url):
+            # Take the politeness token only once a slot is held, right before the request;
+            # tokens taken while waiting for a slot would be spent back-to-back later.
+            await self.scheduler.acquire(normalized_url)
+            result = await self.fetch(session, normalized_url, validators)
+        if result is None:
+            return
+        if result.not_modified:
+            # Unchanged: reuse the stored copy only to discover links.
+            content = await load_page(normalized_url)
+            unchanged = True
+        else:
+            content = result.content
+            digest = content_hash(content)
+            unchanged = bool(validators) and validators.get('content_hash') == digest
         if content:
-            # Process the content via plugins.
-            processed_content = await self.plugin_manager.run_plugins(normalized_url, content)
-            # Save the content in the database.
-            save_page(normalized_url, processed_content)
-            # Extract and enqueue links.
-            finder = LinkFinder(self.start_url, normalized_url)
-            finder.feed(content)
-            for link in finder.page_links():
-                norm_link = normalize_url(link)
-                if norm_link not in self.visited:
-                    await self.to_visit.put(norm_link)
+            # Parse once, off the event loop; plugins and link extraction share the tree.
+            tree = None if result.not_modified else result.tree
+            async with self.parse_semaphore:
+                with metrics.stage_seconds.time(stage='parse'):
+                    page = await self._page(normalized_url, content, tree)
+                    fingerprint, elapsed = await asyncio.to_thread(self._parse, page)
+            duplicate = None
+            if self.near_duplicates:
+                metrics.stage_seconds.observe(elapsed, stage='simhash')
+                duplicate = self.near_duplicates.check(normalized_url, fingerprint)
+            if unchanged:
+                # Skip plugins and database writes for unchanged pages.
+                metrics.pages_unchanged.inc()
+                logging.info(f"Unchanged since last crawl: {normalized_url}")
+            elif duplicate:
+                # Same content as an earlier page: keep a pointer instead of a copy.
+                canonical_url, distance = duplicate
+                metrics.near_duplicates.inc()
+                logging.info(f"Near duplicate of {canonical_url} ({distance} bits): {normalized_url}")
+                await save_alias(normalized_url, canonical_url, distance)
+                if not self.near_duplicates.follow_links:
+                    return
+            else:
+                # Process the content via plugins.
+                async with self.plugin_semaphore:
+                    with metrics.stage_seconds.time(stage='plugins'):
+                        processed_content = await self.plugin_manager.run_plugins(page)
+                # Save the content in the database.
+                await save_page(
+                    normalized_url, processed_content,
+                    etag=result.headers.get('ETag'),
+                    last_modified=result.headers.get('Last-Modified'),
+                    content_hash=digest
+                )
+            # Extract and enqueue in-scope links that robots.txt allows.
+            links = self._in_scope(canonicalize_links(page.links))
+            if self.robots:
+                allowed = await self.robots.filter(session, links)
+                metrics.robots_blocked.inc(len(links) - len(allowed))
+                links = allowed
+            anchors = self._anchors(page) if getattr(self.to_visit, 'scores_anchors', False) else {}
+            for norm_link in links:
+                if self.visited.add(norm_link):
+                    await self.to_visit.put(norm_link, parent=normalized_url, anchor=anchors.get(norm_link))
+                else:
+                    self.to_visit.note_inlink(norm_link)
+
+    async def seed_from_sitemaps(self, session: aiohttp.ClientSession) -> int:
+        """
+        Queue the URLs listed in the start host's sitemaps, most recently modified first.
+        Sitemaps come from ``sitemaps.urls`` and the start host's robots.txt, falling
+        back to ``/sitemap.xml``.
+
+        :param session: The aiohttp session.
+        :return: The number of URLs queued.
+        """
+        settings = self.config.get('sitemaps') or {}
+        sources = list(settings.get('urls') or [])
+        if self.robots:
+            sources.extend((await self.robots.rules_for(session, self.start_url)).sitemaps)
+        if not sources:
+            parsed = urlparse(self.start_url)
+            sources.append(f"{parsed.scheme}://{parsed.netloc}/sitemap.xml")
+        entries = await collect_sitemap_urls(
+            session, sources, self.config['user_agent'],
+            max_urls=int(settings.get('max_urls', 100000)),
+            max_sitemaps=int(settings.get('max_sitemaps', 50)),
+            timeout=float(self.config.get('timeout', 10))
+        )
+        # Canonical URL -> lastmod, which the priority frontier uses as a freshness hint.
+        lastmods: Dict[str, Optional[float]] = {}
+        for entry in entries:
+            link = canonicalize(entry.loc)
+            if link and link not in lastmods:
+                lastmods[link] = entry.lastmod
+        links = self._in_scope(list(lastmods))
+        if self.robots:
+            links = await self.robots.filter(session, links)
+        queued = 0
+        for link in links:
+            if self.visited.add(link):
+                self.to_visit.put_nowait(link, lastmod=lastmods[link])
+                queued += 1
+        logging.info(f"Queued {queued} URLs from {len(sources)} sitemap(s)")
+        return queued
+
+    @staticmethod
+    def _anchors(page: PageContext) -> Dict[str, str]:
+        anchors: Dict[str, str] = {}
+        for url, text in page.anchors.items():
+            link = canonicalize(url)
+            if link and text and not anchors.get(link):
+                anchors[link] = text
+        return anchors
+
+    def _in_scope(self, links: List[str]) -> List[str]:
+        if not self.scope:
+            return links
+        allowed = self.scope.filter(links)
+        metrics.out_of_scope.inc(len(links) - len(allowed))
+        return allowed
+
+    async def _page(self, url: str, content: str, tree) -> PageContext:
+        """
+        Build the page, parsed in the parse pool unless the body was already parsed while
+        streaming; falls back to parsing in a thread if the pool fails.
+        """
+        if self.parse_pool is None or tree is not None:
+            return PageContext(url, content, tree=tree)
+        try:
+            parsed = await self.parse_pool.parse(url, content, anchors=getattr(self.to_visit, 'scores_anchors', False))
+        except Exception as e:
+            logging.warning(f"Parse pool failed for {url}, parsing in a thread: {e}")
+            return PageContext(url, content)
+        return PageContext(url, content, parsed=parsed)
+
+    def _parse(self, page: PageContext) -> Tuple[Optional[int], float]:
+        """
+        Parse a page and fingerprint its text for near-duplicate detection; runs in a
+        worker thread. Pages that come from the parse pool are not parsed again.
+
+        :return: The SimHash (None if disabled or the text is too short) and the seconds spent on it.
+        """
+        page.extract_links()
+        if not self.near_duplicates:
+            return None, 0.0
+        start = time.perf_counter()
+        fingerprint = self.near_duplicates.fingerprint(page.text)
+        return fingerprint, time.perf_counter() - start
+
+    def host_slot(self, url: str):
+        """
+        The adaptive per-host concurrency slot for a URL, or a no-op when disabled.
+        """
+        return self.host_limits.slot(url) if self.host_limits else contextlib.nullcontext()
+
+    def create_session(self) -> aiohttp.ClientSession:
+        """
+        Create the HTTP session with the configured connection pool: total and per-host
+        connection limits, DNS caching, keep-alive and response compression.
+        """
+        http = self.config.get('http') or {}
+        connector = aiohttp.TCPConnector(
+            limit=int(http.get('limit', 100)),
+            limit_per_host=int(http.get('limit_per_host', 16)),
+            ttl_dns_cache=int(http.get('ttl_dns_cache', 300)),
+            keepalive_timeout=float(http.get('keepalive_timeout', 30)),
+            enable_cleanup_closed=True
+        )
+        compression = bool(http.get('compression', True))
+        return aiohttp.ClientSession(
+            connector=connector,
+            trace_configs=[metrics.create_trace_config()],
+            auto_decompress=compression,
+            headers={'Accept-Encoding': 'gzip, deflate' if compression else 'identity'}
+        )
+
+    async def worker(self, session: aiohttp.ClientSession) -> None:
+        """
+        Long-lived worker: pull URLs from the queue until the crawl stops.
+
+        :param session: The aiohttp session.
+        """
+        task = asyncio.current_task()
+        while not self.stopping.is_set():
+            self._idle[task] = True
+            url = await self.to_visit.get()
+            self._idle[task] = False
+            metrics.frontier_depth.set(self.to_visit.qsize())
+            try:
+                await self.process_url(session, url)
+            except Exception as e:
+                logging.exception(f"Unhandled error processing {url}: {e}")
+            finally:
+                self.to_visit.task_done(url)
+
+    async def checkpoint(self) -> None:
+        """
+        Persist the frontier and then the visited index, so that a crash between the two
+        can only cause a URL to be fetched twice, never to be lost. Large files are
+        written in worker threads.
+        """
+        await self.to_visit.checkpoint_async()
+        await self.visited.save_async()
+
+    async def _checkpoint_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            await self.checkpoint()
+
+    def stop(self) -> None:
+        """
+        Request a graceful shutdown: in-flight URLs finish, no new ones are started.
+        """
+        if not self.stopping.is_set():
+            logging.info("Stopping crawl; waiting for in-flight pages to finish")
+            self.stopping.set()
+
+    def _install_signal_handlers(self) -> bool:
+        loop = asyncio.get_running_loop()
+        try:
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(sig, self.stop)
+            return True
+        except (NotImplementedError, RuntimeError, ValueError):
+            # Not supported on this platform or outside the main thread (e.g. Celery pools).
+            return False
+
+    def _remove_signal_handlers(self) -> None:
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(sig)
+
+    async def crawl_one(self, url: str) -> None:
+        """
+        Process a single URL with its own session and flush storage afterwards.
+        Used by distributed workers, where discovered links go to the shared frontier.
+
+        :param url: The URL to process.
+        """
+        try:
+            async with self.create_session() as session:
+                await self.process_url(session, url)
+        finally:
+            try:
+                await self._close()
+            finally:
+                if self.warc:
+                    self.warc.flush()
+
+    async def _close(self) -> None:
+        """
+        Flush the scheduler, plugins and parse pool, then storage; storage is closed even
+        if an earlier step fails, so buffered rows are not lost.
+        """
+        try:
+            await self.scheduler.close()
+            await self.plugin_manager.close()
+            if self.parse_pool:
+                await self.parse_pool.close()
+        finally:
+            await close_sink()
 
     async def crawl(self) -> None:
         """
-        Begin the crawling process.
-        """
-        async with aiohttp.ClientSession() as session:
-            tasks = []
-            while not self.to_visit.empty():
-                url = await self.to_visit.get()
-                tasks.append(asyncio.create_task(self.process_url(session, url)))
-                # Respect rate limits between requests.
-                await asyncio.sleep(self.config['rate_limit'])
-            if tasks:
-                await asyncio.gather(*tasks)
+        Begin the crawling process with ``config['threads']`` workers and return once
+        the queue is fully processed or a shutdown was requested.
+        """
+        handlers = self._install_signal_handlers()
+        try:
+            async with self.create_session() as session:
+                if (self.config.get('sitemaps') or {}).get('enabled', True):
+                    await self.seed_from_sitemaps(session)
+                workers = [asyncio.create_task(self.worker(session)) for _ in range(self.workers)]
+                checkpointer = asyncio.create_task(self._checkpoint_loop()) if self.checkpoint_interval > 0 else None
+                joined = asyncio.create_task(self.to_visit.join())
+                stopped = asyncio.create_task(self.stopping.wait())
+                try:
+                    await asyncio.wait({joined, stopped}, return_when=asyncio.FIRST_COMPLETED)
+                    self.stopping.set()
+                    # Idle workers are blocked on get(); busy ones exit after their current URL.
+                    for task in workers:
+                        if self._idle.get(task, True):
+                            task.cancel()
+                    await asyncio.gather(*workers, return_exceptions=True)
+                finally:
+                    # Also reached when the crawl itself fails or is cancelled.
+                    for task in (*workers, joined, stopped, checkpointer):
+                        if task and not task.done():
+                            task.cancel()
+                    self._idle.clear()
+        finally:
+            try:
+                await self._close()
+            finally:
+                if self.warc:
+                    self.warc.close()
+                await self.checkpoint()
+                self.to_visit.close()
+                if handlers:
+                    self._remove_signal_handlers()
+        for name, stats in self.plugin_manager.stats().items():
+            logging.info(f"Plugin {name}: {stats['calls']} calls, avg {stats['avg_time']:.3f}s, "
+                         f"max {stats['max_time']:.3f}s, {stats['errors']} errors, {stats['timeouts']} timeouts")
@@ -1,49 +1,276 @@
+import asyncio
+import hashlib
 import logging
-from sqlalchemy import create_engine, Column, String, Text, MetaData, Table, insert
-from sqlalchemy.exc import SQLAlchemyError, IntegrityError
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.dialects.postgresql import insert as pg_insert
+import threading
+from typing import Dict, Optional
+from sqlalchemy import insert, select, Column, Integer, LargeBinary, String, Text, MetaData, Table
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
 from spider.config import config
+from spider.db import ensure_schema
+from spider.sink import WriteBehindSink, IGNORE, UPDATE
+from spider.blobs import BlobCodec, DictionaryTrainer, blob_hash
+from spider import metrics
+
+# Body storage modes: the HTML in pages.content, or compressed in blobs and referenced by hash.
+INLINE = 'inline'
+BLOB = 'blob'
 
-# Configure the engine and sessionmaker.
-engine = create_engine(config['database']['url'], echo=False)
-SessionLocal = sessionmaker(bind=engine)
 metadata = MetaData()
 
 pages_table = Table(
     'pages', metadata,
     Column('url', String, primary_key=True),
-    Column('content', Text, nullable=False)
+    Column('content', Text, nullable=False),
+    # Validators for conditional recrawls.
+    Column('etag', String, nullable=True),
+    Column('last_modified', String, nullable=True),
+    Column('content_hash', String(64), nullable=True),
+    # Set in blob mode; content is then empty and the body lives in blobs.
+    Column('blob_hash', String(64), nullable=True)
+)
+
+# Compressed page bodies, stored once per distinct body.
+blobs_table = Table(
+    'blobs', metadata,
+    Column('hash', String(64), primary_key=True),
+    Column('codec', String, nullable=False),
+    Column('size', Integer, nullable=False),
+    Column('body', LargeBinary, nullable=False)
+)
+
+# zstd dictionaries referenced by blob codecs ("zstd:<id>").
+blob_dictionaries_table = Table(
+    'blob_dictionaries', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('data', LargeBinary, nullable=False)
+)
+
+# Near-duplicate pages, stored as a pointer to the page they duplicate.
+aliases_table = Table(
+    'aliases', metadata,
+    Column('url', String, primary_key=True),
+    Column('canonical_url', String, nullable=False),
+    Column('distance', Integer, nullable=False)
 )
 
-metadata.create_all(engine)
+def get_engine() -> Engine:
+    """
+    Return the shared engine, creating the crawler's tables on first use.
+    """
+    return ensure_schema(metadata, migrate=[pages_table])
+
+def content_hash(content: str) -> str:
+    """
+    Hash page content for change detection.
+
+    :param content: The page content.
+    :return: The hex SHA-256 digest.
+    """
+    return hashlib.sha256(content.encode('utf-8', 'surrogatepass')).hexdigest()
+
+# The write-behind sink shared by save_page and the plugins; bound to one event loop.
+_sink: Optional[WriteBehindSink] = None
+
+def get_sink() -> WriteBehindSink:
+    """
+    Return the shared write-behind sink, creating it for the running event loop if needed.
+
+    :return: The WriteBehindSink instance.
+    """
+    global _sink
+    loop = asyncio.get_running_loop()
+    if _sink is None or _sink.loop is not loop or _sink._closed:
+        if _sink is not None and _sink.pending and not _sink._closed:
+            logging.warning(f"Discarding {_sink.pending} unflushed rows from a previous event loop")
+        settings = config.get('storage') or {}
+        _sink = WriteBehindSink(
+            get_engine(),
+            batch_size=settings.get('batch_size', 500),
+            flush_interval=settings.get('flush_interval', 1.0),
+            max_pending=settings.get('max_pending', 5000)
+        )
+    return _sink
+
+async def close_sink() -> None:
+    """
+    Flush and close the shared sink. Call this before the event loop shuts down.
+    """
+    global _sink
+    if _sink is not None:
+        await _sink.close()
+        _sink = None
+
+# Codec shared by every thread; created on first use with the stored dictionaries.
+_codec: Optional[BlobCodec] = None
+_trainer: Optional[DictionaryTrainer] = None
+_codec_lock = threading.Lock()
+
+def body_mode() -> str:
+    return (config.get('storage') or {}).get('body_mode', INLINE)
+
+def _load_dictionaries(codec: BlobCodec, use: bool) -> None:
+    with get_engine().connect() as conn:
+        rows = conn.execute(select(blob_dictionaries_table).order_by(blob_dictionaries_table.c.id)).all()
+    for row in rows:
+        codec.add_dictionary(row.id, row.data, use=use)
+
+def get_codec() -> BlobCodec:
+    """
+    Return the shared blob codec, loading zstd dictionaries from the database the first time.
+    """
+    global _codec, _trainer
+    with _codec_lock:
+        if _codec is None:
+            settings = config.get('storage') or {}
+            dictionary = settings.get('dictionary') or {}
+            codec = BlobCodec(settings.get('compression', 'zstd'), int(settings.get('compression_level', 3)))
+            use_dictionary = bool(dictionary.get('enabled', True))
+            _load_dictionaries(codec, use_dictionary)
+            if use_dictionary and codec.dictionary_id is None and codec.compression == 'zstd':
+                _trainer = DictionaryTrainer(int(dictionary.get('samples', 1000)), int(dictionary.get('size', 112640)))
+            _codec = codec
+        return _codec
+
+def _store_dictionary(data: bytes) -> None:
+    with get_engine().begin() as conn:
+        dictionary_id = conn.execute(insert(blob_dictionaries_table).values(data=data)).inserted_primary_key[0]
+    get_codec().add_dictionary(dictionary_id, data)
+    logging.info(f"Trained zstd dictionary {dictionary_id} ({len(data)} bytes) for page bodies")
+
+def _encode_body(data: bytes):
+    """
+    Compress a body, training the zstd dictionary from the first bodies; runs in a worker thread.
+    """
+    codec = get_codec()
+    if _trainer is not None and not _trainer.done:
+        with _codec_lock:
+            dictionary = _trainer.add(data)
+        if dictionary:
+            try:
+                _store_dictionary(dictionary)
+            except SQLAlchemyError as e:
+                logging.error(f"Error storing zstd dictionary: {e}")
+    return codec.compress(data)
+
+async def save_blob(data: bytes) -> str:
+    """
+    Queue a body for the blob table, compressed; identical bodies are stored once, as
+    the sink coalesces buffered rows by hash and never overwrites a stored blob.
+
+    :param data: The raw body.
+    :return: The blob's content hash.
+    """
+    digest = blob_hash(data)
+    codec, payload = await asyncio.to_thread(_encode_body, data)
+    # An existing row for the hash holds the same body, so never overwrite it.
+    await get_sink().write(blobs_table, {'hash': digest, 'codec': codec, 'size': len(data), 'body': payload}, IGNORE)
+    metrics.body_bytes.inc(len(data), kind='raw')
+    metrics.body_bytes.inc(len(payload), kind='stored')
+    return digest
 
-def save_page(url: str, content: str) -> None:
+async def save_page(url: str, content: str, etag: Optional[str] = None,
+                    last_modified: Optional[str] = None, content_hash: Optional[str] = None) -> None:
     """
-    Save the crawled page content into the database.
+    Queue the crawled page content for saving into the database.
 
-    This function attempts to use PostgreSQL's ON CONFLICT clause to ignore duplicate inserts.
-    If on_conflict_do_nothing is not available, it falls back to catching IntegrityError exceptions.
+    Rows are written in batches by the shared write-behind sink; a recrawled page
+    replaces the stored row. With ``storage.body_mode: blob`` the body is compressed
+    into the blob table and the page row references it by hash.
 
     :param url: The URL of the crawled page.
     :param content: The page content.
+    :param etag: The response's ETag header, if any.
+    :param last_modified: The response's Last-Modified header, if any.
+    :param content_hash: Hash of the fetched content (see content_hash()).
     """
-    session = SessionLocal()
+    stored_hash = None
+    if body_mode() == BLOB:
+        stored_hash = await save_blob(content.encode('utf-8', 'surrogatepass'))
+        content = ''
+    row = {
+        'url': url,
+        'content': content,
+        'etag': etag,
+        'last_modified': last_modified,
+        'content_hash': content_hash,
+        'blob_hash': stored_hash
+    }
+    await get_sink().write(pages_table, row, UPDATE)
+    logging.debug(f"Queued page for saving: {url}")
+
+async def save_alias(url: str, canonical_url: str, distance: int) -> None:
+    """
+    Record a near-duplicate page as an alias of the page it duplicates.
+
+    :param url: The URL of the duplicate.
+    :param canonical_url: The URL of the page stored under ``pages``.
+    :param distance: SimHash Hamming distance between the two pages.
+    """
+    row = {'url': url, 'canonical_url': canonical_url, 'distance': distance}
+    await get_sink().write(aliases_table, row, UPDATE)
+    logging.debug(f"Queued alias {url} -> {canonical_url}")
+
+def _select_page(url: str, *columns) -> Optional[Dict]:
     try:
-        stmt = pg_insert(pages_table).values(url=url, content=content)
-        # Try to use on_conflict_do_nothing if available.
-        try:
-            stmt = stmt.on_conflict_do_nothing(index_elements=['url'])
-        except AttributeError:
-            logging.warning("on_conflict_do_nothing not available; will handle duplicates via IntegrityError")
-        session.execute(stmt)
-        session.commit()
-        logging.info(f"Saved page: {url}")
-    except IntegrityError:
-        session.rollback()
-        logging.info(f"Page {url} already exists. Skipping insertion.")
+        with get_engine().connect() as conn:
+            row = conn.execute(select(*columns).where(pages_table.c.url == url)).mappings().first()
+        return dict(row) if row else None
     except SQLAlchemyError as e:
-        session.rollback()
-        logging.error(f"Error saving page {url}: {e}")
-    finally:
-        session.close()
+        logging.error(f"Error loading page {url}: {e}")
+        return None
+
+async def load_validators(url: str) -> Optional[Dict[str, Optional[str]]]:
+    """
+    Load the stored ETag, Last-Modified and content hash of a page.
+
+    :param url: The page URL.
+    :return: A dict with ``etag``, ``last_modified`` and ``content_hash``, or None if the page is not stored.
+    """
+    return await asyncio.to_thread(
+        _select_page, url, pages_table.c.etag, pages_table.c.last_modified, pages_table.c.content_hash
+    )
+
+async def load_page(url: str) -> Optional[str]:
+    """
+    Load the stored content of a page.
+
+    :param url: The page URL.
+    :return: The content, or None if the page is not stored.
+    """
+    row = await asyncio.to_thread(_select_page, url, pages_table.c.content, pages_table.c.blob_hash)
+    if not row:
+        return None
+    if row['blob_hash']:
+        return await load_blob(row['blob_hash'])
+    return row['content']
+
+def _read_blob(digest: str) -> Optional[str]:
+    try:
+        with get_engine().connect() as conn:
+            row = conn.execute(
+                select(blobs_table.c.codec, blobs_table.c.body).where(blobs_table.c.hash == digest)
+            ).first()
+    except SQLAlchemyError as e:
+        logging.error(f"Error loading blob {digest}: {e}")
+        return None
+    if row is None:
+        logging.warning(f"Missing blob {digest}")
+        return None
+    codec = get_codec()
+    try:
+        data = codec.decompress(row.codec, row.body)
+    except LookupError:
+        # A dictionary trained by another process after this one started.
+        _load_dictionaries(codec, use=False)
+        data = codec.decompress(row.codec, row.body)
+    return data.decode('utf-8', 'surrogatepass')
+
+async def load_blob(digest: str) -> Optional[str]:
+    """
+    Load and decompress a stored body.
+
+    :param digest: The blob's content hash.
+    :return: The body, or None if it is not stored.
+    """
+    return await asyncio.to_thread(_read_blob, digest)
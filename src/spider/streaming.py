@@ -0,0 +1,93 @@
+import codecs
+import logging
+import re
+from typing import Optional, Tuple
+from lxml import etree, html as lxml_html
+
+_META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([a-zA-Z0-9_.:-]+)', re.IGNORECASE)
+# Bytes inspected for a <meta charset> declaration and for binary content.
+_SNIFF_BYTES = 4096
+
+class BodyTooLarge(Exception):
+    """Raised when a response body exceeds the configured size and truncation is off."""
+
+class NotHtml(Exception):
+    """Raised when a response labelled as HTML turns out to be binary."""
+
+def _valid_charset(name: Optional[str]) -> Optional[str]:
+    if not name:
+        return None
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+def sniff_charset(head: bytes, declared: Optional[str] = None) -> str:
+    """
+    Pick the charset of an HTML body: the Content-Type charset, then a <meta> declaration
+    in the first bytes, then a byte order mark, then UTF-8.
+
+    :param head: The first bytes of the body.
+    :param declared: The charset from the Content-Type header, if any.
+    :return: A codec name.
+    """
+    charset = _valid_charset(declared)
+    if charset:
+        return charset
+    match = _META_CHARSET.search(head[:_SNIFF_BYTES])
+    charset = _valid_charset(match.group(1).decode('ascii', 'ignore')) if match else None
+    if charset:
+        return charset
+    if head.startswith(codecs.BOM_UTF16_LE) or head.startswith(codecs.BOM_UTF16_BE):
+        return 'utf-16'
+    return 'utf-8'
+
+async def read_html(response, max_bytes: int, chunk_size: int = 65536, truncate: bool = True,
+                    incremental: bool = False,
+                    raw: Optional[bytearray] = None) -> Tuple[str, Optional[etree._Element], int]:
+    """
+    Stream an HTML response body in chunks, stopping at ``max_bytes``.
+
+    The first chunk is checked for binary content and used to detect the charset. With
+    ``incremental`` set, chunks are also fed to an lxml parser as they arrive, so the
+    tree is ready when the body is and the page is never parsed from the full string.
+
+    :param response: An aiohttp ClientResponse.
+    :param max_bytes: Maximum body size to read.
+    :param chunk_size: Bytes per read.
+    :param truncate: Keep the first ``max_bytes`` of an oversized body instead of raising BodyTooLarge.
+    :param incremental: Build the lxml tree while streaming.
+    :param raw: If given, the body bytes as read are appended to it, e.g. for WARC capture.
+    :return: The decoded body, its parsed tree if ``incremental``, and the number of body bytes read.
+    """
+    body = bytearray()
+    charset: Optional[str] = None
+    parser = None
+    async for chunk in response.content.iter_chunked(chunk_size):
+        if charset is None:
+            if b'\x00' in chunk[:_SNIFF_BYTES] and not chunk.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+                raise NotHtml(f"binary content in {response.url}")
+            charset = sniff_charset(chunk, response.charset)
+            if incremental:
+                parser = lxml_html.HTMLParser(encoding=charset)
+        room = max_bytes - len(body)
+        if len(chunk) > room:
+            if not truncate:
+                raise BodyTooLarge(f"{response.url} exceeds {max_bytes} bytes")
+            chunk = chunk[:room]
+            logging.warning(f"Truncated {response.url} at {max_bytes} bytes")
+        body += chunk
+        if parser is not None and chunk:
+            parser.feed(bytes(chunk))
+        if len(body) >= max_bytes:
+            break
+    if raw is not None:
+        raw.extend(body)
+    charset = charset or sniff_charset(b'', response.charset)
+    tree = None
+    if parser is not None:
+        try:
+            tree = parser.close()
+        except etree.XMLSyntaxError:
+            tree = None
+    return body.decode(charset, errors='replace'), tree, len(body)
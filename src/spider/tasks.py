@@ -1,22 +1,155 @@
 from celery import Celery, Task
+from celery.signals import worker_process_init
 from spider.config import config
+from spider.db import dispose_engines
 from spider.spider import Spider
 import asyncio
 import logging
+import time
+from collections import deque
+from typing import Deque, Optional
 from spider.plugin import PluginManager
-from spider.plugins.entity_extraction import EntityExtractionPlugin
+from spider.distributed import CeleryFrontier, RedisPoliteness, RedisVisitedIndex, queue_for
+from spider.robots import create_robots_cache
+from spider.near_duplicates import create_near_duplicate_detector
 
 celery_app = Celery(
     'crawler',
     broker=config['celery']['broker_url'],
     backend=config['celery']['result_backend']
 )
+celery_app.conf.task_always_eager = config['celery'].get('task_always_eager', False)
+
+@worker_process_init.connect
+def _reset_connections(**kwargs) -> None:
+    # Pooled connections must not be shared with the parent of a forked worker.
+    dispose_engines()
+
+# Shared state for distributed crawls; created lazily so tests can inject a fake client.
+_redis = None
+_plugin_manager: Optional[PluginManager] = None
+_politeness: Optional[RedisPoliteness] = None
+_robots = None
+_near_duplicates = None
+
+def get_redis():
+    """
+    Return the Redis client holding distributed dedupe and politeness state.
+    """
+    global _redis
+    if _redis is None:
+        import redis
+        url = (config.get('distributed') or {}).get('redis_url') or config['celery']['broker_url']
+        _redis = redis.Redis.from_url(url)
+    return _redis
+
+def set_redis(client) -> None:
+    """
+    Replace the Redis client, e.g. with fakeredis.FakeRedis() for local testing.
+    """
+    global _redis, _politeness, _robots, _near_duplicates
+    _redis = client
+    _politeness = _robots = _near_duplicates = None
+
+def build_plugin_manager() -> PluginManager:
+    """
+    Build the plugin manager used by crawl tasks.
+    """
+    from spider.plugins.entity_extraction import EntityExtractionPlugin
+    plugin_manager = PluginManager(timeout=config['plugins']['timeout'])
+    plugin_manager.register(EntityExtractionPlugin())
+    return plugin_manager
+
+def get_plugin_manager() -> PluginManager:
+    """
+    Return this worker process's plugin manager, so models are loaded once per process.
+    """
+    global _plugin_manager
+    if _plugin_manager is None:
+        _plugin_manager = build_plugin_manager()
+    return _plugin_manager
+
+def get_politeness() -> RedisPoliteness:
+    """
+    Return this worker process's politeness leases; Crawl-delay values learned from
+    robots.txt are kept in its settings.
+    """
+    global _politeness
+    if _politeness is None:
+        _politeness = RedisPoliteness(get_redis(), config)
+    return _politeness
+
+def get_robots():
+    """
+    Return this worker process's robots.txt cache, so each host's file is fetched once
+    per TTL rather than once per task. None when robots.txt handling is disabled.
+    """
+    global _robots
+    if _robots is None:
+        _robots = create_robots_cache(config, get_politeness().settings) or False
+    return _robots or None
+
+def get_near_duplicates():
+    """
+    Return this worker process's near-duplicate detector, or None when disabled.
+    Duplicates are only recognised among the pages one worker process has seen.
+    """
+    global _near_duplicates
+    if _near_duplicates is None:
+        _near_duplicates = create_near_duplicate_detector(config) or False
+    return _near_duplicates or None
+
+# URLs dispatched in eager mode, where apply_async runs the task inline. The outermost
+# dispatch runs them one after another, so crawl depth does not become call depth.
+_eager_urls: Deque[str] = deque()
+_eager_running = False
+
+def dispatch_url(url: str, countdown: float = 0) -> None:
+    """
+    Send a URL to the shard queue of its host.
+
+    :param url: The URL to crawl.
+    :param countdown: Seconds to wait before the task may run.
+    """
+    global _eager_running
+    if not celery_app.conf.task_always_eager:
+        crawl_url_task.apply_async(args=[url], queue=queue_for(url, config), countdown=countdown or None)
+        return
+    _eager_urls.append(url)
+    if _eager_running:
+        return
+    _eager_running = True
+    try:
+        while _eager_urls:
+            next_url = _eager_urls.popleft()
+            crawl_url_task.apply_async(args=[next_url], queue=queue_for(next_url, config))
+    finally:
+        _eager_running = False
+
+def start_distributed_crawl(url: str) -> bool:
+    """
+    Seed a distributed crawl with a start URL.
+
+    :param url: The start URL.
+    :return: True if the URL was dispatched, False if it had already been seen.
+    """
+    from spider.utils import normalize_url
+    url = normalize_url(url)
+    if not RedisVisitedIndex(get_redis()).add(url):
+        return False
+    dispatch_url(url)
+    return True
 
 class CrawlTask(Task):
     autoretry_for = (Exception,)
     retry_kwargs = {'max_retries': 3, 'countdown': 5}
     name = 'crawl_task'
 
+class CrawlUrlTask(Task):
+    autoretry_for = (Exception,)
+    retry_kwargs = {'max_retries': 3, 'countdown': 5}
+    name = 'crawl_url_task'
+
 @celery_app.task(bind=True, base=CrawlTask)
 def crawl_task(self, url: str) -> str:
     """
@@ -27,11 +160,7 @@ def crawl_task(self, url: str) -> str:
     :return: A confirmation message.
     """
     try:
-        plugin_manager = PluginManager()
-        entity_plugin = EntityExtractionPlugin()
-        plugin_manager.register(entity_plugin)
-        
-        crawler = Spider(url, config, plugin_manager)
+        crawler = Spider(url, config, get_plugin_manager())
         asyncio.run(crawler.crawl())
         
         logging.info(f"Successfully crawled {url}")
@@ -39,3 +168,35 @@ def crawl_task(self, url: str) -> str:
     except Exception as e:
         logging.exception(f"Error crawling {url}: {e}")
         raise self.retry(exc=e)
+
+@celery_app.task(bind=True, base=CrawlUrlTask)
+def crawl_url_task(self, url: str) -> str:
+    """
+    Celery task that fetches and processes one URL of a distributed crawl.
+
+    Discovered links are deduplicated against the shared Redis index and dispatched to
+    the queue of their host's shard. If another worker fetched the same host too
+    recently, the URL is sent back to its queue with a countdown.
+
+    :param self: The task instance.
+    :param url: The URL to crawl.
+    :return: A confirmation message.
+    """
+    client = get_redis()
+    wait = get_politeness().acquire(url)
+    if wait > 0:
+        if not celery_app.conf.task_always_eager:
+            dispatch_url(url, countdown=wait)
+            return f"Deferred {url} by {wait:.2f}s"
+        # Eager mode ignores countdowns, so wait in-process instead.
+        time.sleep(wait)
+    visited = RedisVisitedIndex(client)
+    # Mark the URL seen so Spider does not dispatch it again when it was sent directly.
+    visited.add(url)
+    frontier = CeleryFrontier(dispatch_url)
+    crawler = Spider(url, config, get_plugin_manager(), frontier=frontier, visited=visited, robots=get_robots(),
+                     near_duplicates=get_near_duplicates())
+    asyncio.run(crawler.crawl_one(url))
+    frontier.flush()
+    logging.info(f"Crawled {url}; dispatched {frontier.sent} new URLs")
+    return f"Crawled {url}"
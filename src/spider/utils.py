@@ -1,6 +1,6 @@
 import logging
-from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
 from typing import Any
+from spider.canonical import canonicalize
 
 def init_logging(log_level: int = logging.INFO) -> None:
     """
@@ -15,16 +15,10 @@ def init_logging(log_level: int = logging.INFO) -> None:
 
 def normalize_url(url: str) -> str:
     """
-    Normalize a URL by removing trailing slashes and sorting query parameters.
+    Normalize a URL; see spider.canonical.canonicalize. URLs it cannot canonicalize
+    (non-HTTP schemes, malformed URLs) are returned unchanged.
 
     :param url: The URL to normalize.
     :return: Normalized URL.
     """
-    parsed = urlparse(url)
-    path = parsed.path.rstrip('/')
-    # Sort query parameters to ensure consistent ordering.
-    query = urlencode(sorted(parse_qsl(parsed.query)))
-    normalized = urlunparse((
-        parsed.scheme, parsed.netloc, path, parsed.params, query, parsed.fragment
-    ))
-    return normalized
+    return canonicalize(url) or url
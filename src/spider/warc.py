@@ -0,0 +1,279 @@
+import atexit
+import base64
+import glob
+import gzip
+import hashlib
+import logging
+import os
+import threading
+import uuid
+import zlib
+from datetime import datetime, timezone
+from typing import BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+WARC_VERSION = b'WARC/1.1'
+# Encodings that aiohttp has already undone when the body is read; they are kept
+# under an X-Crawler- prefix. Content-Length is replaced by the stored body's length.
+_REWRITTEN_HEADERS = frozenset(('content-encoding', 'transfer-encoding'))
+
+class WarcRecord(NamedTuple):
+    """
+    A WARC record: its type, target URI, named fields and content block.
+    """
+    type: str
+    url: Optional[str]
+    headers: Dict[str, str]
+    block: bytes
+
+class HttpResponse(NamedTuple):
+    """
+    An HTTP response recorded in a WARC ``response`` record.
+    """
+    url: str
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+    truncated: bool
+
+def _digest(data: bytes) -> str:
+    return 'sha1:' + base64.b32encode(hashlib.sha1(data).digest()).decode('ascii')
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def _record(warc_type: str, block: bytes, fields: Sequence[Tuple[str, str]]) -> bytes:
+    head = [
+        ('WARC-Type', warc_type),
+        ('WARC-Record-ID', f"<urn:uuid:{uuid.uuid4()}>"),
+        ('WARC-Date', _now()),
+        *fields,
+        ('WARC-Block-Digest', _digest(block)),
+        ('Content-Length', str(len(block))),
+    ]
+    lines = [WARC_VERSION] + [f"{name}: {value}".encode('utf-8') for name, value in head]
+    return b'\r\n'.join(lines) + b'\r\n\r\n' + block + b'\r\n\r\n'
+
+def http_block(status: int, reason: Optional[str], headers: Iterable[Tuple], body: bytes) -> bytes:
+    """
+    Serialize a response as the content block of a WARC ``response`` record. Encoding
+    headers are renamed to ``X-Crawler-*`` and Content-Length is set to the stored body.
+
+    :param headers: ``(name, value)`` pairs as str or bytes, e.g. aiohttp's ``raw_headers``.
+    """
+    lines = [f"HTTP/1.1 {status} {reason or ''}".rstrip().encode('ascii')]
+    for name, value in headers:
+        name = name.decode('latin-1') if isinstance(name, bytes) else name
+        value = value.decode('latin-1') if isinstance(value, bytes) else value
+        if name.lower() == 'content-length':
+            continue
+        if name.lower() in _REWRITTEN_HEADERS:
+            name = f"X-Crawler-{name}"
+        lines.append(f"{name}: {value}".encode('latin-1', errors='replace'))
+    lines.append(f"Content-Length: {len(body)}".encode('ascii'))
+    return b'\r\n'.join(lines) + b'\r\n\r\n' + body
+
+class WarcWriter:
+    def __init__(self, directory: str, prefix: str = 'spider', max_bytes: int = 1024 ** 3,
+                 compress_level: int = 6) -> None:
+        """
+        Appends HTTP responses to WARC files, one gzip member per record so each
+        record can be read on its own. A file is rotated once it reaches ``max_bytes``;
+        every file starts with a ``warcinfo`` record. Thread-safe, so records can be
+        written from worker threads.
+
+        :param directory: Where WARC files are created.
+        :param prefix: File name prefix; names also carry the start time, process ID and a serial number.
+        :param max_bytes: Compressed size at which a new file is started.
+        :param compress_level: gzip level of each record.
+        """
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max(int(max_bytes), 1)
+        self.compress_level = int(compress_level)
+        self.file: Optional[BinaryIO] = None
+        self.path: Optional[str] = None
+        self.serial = 0
+        self.records = 0
+        self.lock = threading.Lock()
+
+    def _open(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self.serial += 1
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
+        self.path = os.path.join(self.directory, f"{self.prefix}-{stamp}-{os.getpid()}-{self.serial:05d}.warc.gz")
+        self.file = open(self.path, 'ab')
+        info = f"software: spider\r\nformat: WARC File Format 1.1\r\nhostname: {os.uname().nodename}\r\n"
+        self._append(_record('warcinfo', info.encode('utf-8'), [
+            ('WARC-Filename', os.path.basename(self.path)),
+            ('Content-Type', 'application/warc-fields'),
+        ]))
+        logging.info(f"Writing WARC records to {self.path}")
+
+    def _append(self, record: bytes) -> None:
+        self.file.write(gzip.compress(record, self.compress_level))
+
+    def write_response(self, url: str, status: int, reason: Optional[str], headers: Iterable[Tuple],
+                       body: bytes, truncated: bool = False) -> int:
+        """
+        Append a ``response`` record.
+
+        :param url: The fetched URL.
+        :param status: The HTTP status.
+        :param reason: The HTTP reason phrase.
+        :param headers: The response headers as ``(name, value)`` pairs.
+        :param body: The body as read, after transfer and content decoding.
+        :param truncated: The body was cut at the fetch size limit.
+        :return: Compressed bytes written.
+        """
+        block = http_block(status, reason, headers, body)
+        fields = [
+            ('WARC-Target-URI', url),
+            ('Content-Type', 'application/http;msgtype=response'),
+            ('WARC-Payload-Digest', _digest(body)),
+        ]
+        if truncated:
+            fields.append(('WARC-Truncated', 'length'))
+        record = gzip.compress(_record('response', block, fields), self.compress_level)
+        with self.lock:
+            if self.file is None:
+                self._open()
+            self.file.write(record)
+            self.records += 1
+            if self.file.tell() >= self.max_bytes:
+                self._close()
+        return len(record)
+
+    def flush(self) -> None:
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+
+    def _close(self) -> None:
+        self.file.close()
+        self.file = None
+
+    def close(self) -> None:
+        """
+        Close the current file; the next record starts a new one.
+        """
+        with self.lock:
+            if self.file is not None:
+                self._close()
+
+# One writer per process, shared by every Spider (e.g. one per Celery task).
+_writer: Optional[WarcWriter] = None
+
+def get_warc_writer(config: dict) -> Optional[WarcWriter]:
+    """
+    Return this process's WARC writer, configured from ``config['warc']``, or None when
+    capture is disabled.
+
+    :param config: Configuration dictionary.
+    """
+    global _writer
+    settings = config.get('warc') or {}
+    if not settings.get('enabled', False):
+        return None
+    if _writer is None:
+        _writer = WarcWriter(
+            settings.get('directory', 'warc'),
+            prefix=settings.get('prefix', 'spider'),
+            max_bytes=int(settings.get('max_bytes', 1024 ** 3)),
+            compress_level=int(settings.get('compress_level', 6))
+        )
+        atexit.register(_writer.close)
+    return _writer
+
+def _read_fields(stream: BinaryIO) -> Optional[Dict[str, str]]:
+    line = stream.readline()
+    while line in (b'\r\n', b'\n'):
+        line = stream.readline()
+    if not line:
+        return None
+    version = line.strip()
+    if not version.startswith(b'WARC/'):
+        raise ValueError(f"Not a WARC record: {version[:40]!r}")
+    fields: Dict[str, str] = {}
+    for line in iter(stream.readline, b''):
+        line = line.rstrip(b'\r\n')
+        if not line:
+            break
+        name, _, value = line.decode('utf-8', errors='replace').partition(':')
+        fields[name.strip()] = value.strip()
+    return fields
+
+def iter_records(path: str) -> Iterator[WarcRecord]:
+    """
+    Read the records of a WARC file, gzipped (one or many members) or plain. A record
+    cut off at the end of the file, e.g. by a crawler that was killed, ends the read;
+    so does data that is not WARC, after a warning.
+
+    :param path: A ``.warc`` or ``.warc.gz`` file.
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as stream:
+        try:
+            while True:
+                fields = _read_fields(stream)
+                if fields is None:
+                    return
+                length = int(fields.get('Content-Length', 0))
+                block = stream.read(length)
+                if len(block) < length:
+                    logging.warning(f"Truncated WARC record at the end of {path}")
+                    return
+                yield WarcRecord(fields.get('WARC-Type', ''), fields.get('WARC-Target-URI'), fields, block)
+        except (EOFError, ValueError, zlib.error, gzip.BadGzipFile) as e:
+            logging.warning(f"Stopped reading {path}: {e}")
+
+def parse_http_response(record: WarcRecord) -> HttpResponse:
+    """
+    Split the content block of a ``response`` record into status, headers and body.
+    Header names are kept as recorded; repeated headers keep their last value.
+    """
+    head, _, body = record.block.partition(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ', 2)[1])
+    headers: Dict[str, str] = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip()] = value.strip()
+    return HttpResponse(record.url, status, headers, body, 'WARC-Truncated' in record.headers)
+
+def warc_files(paths: Iterable[str]) -> List[str]:
+    """
+    Expand directories into the WARC files they contain, oldest name first.
+
+    :param paths: WARC files and directories.
+    """
+    files: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '*.warc.gz')) + glob.glob(os.path.join(path, '*.warc'))))
+        else:
+            files.append(path)
+    return files
+
+def iter_response_records(paths: Iterable[str]) -> Iterator[WarcRecord]:
+    """
+    The ``response`` records of WARC files, in file order, not yet parsed.
+
+    :param paths: WARC files and directories.
+    """
+    for path in warc_files(paths):
+        for record in iter_records(path):
+            if record.type == 'response' and record.url:
+                yield record
+
+def iter_responses(paths: Iterable[str]) -> Iterator[HttpResponse]:
+    """
+    The HTTP responses recorded in WARC files, in file order. Records whose HTTP
+    message cannot be parsed are logged and skipped.
+
+    :param paths: WARC files and directories.
+    """
+    for record in iter_response_records(paths):
+        try:
+            yield parse_http_response(record)
+        except (ValueError, IndexError) as e:
+            logging.warning(f"Skipping unparseable response record for {record.url}: {e}")
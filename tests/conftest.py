@@ -0,0 +1,47 @@
+import asyncio
+import contextlib
+import os
+import tempfile
+import threading
+from typing import Iterator
+import pytest
+
+# Point the crawler at a throwaway SQLite database before spider.config is imported.
+os.environ.setdefault('CRAWLER_DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='spider-tests-'), 'test.db')}")
+
+from aiohttp import web
+
+@contextlib.contextmanager
+def serve_in_thread(app: web.Application) -> Iterator[str]:
+    """
+    Serve an aiohttp app on a loopback port from its own thread and event loop, so it
+    can be used by code that runs asyncio.run() itself.
+
+    :return: The base URL, e.g. ``http://127.0.0.1:41234``.
+    """
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app)
+    ready = threading.Event()
+
+    def run() -> None:
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, '127.0.0.1', 0).start())
+        ready.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert ready.wait(10), "test server did not start"
+    port = runner.addresses[0][1]
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result(10)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(10)
+        loop.close()
+
+@pytest.fixture
+def serve():
+    return serve_in_thread
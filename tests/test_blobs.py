@@ -0,0 +1,92 @@
+import asyncio
+import pytest
+from sqlalchemy import select
+from spider import storage
+from spider.blobs import ZLIB, ZSTD, BlobCodec, DictionaryTrainer, blob_hash, zstandard
+from spider.config import config
+from spider.storage import blob_dictionaries_table, blobs_table, close_sink, load_page, pages_table, save_page
+
+def page_body(i: int) -> bytes:
+    items = ''.join(f'<li class="item"><a href="/product/{i}-{j}">Product {i}-{j}</a> <span>${i * j}.99</span></li>' for j in range(20))
+    return (f'<html><head><title>Shop page {i}</title><link rel="stylesheet" href="/static/site.css"></head>'
+            f'<body><nav><a href="/">Home</a> <a href="/about">About</a></nav><ul>{items}</ul>'
+            f'<footer>Copyright example shop</footer></body></html>').encode('utf-8')
+
+def test_zlib_round_trip():
+    codec = BlobCodec(ZLIB)
+    label, payload = codec.compress(page_body(1))
+    assert label == ZLIB
+    assert len(payload) < len(page_body(1))
+    assert BlobCodec(ZSTD).decompress(label, payload) == page_body(1)
+
+@pytest.mark.skipif(zstandard is None, reason="zstandard is not installed")
+def test_zstd_dictionary_training_and_round_trip():
+    trainer = DictionaryTrainer(samples=40, size=4096)
+    dictionary = None
+    for i in range(40):
+        dictionary = trainer.add(page_body(i))
+        if i < 39:
+            assert dictionary is None
+    assert dictionary and trainer.done
+    codec = BlobCodec(ZSTD)
+    assert codec.compress(page_body(1))[0] == ZSTD
+    codec.add_dictionary(7, dictionary)
+    label, payload = codec.compress(page_body(100))
+    assert label == 'zstd:7'
+    assert len(payload) < len(BlobCodec(ZSTD).compress(page_body(100))[1])
+    # Another process needs the stored dictionary to read the payload.
+    reader = BlobCodec(ZLIB)
+    with pytest.raises(LookupError):
+        reader.decompress(label, payload)
+    reader.add_dictionary(7, dictionary, use=False)
+    assert reader.codec == ZLIB
+    assert reader.decompress(label, payload) == page_body(100)
+
+@pytest.fixture
+def blob_mode(monkeypatch):
+    monkeypatch.setitem(config['storage'], 'body_mode', storage.BLOB)
+    monkeypatch.setitem(config['storage'], 'dictionary', {'enabled': True, 'samples': 30, 'size': 4096})
+    # The codec and trainer are per process; start from scratch.
+    monkeypatch.setattr(storage, '_codec', None)
+    monkeypatch.setattr(storage, '_trainer', None)
+    with storage.get_engine().begin() as conn:
+        conn.execute(blob_dictionaries_table.delete())
+
+def test_blob_mode_stores_each_body_once(blob_mode):
+    body = page_body(1).decode('utf-8')
+
+    async def run():
+        await save_page('http://blobs.test/a', body)
+        await save_page('http://blobs.test/b', body)
+        await close_sink()
+        return await load_page('http://blobs.test/a'), await load_page('http://blobs.test/b')
+
+    assert asyncio.run(run()) == (body, body)
+    digest = blob_hash(page_body(1))
+    with storage.get_engine().connect() as conn:
+        pages = conn.execute(
+            select(pages_table.c.content, pages_table.c.blob_hash).where(pages_table.c.url.like('http://blobs.test/%'))
+        ).all()
+        blobs = conn.execute(select(blobs_table.c.size).where(blobs_table.c.hash == digest)).all()
+    assert pages == [('', digest), ('', digest)]
+    assert blobs == [(len(page_body(1)),)]
+
+@pytest.mark.skipif(zstandard is None, reason="zstandard is not installed")
+def test_blob_mode_trains_a_dictionary_from_the_first_pages(blob_mode):
+    async def run():
+        for i in range(40):
+            await save_page(f'http://dictionary.test/{i}', page_body(1000 + i).decode('utf-8'))
+        await close_sink()
+        return [await load_page(f'http://dictionary.test/{i}') for i in range(40)]
+
+    assert asyncio.run(run()) == [page_body(1000 + i).decode('utf-8') for i in range(40)]
+    with storage.get_engine().connect() as conn:
+        dictionary_id = conn.execute(select(blob_dictionaries_table.c.id)).scalar_one()
+        codecs = {row.codec for row in conn.execute(
+            select(blobs_table.c.codec).where(blobs_table.c.hash.in_([blob_hash(page_body(1000 + i)) for i in range(40)]))
+        )}
+    # Bodies before the dictionary was trained keep plain zstd.
+    assert codecs == {ZSTD, f'{ZSTD}:{dictionary_id}'}
+
+def test_inline_mode_is_the_default():
+    assert storage.body_mode() == storage.INLINE
@@ -0,0 +1,66 @@
+import asyncio
+import pytest
+from spider.concurrency import AdaptiveConcurrency, create_adaptive_concurrency
+
+URL = 'http://aimd.test/page'
+
+def test_limit_grows_additively_and_is_capped():
+    controller = AdaptiveConcurrency(initial=2, maximum=4, increase=1.0, target_latency=1.0)
+    for _ in range(2):
+        controller.record(URL, 0.1, 200)
+    # About one more slot per round of successful requests.
+    assert controller.limit(URL) == 2
+    assert controller.hosts['aimd.test'].limit == pytest.approx(2.9)
+    for _ in range(100):
+        controller.record(URL, 0.1, 200)
+    assert controller.limit(URL) == 4
+    # Other hosts keep their own state.
+    assert controller.limit('http://other.test/') == 2
+
+def test_congestion_halves_the_limit_at_most_once_per_second():
+    controller = AdaptiveConcurrency(initial=8, minimum=2, target_latency=1.0)
+    controller.record(URL, 0.1, 429)
+    assert controller.limit(URL) == 4
+    controller.record(URL, 0.1, 503)
+    assert controller.limit(URL) == 4
+    state = controller.hosts['aimd.test']
+    for congestion in ({'latency': 5.0, 'status': 200}, {'latency': 0.1, 'error': True}, {'latency': 0.1, 'status': 503}):
+        state.last_decrease -= 1.0
+        controller.record(URL, **congestion)
+    assert controller.limit(URL) == 2
+
+def test_slots_queue_waiters_and_release_them_as_the_limit_grows():
+    controller = AdaptiveConcurrency(initial=1, maximum=4)
+    active = []
+    peak = []
+
+    async def fetch(i: int, release: asyncio.Event) -> None:
+        async with controller.slot(URL):
+            active.append(i)
+            peak.append(len(active))
+            await release.wait()
+            active.remove(i)
+
+    async def run() -> None:
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(fetch(i, release)) for i in range(3)]
+        await asyncio.sleep(0.01)
+        assert active == [0]
+        # A cancelled waiter gives up its place without taking a slot.
+        tasks[1].cancel()
+        await asyncio.sleep(0.01)
+        # Fast responses raise the limit and wake the next waiter at once.
+        controller.record(URL, 0.1, 200)
+        await asyncio.sleep(0.01)
+        assert active == [0, 2]
+        release.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        assert controller.hosts['aimd.test'].in_flight == 0
+
+    asyncio.run(run())
+    assert max(peak) == 2
+
+def test_create_adaptive_concurrency_reads_the_config():
+    assert create_adaptive_concurrency({'adaptive': {'enabled': False}}) is None
+    controller = create_adaptive_concurrency({'adaptive': {'initial': 3, 'min': 2, 'max': 5}})
+    assert (controller.initial, controller.minimum, controller.maximum) == (3, 2, 5)
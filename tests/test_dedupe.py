@@ -0,0 +1,80 @@
+import asyncio
+from spider.dedupe import _MIGRATE_STEP, FingerprintSet, SetIndex, VisitedIndex, create_visited_index, url_fingerprint
+
+def urls(count: int, start: int = 0):
+    return [f'http://dedupe.test/page/{i}' for i in range(start, start + count)]
+
+def test_fingerprint_set_grows_incrementally():
+    fingerprints = FingerprintSet(8)
+    added = [url_fingerprint(url) for url in urls(5000)]
+    resizes = 0
+    for i, fp in enumerate(added):
+        if fingerprints.needs_resize():
+            fingerprints.resize(fingerprints.capacity * 2)
+            resizes += 1
+            migrated = fingerprints.moved
+            assert fingerprints.add(fp)
+            # An add moves a bounded number of old slots instead of rehashing the table.
+            assert fingerprints.moved - migrated <= _MIGRATE_STEP
+        else:
+            assert fingerprints.add(fp)
+        assert not fingerprints.add(fp)
+        # Entries stay visible while they wait in the old table.
+        assert added[i // 2] in fingerprints
+    assert resizes > 5
+    assert len(fingerprints) == 5000
+    assert all(fp in fingerprints for fp in added)
+    assert url_fingerprint('http://dedupe.test/other') not in fingerprints
+
+def test_index_starts_small_and_is_exact_below_its_budget():
+    index = VisitedIndex(expected_items=1_000_000)
+    assert index.fingerprints.nbytes <= 8192
+    assert all(index.add(url) for url in urls(20000))
+    assert not any(index.add(url) for url in urls(20000))
+    assert len(index) == 20000
+    assert not index.bloom_only
+    assert not any(url in index for url in urls(20000, start=20000))
+
+def test_index_falls_back_to_the_bloom_filter_at_its_budget():
+    index = VisitedIndex(expected_items=20000, memory_budget_mb=0.05, error_rate=0.01)
+    added = sum(index.add(url) for url in urls(20000))
+    assert index.bloom_only
+    assert index.fingerprints.capacity == 8
+    # Every seen URL is still recognised; a few unseen ones are false positives.
+    assert all(url in index for url in urls(20000))
+    assert not any(index.add(url) for url in urls(20000))
+    false_positives = sum(url in index for url in urls(5000, start=20000))
+    assert added > 19000
+    assert false_positives < 500
+
+def test_index_without_a_bloom_filter_exceeds_its_budget_instead():
+    index = VisitedIndex(expected_items=1000, memory_budget_mb=0.01, bloom=False)
+    assert all(index.add(url) for url in urls(5000))
+    assert not index.bloom_only
+    assert index.fingerprints.nbytes > 0.01 * 1024 * 1024
+
+def test_save_and_load_round_trip_during_a_resize(tmp_path):
+    path = str(tmp_path / 'visited')
+    index = VisitedIndex(expected_items=10000, path=path)
+    for url in urls(3000):
+        index.add(url)
+        if index.fingerprints.old is not None and len(index) > 2000:
+            break
+    assert index.fingerprints.old is not None
+    seen = len(index)
+    asyncio.run(index.save_async())
+
+    resumed = VisitedIndex(expected_items=10000, path=path)
+    assert len(resumed) == seen
+    assert all(url in resumed for url in urls(seen))
+    assert not any(resumed.add(url) for url in urls(seen))
+    assert resumed.add('http://dedupe.test/new')
+
+    index.add('http://dedupe.test/after')
+    index.save()
+    assert 'http://dedupe.test/after' in VisitedIndex(expected_items=10000, path=path)
+
+def test_create_visited_index_backends(tmp_path):
+    assert isinstance(create_visited_index({'dedupe': {'backend': 'set'}}), SetIndex)
+    index = create_visited_index({'dedupe': {'expected_urls': 100, 'bloom': False, 'path': str(tmp_path / 'v')}})
+    assert isinstance(index, VisitedIndex) and index.bloom is None
@@ -0,0 +1,74 @@
+import pytest
+from aiohttp import web
+from spider import tasks
+from spider.config import config
+from spider.distributed import CeleryFrontier, RedisPoliteness, RedisVisitedIndex, queue_for, shard_for
+from spider.plugin import PluginManager
+
+fakeredis = pytest.importorskip('fakeredis')
+
+@pytest.fixture
+def redis_client():
+    client = fakeredis.FakeRedis()
+    tasks.set_redis(client)
+    yield client
+    tasks.set_redis(None)
+
+def test_redis_visited_index_deduplicates(redis_client):
+    visited = RedisVisitedIndex(redis_client)
+    assert visited.add('http://example.com/a')
+    assert not visited.add('http://example.com/a')
+    assert visited.add('http://example.com/b')
+    assert 'http://example.com/a' in visited
+    assert 'http://example.com/c' not in visited
+    assert len(visited) == 2
+    # A second worker sees the same set.
+    assert not RedisVisitedIndex(redis_client).add('http://example.com/b')
+
+def test_redis_politeness_leases_hosts(redis_client, monkeypatch):
+    monkeypatch.setitem(config, 'rate_limit', 0.5)
+    politeness = RedisPoliteness(redis_client, config)
+    assert politeness.acquire('http://example.com/a') == 0
+    wait = politeness.acquire('http://example.com/b')
+    assert 0 < wait <= 0.5
+    # Other hosts have their own lease.
+    assert politeness.acquire('http://example.org/') == 0
+
+def test_celery_frontier_dispatches_on_flush():
+    sent = []
+    frontier = CeleryFrontier(sent.append)
+    frontier.put_nowait('http://example.com/a')
+    frontier.put_nowait('http://example.com/b', parent='http://example.com/')
+    assert sent == [] and frontier.qsize() == 2
+    frontier.flush()
+    assert sent == ['http://example.com/a', 'http://example.com/b']
+    assert frontier.sent == 2 and frontier.empty()
+
+def test_queue_for_is_stable_per_host():
+    assert shard_for('http://example.com/a', 4) == shard_for('http://EXAMPLE.com/b?x=1', 4)
+    assert queue_for('http://example.com/a', config).startswith('crawl.')
+
+def test_eager_crawl_follows_deep_chains_without_recursion(redis_client, serve, monkeypatch):
+    depth = 150
+    requests = []
+
+    async def page(request):
+        i = int(request.match_info['i'])
+        requests.append(i)
+        link = f'<a href="/p/{i + 1}">next</a>' if i + 1 < depth else ''
+        return web.Response(text=f'<html><body>page {i} {link}</body></html>', content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/p/{i}', page)
+    monkeypatch.setattr(tasks.celery_app.conf, 'task_always_eager', True)
+    monkeypatch.setattr(tasks, '_plugin_manager', PluginManager())
+    monkeypatch.setattr(tasks, '_near_duplicates', False)
+    monkeypatch.setitem(config, 'rate_limit', 0)
+    monkeypatch.setitem(config['robots'], 'enabled', False)
+    monkeypatch.setitem(config['parse'], 'processes', 0)
+    monkeypatch.setitem(config['recrawl'], 'conditional', False)
+    with serve(app) as base_url:
+        assert tasks.start_distributed_crawl(f'{base_url}/p/0')
+    assert sorted(requests) == list(range(depth))
+    assert len(RedisVisitedIndex(redis_client)) == depth
+    assert not tasks._eager_urls
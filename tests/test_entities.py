@@ -0,0 +1,91 @@
+import asyncio
+import multiprocessing
+import time
+from sqlalchemy import select
+from spider.config import config
+from spider.page import PageContext
+from spider.plugins import entity_extraction
+from spider.plugins.entity_extraction import EntityExtractionPlugin, entities_table, label_counts_table
+from spider.storage import close_sink
+
+def fake_extract_batch(texts, batch_size):
+    return [[{'text': word, 'label': 'ORG'} for word in text.split()] for text in texts]
+
+def test_reextraction_replaces_counts_that_are_still_buffered(monkeypatch):
+    monkeypatch.setattr(entity_extraction, 'load_model', lambda model: None)
+    monkeypatch.setattr(entity_extraction, 'extract_batch', fake_extract_batch)
+    # Nothing reaches the database until the sink is closed.
+    monkeypatch.setitem(config['storage'], 'flush_interval', 3600)
+    url = 'http://entities.test/page'
+
+    async def run() -> None:
+        plugin = EntityExtractionPlugin(processes=0, batch_size=1, batch_timeout=0.01)
+        for text in ('Acme Initech', 'Acme', 'Acme Globex'):
+            await plugin.process_page(PageContext(url, f'<html><body><p>{text}</p></body></html>'))
+            while plugin.queue.qsize() or plugin.batches:
+                await asyncio.sleep(0.01)
+        await plugin.close()
+        await close_sink()
+
+    asyncio.run(run())
+    with entity_extraction.get_engine().connect() as conn:
+        rows = conn.execute(
+            select(label_counts_table.c.count).where(label_counts_table.c.domain == 'entities.test')
+        ).all()
+    # Only the last extraction (two entities) is counted.
+    assert sum(row.count for row in rows) == 2
+
+def test_concurrent_batches_for_one_page_apply_in_order(monkeypatch):
+    monkeypatch.setattr(entity_extraction, 'load_model', lambda model: None)
+    monkeypatch.setattr(entity_extraction, 'extract_batch', fake_extract_batch)
+    previous_entities = entity_extraction._previous_entities
+    delays = [0.3]
+
+    def slow_previous_entities(urls):
+        # The first batch's database read is slow, so a later batch could overtake it.
+        time.sleep(delays.pop() if delays else 0)
+        return previous_entities(urls)
+
+    url = 'http://concurrent-entities.test/page'
+
+    async def extract(texts) -> None:
+        plugin = EntityExtractionPlugin(processes=0, batch_size=1, batch_timeout=0.01)
+        for text in texts:
+            await plugin.process_page(PageContext(url, f'<html><body><p>{text}</p></body></html>'))
+        await plugin.close()
+        await close_sink()
+
+    asyncio.run(extract(['Acme']))
+    monkeypatch.setattr(entity_extraction, '_previous_entities', slow_previous_entities)
+    # A new plugin, so the stored extraction is only known from the database.
+    asyncio.run(extract(['Acme Initech', 'Globex Hooli Initech']))
+    with entity_extraction.get_engine().connect() as conn:
+        entities = conn.execute(select(entities_table.c.entities).where(entities_table.c.url == url)).scalar_one()
+        rows = conn.execute(
+            select(label_counts_table.c.count).where(label_counts_table.c.domain == 'concurrent-entities.test')
+        ).all()
+    # The page crawled last wins, and only its entities are counted.
+    assert [entity['text'] for entity in entities] == ['Globex', 'Hooli', 'Initech']
+    assert sum(row.count for row in rows) == 3
+
+def start_in_daemon(results) -> None:
+    async def run() -> None:
+        plugin = EntityExtractionPlugin(processes=2)
+        plugin._start()
+        extracted = await asyncio.get_running_loop().run_in_executor(plugin.executor, entity_extraction.extract_batch, ['Acme'], 1)
+        results.put((type(plugin.executor).__name__, extracted))
+        plugin.batcher.cancel()
+    asyncio.run(run())
+
+def test_daemonic_workers_extract_in_a_thread(monkeypatch):
+    monkeypatch.setattr(entity_extraction, 'load_model', lambda model: None)
+    monkeypatch.setattr(entity_extraction, 'extract_batch', fake_extract_batch)
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    # Like a Celery prefork worker, which may not start processes of its own.
+    process = context.Process(target=start_in_daemon, args=(results,), daemon=True)
+    process.start()
+    executor, extracted = results.get(timeout=10)
+    process.join(10)
+    assert executor == 'ThreadPoolExecutor'
+    assert extracted == [[{'text': 'Acme', 'label': 'ORG'}]]
@@ -0,0 +1,149 @@
+import asyncio
+import copy
+import time
+from aiohttp import web
+from spider.config import config
+from spider.frontier import DiskFrontier, PriorityFrontier
+from spider.plugin import PluginManager
+from spider.spider import Spider
+
+PAGES = 20
+
+def test_priority_frontier_resumes_from_its_checkpoint(tmp_path):
+    path = str(tmp_path / 'frontier')
+    frontier = PriorityFrontier(path=path, max_pages=10)
+    frontier.put_nowait('http://example.com/')
+    assert frontier.get_nowait() == 'http://example.com/'
+    for name in ('a', 'b', 'c'):
+        frontier.put_nowait(f'http://example.com/{name}', parent='http://example.com/')
+    frontier.note_inlink('http://example.com/c')
+    frontier.checkpoint()
+
+    resumed = PriorityFrontier(path=path, max_pages=10)
+    # The page in flight is queued again, ahead of its deeper links; inlinks are kept.
+    assert [resumed.get_nowait() for _ in range(4)] == [
+        'http://example.com/', 'http://example.com/c', 'http://example.com/a', 'http://example.com/b'
+    ]
+    assert resumed.accepted == 4
+    assert resumed.domain_pages['example.com'] == 4
+
+def test_urls_queued_during_a_checkpoint_are_saved(tmp_path):
+    path = str(tmp_path / 'frontier')
+
+    async def run() -> None:
+        frontier = PriorityFrontier(path=path)
+        frontier.put_nowait('http://example.com/early')
+        write = frontier._write
+        frontier._write = lambda *args: (time.sleep(0.2), write(*args))
+        checkpoint = asyncio.create_task(frontier.checkpoint_async())
+        await asyncio.sleep(0.05)
+        frontier.put_nowait('http://example.com/late')
+        await checkpoint
+
+    asyncio.run(run())
+    resumed = PriorityFrontier(path=path)
+    assert resumed.qsize() == 2
+
+def test_interrupted_crawl_resumes_with_its_frontier(serve, tmp_path):
+    settings = copy.deepcopy(config)
+    settings['rate_limit'] = 0
+    settings['threads'] = 2
+    settings['sitemaps']['enabled'] = False
+    settings['robots']['enabled'] = False
+    settings['near_duplicates']['enabled'] = False
+    settings['recrawl']['conditional'] = False
+    settings['parse']['processes'] = 0
+    settings['frontier']['backend'] = 'priority'
+    settings['dedupe']['path'] = str(tmp_path / 'visited')
+    fetched = []
+    stop = {}
+
+    async def page(request):
+        i = int(request.match_info['i'])
+        fetched.append(i)
+        if len(fetched) == 5 and 'spider' in stop:
+            stop['loop'].call_soon_threadsafe(stop.pop('spider').stopping.set)
+        links = ''.join(f'<a href="/p/{j}">{j}</a>' for j in (2 * i + 1, 2 * i + 2) if j < PAGES)
+        return web.Response(text=f"<html><body>{links}</body></html>", content_type='text/html')
+
+    async def crawl(base_url: str, interrupt: bool) -> None:
+        spider = Spider(f'{base_url}/p/0', settings, PluginManager())
+        if interrupt:
+            stop.update(spider=spider, loop=asyncio.get_running_loop())
+        await spider.crawl()
+
+    app = web.Application()
+    app.router.add_get('/p/{i}', page)
+    with serve(app) as base_url:
+        asyncio.run(crawl(base_url, interrupt=True))
+        first_run = len(fetched)
+        assert first_run < PAGES
+        asyncio.run(crawl(base_url, interrupt=False))
+    assert set(fetched) == set(range(PAGES))
+    # Only pages in flight at the interruption are fetched twice.
+    assert len(fetched) <= PAGES + settings['threads']
+
+def test_frontier_is_written_once_at_shutdown(serve, tmp_path, monkeypatch):
+    writes = []
+    write = PriorityFrontier._write
+    monkeypatch.setattr(PriorityFrontier, '_write', lambda self, *args: (writes.append(args[0]), write(self, *args)))
+    settings = copy.deepcopy(config)
+    settings['sitemaps']['enabled'] = False
+    settings['robots']['enabled'] = False
+    settings['parse']['processes'] = 0
+    settings['frontier']['backend'] = 'priority'
+    settings['frontier']['checkpoint_interval'] = 0
+    settings['dedupe']['path'] = str(tmp_path / 'visited')
+
+    async def page(request):
+        return web.Response(text="<html><body>done</body></html>", content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/', page)
+    with serve(app) as base_url:
+        asyncio.run(Spider(f'{base_url}/', settings, PluginManager()).crawl())
+    assert writes == [str(tmp_path / 'visited.frontier')]
+
+def test_disk_frontier_is_fifo_across_its_hot_window(tmp_path):
+    frontier = DiskFrontier(str(tmp_path / 'frontier.db'), hot_size=3, write_batch=2)
+    for i in range(10):
+        frontier.put_nowait(f'http://example.com/{i}')
+    assert frontier.qsize() == 10
+    order = []
+    while not frontier.empty():
+        order.append(frontier.get_nowait())
+        # URLs queued while the window is being read still come last.
+        if len(order) == 4:
+            frontier.put_nowait('http://example.com/late')
+    assert order == [f'http://example.com/{i}' for i in range(10)] + ['http://example.com/late']
+    frontier.close()
+
+def test_disk_frontier_resumes_from_its_last_checkpoint(tmp_path):
+    path = str(tmp_path / 'frontier.db')
+
+    async def run() -> None:
+        frontier = DiskFrontier(path, hot_size=2, write_batch=100)
+        for i in range(5):
+            await frontier.put(f'http://example.com/{i}')
+        first, second = frontier.get_nowait(), frontier.get_nowait()
+        frontier.task_done(first)
+        frontier.checkpoint()
+        # Lost with the crash: neither the completion nor the new URL was committed.
+        frontier.task_done(second)
+        await frontier.put('http://example.com/uncommitted')
+        frontier._flush_writes()
+        frontier._flush_done()
+        frontier.conn.close()
+
+        resumed = DiskFrontier(path, hot_size=2)
+        assert resumed.qsize() == 4
+        urls = [await resumed.get() for _ in range(4)]
+        # The URL in flight at the checkpoint is fetched again; the completed one is not.
+        assert urls == [f'http://example.com/{i}' for i in range(1, 5)]
+        for url in urls:
+            resumed.task_done(url)
+        await asyncio.wait_for(resumed.join(), 1)
+        resumed.close()
+        assert DiskFrontier(path).empty()
+
+    asyncio.run(run())
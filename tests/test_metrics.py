@@ -0,0 +1,110 @@
+import asyncio
+import threading
+import aiohttp
+from aiohttp import web
+from spider.metrics import MetricsRegistry
+from spider.plugins.real_time_metrics import MetricsBroadcaster
+from spider.streaming import read_html
+
+def test_render_while_label_sets_are_added():
+    registry = MetricsRegistry()
+    errors = registry.counter('test_errors_total', 'Errors.', ('type',))
+    latency = registry.histogram('test_seconds', 'Latency.', ('stage',))
+    done = threading.Event()
+
+    def crawl() -> None:
+        for i in range(30000):
+            errors.inc(type=f'e{i}')
+            latency.observe(0.01, stage=f's{i}')
+        done.set()
+
+    thread = threading.Thread(target=crawl)
+    thread.start()
+    while not done.is_set():
+        registry.render_prometheus()
+        registry.snapshot()
+        errors.total()
+    thread.join()
+    assert errors.total() == 30000
+
+def test_read_html_counts_bytes_not_characters(serve):
+    body = '<html><body>' + 'é' * 100 + '</body></html>'
+
+    async def page(request):
+        return web.Response(text=body, content_type='text/html', charset='utf-8')
+
+    async def fetch(url: str):
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url) as response:
+                return await read_html(response, 1 << 20)
+
+    app = web.Application()
+    app.router.add_get('/', page)
+    with serve(app) as base_url:
+        content, tree, size = asyncio.run(fetch(base_url + '/'))
+    assert content == body
+    assert tree is None
+    assert size == len(body.encode('utf-8')) == len(body) + 100
+
+def snapshot(crawled: int, errors: float = 0, timestamp: int = 0) -> dict:
+    return {'queueSize': 5, 'crawled': crawled, 'errors': errors, 'timestamp': timestamp}
+
+def test_broadcaster_coalesces_updates_into_deltas():
+    broadcaster = MetricsBroadcaster(history=2, client_queue=4)
+
+    async def run() -> list:
+        queue = broadcaster.subscribe()
+        threads = [threading.Thread(target=broadcaster.publish, args=(snapshot(i, timestamp=i),)) for i in range(50)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        broadcaster.publish(snapshot(100, timestamp=100))
+        broadcaster.tick()
+        # Nothing new, then only a new timestamp: neither is worth a message.
+        broadcaster.tick()
+        broadcaster.publish(snapshot(100, timestamp=101))
+        broadcaster.tick()
+        broadcaster.publish(snapshot(100, errors=1.5, timestamp=102))
+        broadcaster.tick()
+        return [queue.get_nowait() for _ in range(queue.qsize())]
+
+    messages = asyncio.run(run())
+    assert messages == [snapshot(100, timestamp=100), {'errors': 1.5, 'timestamp': 102}]
+    assert list(broadcaster.history) == [snapshot(100, timestamp=100), snapshot(100, errors=1.5, timestamp=102)]
+
+def test_broadcaster_replays_history_and_drops_slow_clients():
+    broadcaster = MetricsBroadcaster(history=2, client_queue=2)
+
+    async def run() -> None:
+        for i in range(3):
+            broadcaster.publish(snapshot(i))
+            broadcaster.tick()
+        late = broadcaster.subscribe()
+        assert [late.get_nowait() for _ in range(2)] == [snapshot(1), snapshot(2)]
+        fast = broadcaster.subscribe()
+        assert [fast.get_nowait() for _ in range(2)] == [snapshot(1), snapshot(2)]
+        for i in range(3, 8):
+            broadcaster.publish(snapshot(i))
+            broadcaster.tick()
+            assert fast.get_nowait() == {'crawled': i, 'timestamp': 0}
+        # The late client never read its messages and is cut off with the sentinel.
+        assert late not in broadcaster.clients
+        assert late.get_nowait() is None and late.empty()
+
+    asyncio.run(run())
+
+def test_broadcaster_ticks_on_its_own_loop():
+    broadcaster = MetricsBroadcaster(interval=0.01)
+
+    async def run() -> dict:
+        queue = broadcaster.subscribe()
+        broadcaster.start()
+        # Published from the crawler's thread, delivered on the server's loop.
+        threading.Thread(target=broadcaster.publish, args=(snapshot(7),)).start()
+        message = await asyncio.wait_for(queue.get(), 1)
+        await broadcaster.stop()
+        return message
+
+    assert asyncio.run(run()) == snapshot(7)
+    assert broadcaster._ticker is None
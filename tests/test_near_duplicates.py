@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+import spider
+from spider.near_duplicates import NearDuplicateDetector, simhash
+
+TEXT = ' '.join(f'word{i % 97} token{i % 13}' for i in range(300))
+
+def test_fingerprints_are_stable_across_processes():
+    script = 'import sys; from spider.near_duplicates import simhash; print(simhash(sys.argv[1])[0])'
+    path = os.path.dirname(os.path.dirname(spider.__file__))
+    fingerprints = {
+        int(subprocess.run([sys.executable, '-c', script, TEXT], capture_output=True, text=True, check=True,
+                           env={**os.environ, 'PYTHONPATH': path, 'PYTHONHASHSEED': seed}).stdout)
+        for seed in ('1', '2')
+    }
+    assert fingerprints == {simhash(TEXT)[0]}
+
+def test_near_copies_are_detected():
+    detector = NearDuplicateDetector(max_distance=3, min_words=20)
+    edited = TEXT.replace('word5 ', 'changed ', 1)
+    unrelated = ' '.join(f'other{i % 89} text{i % 7}' for i in range(300))
+    assert detector.check('http://a.test/1', detector.fingerprint(TEXT)) is None
+    duplicate = detector.check('http://a.test/2', detector.fingerprint(edited))
+    assert duplicate is not None and duplicate[0] == 'http://a.test/1' and duplicate[1] <= 3
+    assert detector.check('http://a.test/3', detector.fingerprint(unrelated)) is None
+    # Too short to compare.
+    assert detector.fingerprint('just a few words') is None
+    assert simhash('') == (0, 0)
@@ -0,0 +1,134 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from spider import parse_pool
+from spider.parse_pool import ParsePool, get_parse_pool
+
+def page(i: int) -> str:
+    return f'<html><head><title>Page {i}</title></head><body><a href="/next/{i}">next</a></body></html>'
+
+def thread_pool(**kwargs) -> ParsePool:
+    # Threads instead of processes, so the tests can watch parse_batch.
+    pool = ParsePool(**kwargs)
+    pool.executor = ThreadPoolExecutor(max_workers=pool.processes)
+    return pool
+
+def test_pages_are_parsed_in_batches(monkeypatch):
+    sizes = []
+    parse_batch = parse_pool.parse_batch
+
+    def recording_parse_batch(batch):
+        sizes.append(len(batch))
+        return parse_batch(batch)
+
+    monkeypatch.setattr(parse_pool, 'parse_batch', recording_parse_batch)
+
+    async def run() -> list:
+        pool = thread_pool(processes=1, batch_size=4, batch_timeout=0.05)
+        results = await asyncio.gather(*(pool.parse(f'http://pool.test/{i}', page(i), anchors=i == 0) for i in range(10)))
+        await pool.close()
+        pool.shutdown()
+        return results
+
+    results = asyncio.run(run())
+    assert sizes == [4, 4, 2]
+    assert [result.title for result in results] == [f'Page {i}' for i in range(10)]
+    assert results[3].links == ('http://pool.test/next/3',)
+    assert results[0].anchors == {'http://pool.test/next/0': 'next'}
+    assert results[1].anchors is None
+
+def test_queue_and_batches_in_flight_are_bounded(monkeypatch):
+    release = threading.Event()
+    running = []
+    parse_batch = parse_pool.parse_batch
+
+    def blocking_parse_batch(batch):
+        running.append(len(batch))
+        release.wait(5)
+        return parse_batch(batch)
+
+    monkeypatch.setattr(parse_pool, 'parse_batch', blocking_parse_batch)
+
+    async def run() -> list:
+        pool = thread_pool(processes=1, batch_size=2, batch_timeout=0, max_pending=3)
+        tasks = [asyncio.create_task(pool.parse(f'http://pool.test/{i}', page(i))) for i in range(20)]
+        await asyncio.sleep(0.1)
+        # Two batches per process in flight, one taken by the batcher waiting for a
+        # slot, max_pending queued; the remaining parse() calls wait.
+        assert len(pool.batches) == 2
+        assert pool.queue.qsize() == 3
+        assert sum(task.done() for task in tasks) == 0
+        release.set()
+        results = await asyncio.gather(*tasks)
+        await pool.close()
+        pool.shutdown()
+        return results
+
+    results = asyncio.run(run())
+    assert len(results) == 20
+    assert sum(running) == 20
+
+def test_failed_batch_fails_its_pages(monkeypatch):
+    parse_batch = parse_pool.parse_batch
+
+    def failing_parse_batch(batch):
+        raise ValueError('parser crashed')
+
+    monkeypatch.setattr(parse_pool, 'parse_batch', failing_parse_batch)
+
+    async def run() -> tuple:
+        pool = thread_pool(processes=1, batch_size=2)
+        results = await asyncio.gather(*(pool.parse(f'http://pool.test/{i}', page(i)) for i in range(3)),
+                                       return_exceptions=True)
+        monkeypatch.setattr(parse_pool, 'parse_batch', parse_batch)
+        after = await pool.parse('http://pool.test/after', page(0))
+        await pool.close()
+        pool.shutdown()
+        return results, after
+
+    results, after = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
+    # The pool keeps working after a failed batch.
+    assert after.title == 'Page 0'
+
+def test_worker_processes_parse_pages():
+    async def run() -> list:
+        pool = ParsePool(processes=2, batch_size=2)
+        results = await asyncio.gather(*(pool.parse(f'http://pool.test/{i}', page(i)) for i in range(5)))
+        await pool.close()
+        executor = pool.executor
+        pool.shutdown()
+        assert type(executor).__name__ == 'ProcessPoolExecutor'
+        return results
+
+    results = asyncio.run(run())
+    assert [result.links for result in results] == [(f'http://pool.test/next/{i}',) for i in range(5)]
+
+def parse_in_daemon(results) -> None:
+    async def run() -> None:
+        pool = ParsePool(processes=2)
+        parsed = await pool.parse('http://pool.test/', page(1))
+        await pool.close()
+        results.put((type(pool.executor).__name__, parsed.title))
+        pool.shutdown()
+    asyncio.run(run())
+
+def test_daemonic_workers_parse_in_threads():
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    # Like a Celery prefork worker, which may not start processes of its own.
+    process = context.Process(target=parse_in_daemon, args=(results,), daemon=True)
+    process.start()
+    executor, title = results.get(timeout=10)
+    process.join(10)
+    assert executor == 'ThreadPoolExecutor'
+    assert title == 'Page 1'
+
+def test_get_parse_pool(monkeypatch):
+    monkeypatch.setattr(parse_pool, '_pool', None)
+    assert get_parse_pool({'parse': {'processes': 0}}) is None
+    pool = get_parse_pool({'parse': {'processes': 3, 'batch_size': 16, 'max_pending': 32}})
+    assert (pool.processes, pool.batch_size, pool.max_pending) == (3, 16, 32)
+    # One pool per process.
+    assert get_parse_pool({'parse': {'processes': 1}}) is pool
@@ -0,0 +1,96 @@
+import asyncio
+import time
+from spider.page import PageContext
+from spider.plugin import OBSERVE, TRANSFORM, Plugin, PluginManager
+
+class Append(Plugin):
+    mode = TRANSFORM
+
+    def __init__(self, suffix: str) -> None:
+        self.suffix = suffix
+
+    async def process(self, url: str, content: str) -> str:
+        return content + self.suffix
+
+class Recorder(Plugin):
+    mode = OBSERVE
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.seen = []
+        self.active = 0
+        self.max_active = 0
+
+    async def process_page(self, page: PageContext) -> None:
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            self.seen.append(page.content)
+        finally:
+            self.active -= 1
+
+class Slow(Recorder):
+    timeout = 0.05
+
+class Failing(Plugin):
+    mode = OBSERVE
+
+    async def process_page(self, page: PageContext) -> None:
+        raise RuntimeError("broken plugin")
+
+    async def close(self) -> None:
+        raise RuntimeError("broken close")
+
+def test_transformers_run_in_order_before_concurrent_observers():
+    first, second = Recorder(delay=0.2), Recorder(delay=0.2)
+    manager = PluginManager()
+    # Registered interleaved; observers still see the output of every transformer.
+    manager.register(first)
+    manager.register(Append('-a'))
+    manager.register(second)
+    manager.register(Append('-b'))
+
+    async def run():
+        start = time.perf_counter()
+        content = await manager.run_plugins(PageContext('http://plugins.test/', 'page'))
+        return content, time.perf_counter() - start
+
+    content, elapsed = asyncio.run(run())
+    assert content == 'page-a-b'
+    assert first.seen == second.seen == ['page-a-b']
+    assert elapsed < 0.35
+    assert manager.stats()['Append']['calls'] == 2
+
+def test_timeouts_and_errors_are_contained_and_counted():
+    slow, fast = Slow(delay=1.0), Recorder()
+    manager = PluginManager(timeout=0.5)
+    for plugin in (slow, fast, Failing()):
+        manager.register(plugin)
+
+    async def run():
+        start = time.perf_counter()
+        await manager.run_plugins(PageContext('http://plugins.test/', 'page'))
+        elapsed = time.perf_counter() - start
+        await manager.close()
+        return elapsed
+
+    # The plugin's own timeout wins over the manager's default.
+    assert asyncio.run(run()) < 0.4
+    stats = manager.stats()
+    assert stats['Slow']['timeouts'] == 1 and not slow.seen
+    assert stats['Failing']['errors'] == 1
+    assert fast.seen == ['page']
+
+def test_max_concurrency_bounds_pages_in_a_plugin():
+    limited = Recorder(delay=0.02)
+    limited.max_concurrency = 2
+    manager = PluginManager()
+    manager.register(limited)
+
+    async def run():
+        await asyncio.gather(*(manager.run_plugins(PageContext(f'http://plugins.test/{i}', str(i))) for i in range(8)))
+
+    asyncio.run(run())
+    assert limited.max_active == 2
+    assert sorted(limited.seen) == [str(i) for i in range(8)]
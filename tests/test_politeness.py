@@ -0,0 +1,56 @@
+import asyncio
+import copy
+import time
+from aiohttp import web
+from spider.config import config
+from spider.frontier import MemoryFrontier
+from spider.plugin import PluginManager
+from spider.scheduler import HostScheduler
+from spider.spider import Spider
+
+RATE_LIMIT = 0.2
+
+def crawl_config() -> dict:
+    settings = copy.deepcopy(config)
+    settings['rate_limit'] = RATE_LIMIT
+    settings['threads'] = 4
+    settings['sitemaps']['enabled'] = False
+    settings['robots']['enabled'] = False
+    settings['near_duplicates']['enabled'] = False
+    settings['recrawl']['conditional'] = False
+    settings['parse']['processes'] = 0
+    settings['frontier']['checkpoint_interval'] = 0
+    # One request at a time per host: workers queue for the host's slot.
+    settings['adaptive'] = {'enabled': True, 'initial': 1, 'min': 1, 'max': 1}
+    return settings
+
+def test_requests_to_a_slow_host_keep_their_spacing(serve):
+    starts = []
+
+    async def page(request):
+        starts.append(time.monotonic())
+        # The first page is slow, so the other workers pile up behind the host's slot.
+        if request.match_info['i'] == '0':
+            await asyncio.sleep(1.0)
+        return web.Response(text=f"<html><body>page {request.match_info['i']}</body></html>", content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/p/{i}', page)
+    with serve(app) as base_url:
+        spider = Spider(f'{base_url}/p/0', crawl_config(), PluginManager(), frontier=MemoryFrontier())
+        for i in range(1, 5):
+            url = f'{base_url}/p/{i}'
+            spider.visited.add(url)
+            spider.to_visit.put_nowait(url)
+        asyncio.run(spider.crawl())
+    assert len(starts) == 5
+    gaps = [later - earlier for earlier, later in zip(starts, starts[1:])]
+    assert min(gaps) >= RATE_LIMIT * 0.9, gaps
+
+def test_crawl_delay_reaches_the_bucket_of_a_host_ip():
+    scheduler = HostScheduler({'rate_limit': 1, 'politeness': {'per_ip': True}})
+    scheduler.ip_cache['example.com'] = '192.0.2.1'
+    bucket = scheduler._bucket('192.0.2.1', 'example.com')
+    scheduler.set_rate_limit('Example.com', 7)
+    assert bucket.rate_limit == 7
+    assert scheduler.settings_for('example.com')['rate_limit'] == 7
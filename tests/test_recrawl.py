@@ -0,0 +1,77 @@
+import asyncio
+import copy
+from aiohttp import web
+from spider import metrics
+from spider.config import config
+from spider.frontier import MemoryFrontier
+from spider.plugin import OBSERVE, Plugin, PluginManager
+from spider.spider import Spider
+from spider.storage import load_page, load_validators
+
+class PageCounter(Plugin):
+    mode = OBSERVE
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def process_page(self, page) -> None:
+        self.calls += 1
+
+def recrawl_config() -> dict:
+    settings = copy.deepcopy(config)
+    settings['rate_limit'] = 0
+    settings['sitemaps']['enabled'] = False
+    settings['robots']['enabled'] = False
+    settings['near_duplicates']['enabled'] = False
+    settings['parse']['processes'] = 0
+    settings['recrawl']['conditional'] = True
+    return settings
+
+def test_recrawls_skip_unchanged_pages(serve):
+    site = {'body': '<html><body><a href="/next">next</a> version 1</body></html>', 'etag': '"v1"', 'honour': True}
+    requests = []
+
+    async def page(request):
+        requests.append(request.headers.get('If-None-Match'))
+        if site['honour'] and request.headers.get('If-None-Match') == site['etag']:
+            return web.Response(status=304, headers={'ETag': site['etag']})
+        return web.Response(text=site['body'], content_type='text/html', headers={'ETag': site['etag']})
+
+    app = web.Application()
+    app.router.add_get('/page', page)
+    counter = PageCounter()
+    plugin_manager = PluginManager()
+    plugin_manager.register(counter)
+
+    with serve(app) as base_url:
+        url = f'{base_url}/page'
+
+        def crawl() -> int:
+            frontier = MemoryFrontier()
+            spider = Spider(url, recrawl_config(), plugin_manager, frontier=frontier)
+            asyncio.run(spider.crawl_one(url))
+            # The start URL itself was queued by the constructor.
+            return frontier.qsize() - 1
+
+        unchanged = metrics.pages_unchanged.get()
+        assert crawl() == 1
+        assert counter.calls == 1
+        assert asyncio.run(load_validators(url))['etag'] == '"v1"'
+
+        # 304: the stored copy is reused for its links; plugins and writes are skipped.
+        assert crawl() == 1
+        assert requests[-1] == '"v1"'
+        assert counter.calls == 1
+
+        # A server that ignores validators: the content hash shows nothing changed.
+        site['honour'] = False
+        assert crawl() == 1
+        assert counter.calls == 1
+        assert metrics.pages_unchanged.get() == unchanged + 2
+
+        site['body'] = '<html><body>version 2</body></html>'
+        site['etag'] = '"v2"'
+        assert crawl() == 0
+        assert counter.calls == 2
+        assert asyncio.run(load_page(url)) == site['body']
+        assert asyncio.run(load_validators(url))['etag'] == '"v2"'
@@ -0,0 +1,150 @@
+import asyncio
+from spider.page import PageContext
+from spider.plugin import PluginManager
+from spider.plugins.dynamic_scraper import DynamicScraperPlugin
+from spider.renderer import PlaywrightRenderer, RenderResult, Renderer
+
+class FakePage:
+    def __init__(self, browser: 'FakeBrowser') -> None:
+        self.browser = browser
+        self.url = None
+
+    async def goto(self, url: str, timeout: int, wait_until: str) -> None:
+        self.browser.timeouts.append(timeout)
+        self.browser.active += 1
+        self.browser.peak = max(self.browser.peak, self.browser.active)
+        try:
+            await self.browser.release.wait()
+            if 'fail' in url:
+                raise RuntimeError("navigation failed")
+            self.url = url
+        finally:
+            self.browser.active -= 1
+
+    async def content(self) -> str:
+        return f'<html><body><a href="{self.url}/next">rendered</a></body></html>'
+
+    async def evaluate(self, script: str) -> str:
+        return 'rendered'
+
+    async def eval_on_selector_all(self, selector: str, script: str) -> list:
+        return ['/logo.png']
+
+class FakeContext:
+    def __init__(self, browser: 'FakeBrowser') -> None:
+        self.browser = browser
+        self.closed = False
+
+    async def route(self, pattern: str, handler) -> None:
+        pass
+
+    async def new_page(self) -> FakePage:
+        return FakePage(self.browser)
+
+    async def close(self) -> None:
+        self.closed = True
+
+class FakeBrowser:
+    def __init__(self) -> None:
+        self.contexts = []
+        self.timeouts = []
+        self.active = 0
+        self.peak = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def new_context(self) -> FakeContext:
+        context = FakeContext(self)
+        self.contexts.append(context)
+        return context
+
+    async def close(self) -> None:
+        pass
+
+class FakePlaywrightRenderer(PlaywrightRenderer):
+    async def _launch(self) -> FakeBrowser:
+        return FakeBrowser()
+
+def test_renderer_recycles_contexts():
+    async def run():
+        renderer = FakePlaywrightRenderer(max_contexts=1, recycle_after=2, timeout=1234)
+        for i in range(5):
+            result = await renderer.render(f'http://example.com/{i}')
+            assert result.html.startswith('<html>') and result.images == ['/logo.png']
+        browser = renderer._browser
+        # Recycled after renders 2 and 4; the third context is still in use.
+        assert len(browser.contexts) == 3
+        assert [context.closed for context in browser.contexts] == [True, True, False]
+        assert browser.timeouts == [1234] * 5
+        await renderer.close()
+        assert browser.contexts[-1].closed
+    asyncio.run(run())
+
+def test_renderer_discards_failed_contexts():
+    async def run():
+        renderer = FakePlaywrightRenderer(max_contexts=1, recycle_after=50)
+        try:
+            await renderer.render('http://example.com/fail')
+        except RuntimeError:
+            pass
+        await renderer.render('http://example.com/ok')
+        assert [context.closed for context in renderer._browser.contexts] == [True, False]
+        await renderer.close()
+    asyncio.run(run())
+
+def test_renderer_bounds_queue_and_contexts():
+    async def run():
+        renderer = FakePlaywrightRenderer(max_contexts=2, max_queue=3)
+        await renderer._start()
+        browser = renderer._browser
+        browser.release.clear()
+        tasks = [asyncio.create_task(renderer.render(f'http://example.com/{i}')) for i in range(6)]
+        await asyncio.sleep(0.05)
+        # Two pages render, one request waits for a context, three wait for queue room.
+        assert browser.active == 2
+        assert renderer.queue_slots.locked()
+        assert len(renderer.queue_slots._waiters) == 3
+        browser.release.set()
+        results = await asyncio.gather(*tasks)
+        assert len(results) == 6 and browser.peak == 2
+        await renderer.close()
+    asyncio.run(run())
+
+def test_plugin_timeout_returns_context_to_pool():
+    async def run():
+        renderer = FakePlaywrightRenderer(max_contexts=1)
+        await renderer._start()
+        browser = renderer._browser
+        browser.release.clear()
+        plugin = DynamicScraperPlugin(renderer)
+        plugin.timeout = 0.05
+        manager = PluginManager()
+        manager.register(plugin)
+        page = PageContext('http://example.com/slow', '<html></html>')
+        assert await manager.run_plugins(page) == '<html></html>'
+        assert manager.stats()['DynamicScraperPlugin']['timeouts'] == 1
+        # The timed-out context was discarded and its slot handed back.
+        assert browser.contexts[0].closed
+        browser.release.set()
+        page = PageContext('http://example.com/fast', '<html></html>')
+        assert 'rendered' in await manager.run_plugins(page)
+        await manager.close()
+    asyncio.run(run())
+
+def test_dynamic_scraper_uses_injected_renderer():
+    class StubRenderer(Renderer):
+        def __init__(self) -> None:
+            self.urls = []
+
+        async def render(self, url: str) -> RenderResult:
+            self.urls.append(url)
+            return RenderResult(url, '<html><body>from stub</body></html>', 'from stub')
+
+    async def run():
+        renderer = StubRenderer()
+        plugin = DynamicScraperPlugin(renderer)
+        assert await plugin.should_run('http://example.com/', '<html></html>')
+        assert not await plugin.should_run('http://example.com/', 'x' * 500)
+        assert await plugin.process('http://example.com/', '<html></html>') == '<html><body>from stub</body></html>'
+        assert renderer.urls == ['http://example.com/']
+    asyncio.run(run())
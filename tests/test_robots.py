@@ -0,0 +1,153 @@
+import asyncio
+import gzip
+import aiohttp
+from aiohttp import web
+from spider.robots import RobotsCache, parse_robots
+from spider.scheduler import HostScheduler
+from spider.sitemap import collect_sitemap_urls
+
+ROBOTS = """
+User-agent: *
+Disallow: /private
+Crawl-delay: 1
+
+User-agent: bot
+Disallow: /
+
+User-agent: SpiderBot
+Disallow: /shop
+Allow: /shop/public
+Disallow: /*.pdf$
+
+User-agent: spiderbot
+Disallow: /tmp
+Sitemap: http://example.com/sitemap.xml
+"""
+
+def test_exact_product_token_group_wins():
+    rules = parse_robots(ROBOTS, 'SpiderBot/1.0')
+    assert not rules.allowed('/shop/cart')
+    assert not rules.allowed('/tmp/x')  # groups for the same agent are combined
+    # The * group does not apply once a specific group matches.
+    assert rules.allowed('/private')
+    assert rules.crawl_delay is None
+    assert rules.sitemaps == ['http://example.com/sitemap.xml']
+
+def test_product_tokens_match_case_insensitively_but_not_as_substrings():
+    assert not parse_robots(ROBOTS, 'spiderbot').allowed('/shop')
+    assert not parse_robots(ROBOTS, 'BOT/2.0').allowed('/anything')
+    # "bot" is not the product token of "spider-bot-x"; the * group applies.
+    rules = parse_robots(ROBOTS, 'spider-bot-x/1.0')
+    assert rules.allowed('/anything')
+    assert not rules.allowed('/private/page')
+    assert rules.crawl_delay == 1
+
+def test_longest_match_decides_and_allow_wins_ties():
+    rules = parse_robots(ROBOTS, 'SpiderBot/1.0')
+    assert rules.allowed('/shop/public/item')
+    assert not rules.allowed('/docs/manual.pdf')
+    assert rules.allowed('/docs/manual.pdf?download=1')
+    tie = parse_robots("User-agent: *\nDisallow: /page\nAllow: /page\n", 'Any/1.0')
+    assert tie.allowed('/page')
+    assert parse_robots("User-agent: *\nDisallow: /\n", 'Any/1.0').allowed('/robots.txt')
+
+def test_no_matching_group_allows_everything():
+    assert parse_robots("User-agent: otherbot\nDisallow: /\n", 'SpiderBot/1.0').allowed('/x')
+
+def test_robots_cache_status_handling_and_ttl(serve):
+    fetches = []
+    statuses = {'status': 200}
+
+    async def robots(request):
+        fetches.append(request.path)
+        return web.Response(status=statuses['status'], text="User-agent: *\nDisallow: /blocked\nCrawl-delay: 3\n")
+
+    app = web.Application()
+    app.router.add_get('/robots.txt', robots)
+
+    async def run(base_url: str) -> None:
+        scheduler = HostScheduler({'rate_limit': 1})
+        cache = RobotsCache('SpiderBot/1.0', ttl=0.2, error_ttl=0.2, scheduler=scheduler)
+        async with aiohttp.ClientSession() as session:
+            assert await cache.allowed(session, f'{base_url}/page')
+            assert not await cache.allowed(session, f'{base_url}/blocked')
+            assert await cache.filter(session, [f'{base_url}/a', f'{base_url}/blocked/b']) == [f'{base_url}/a']
+            # Fetched once per TTL, and the Crawl-delay reached the scheduler.
+            assert len(fetches) == 1
+            assert scheduler.settings_for('127.0.0.1')['rate_limit'] == 3
+            # 4xx: everything is allowed.
+            statuses['status'] = 404
+            await asyncio.sleep(0.25)
+            assert await cache.allowed(session, f'{base_url}/blocked')
+            assert len(fetches) == 2
+            # 5xx: nothing is allowed until the error TTL passes.
+            statuses['status'] = 503
+            await asyncio.sleep(0.25)
+            assert not await cache.allowed(session, f'{base_url}/page')
+            statuses['status'] = 200
+            assert not await cache.allowed(session, f'{base_url}/page')
+            assert len(fetches) == 3
+            await asyncio.sleep(0.25)
+            assert await cache.allowed(session, f'{base_url}/page')
+            assert len(fetches) == 4
+
+    with serve(app) as base_url:
+        asyncio.run(run(base_url))
+
+def test_robots_cache_shares_concurrent_fetches(serve):
+    fetches = []
+
+    async def robots(request):
+        fetches.append(request.path)
+        await asyncio.sleep(0.05)
+        return web.Response(text="User-agent: *\nDisallow: /blocked\n")
+
+    app = web.Application()
+    app.router.add_get('/robots.txt', robots)
+
+    async def run(base_url: str) -> list:
+        cache = RobotsCache('SpiderBot/1.0')
+        async with aiohttp.ClientSession() as session:
+            return await asyncio.gather(*(cache.allowed(session, f'{base_url}/p{i}') for i in range(10)))
+
+    with serve(app) as base_url:
+        assert all(asyncio.run(run(base_url)))
+    assert len(fetches) == 1
+
+def test_collect_sitemap_urls_follows_indexes_and_gzip(serve):
+    documents = {}
+
+    async def sitemap(request):
+        body = documents[request.match_info['name']]
+        # Gzipped sitemaps are served as files, without Content-Encoding.
+        content_type = 'application/gzip' if request.match_info['name'].endswith('.gz') else 'application/xml'
+        return web.Response(body=body, content_type=content_type)
+
+    app = web.Application()
+    app.router.add_get('/{name}', sitemap)
+
+    async def run(base_url: str):
+        documents['index.xml'] = f"""<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <sitemap><loc>{base_url}/plain.xml</loc></sitemap>
+  <sitemap><loc>{base_url}/pages.xml.gz</loc></sitemap>
+</sitemapindex>""".encode()
+        documents['plain.xml'] = f"""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc>{base_url}/old</loc><lastmod>2020-01-01</lastmod></url>
+  <url><loc>{base_url}/undated</loc></url>
+  <url><loc>http://elsewhere.example/page</loc></url>
+</urlset>""".encode()
+        documents['pages.xml.gz'] = gzip.compress(f"""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc>{base_url}/new</loc><lastmod>2024-05-01T10:00:00+00:00</lastmod></url>
+  <url><loc>{base_url}/old</loc></url>
+</urlset>""".encode())
+        async with aiohttp.ClientSession() as session:
+            return await collect_sitemap_urls(session, [f'{base_url}/index.xml'], 'SpiderBot/1.0')
+
+    with serve(app) as base_url:
+        entries = asyncio.run(run(base_url))
+    # Newest first, undated last, other hosts dropped, duplicates kept once.
+    assert [entry.loc.rsplit('/', 1)[1] for entry in entries] == ['new', 'old', 'undated']
+    assert entries[0].lastmod > entries[1].lastmod
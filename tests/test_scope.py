@@ -0,0 +1,86 @@
+import pytest
+from spider.canonical import canonicalize, canonicalize_links
+from spider.scope import PublicSuffixList, ScopeFilter, create_scope_filter
+
+SUFFIXES = PublicSuffixList(['// comment', 'uk', 'co.uk', 'com', 'io', 'github.io', '*.ck', '!www.ck'])
+
+@pytest.mark.parametrize('url, expected', [
+    ('HTTP://Example.COM:80/a/b/?utm_source=x&b=2&a=1#top', 'http://example.com/a/b?a=1&b=2'),
+    ('https://example.com:443/', 'https://example.com'),
+    ('https://example.com:8443/x', 'https://example.com:8443/x'),
+    ('https://example.com./?gclid=1&FBCLID=2', 'https://example.com'),
+    ('https://bücher.de/path', 'https://xn--bcher-kva.de/path'),
+    ('http://user:pw@Example.com/', 'http://user:pw@example.com'),
+    ('http://[::1]:8080/x', 'http://[::1]:8080/x'),
+    ('  https://example.com/q?x=a%20b  ', 'https://example.com/q?x=a+b'),
+    ('ftp://example.com/file', None),
+    ('mailto:someone@example.com', None),
+    ('http:///nohost', None),
+    ('http://example.com:99999/', None),
+])
+def test_canonicalize(url, expected):
+    assert canonicalize(url) == expected
+
+def test_canonicalize_links_dedupes_in_order():
+    links = ['https://b.com/', 'javascript:void(0)', 'https://a.com/?utm_medium=x', 'https://B.com', 'https://a.com']
+    assert canonicalize_links(links) == ['https://b.com', 'https://a.com']
+
+@pytest.mark.parametrize('host, domain', [
+    ('www.bbc.co.uk', 'bbc.co.uk'),
+    ('bbc.co.uk', 'bbc.co.uk'),
+    ('co.uk', ''),
+    ('user.github.io', 'user.github.io'),
+    ('a.b.user.github.io', 'user.github.io'),
+    ('shop.example.com', 'example.com'),
+    ('host.unknowntld', 'host.unknowntld'),
+    ('a.b.foo.ck', 'b.foo.ck'),
+    ('a.www.ck', 'www.ck'),
+    ('[2001:db8::1]', '2001:db8::1'),
+    ('10.0.0.1', '10.0.0.1'),
+    ('WWW.Example.COM.', 'example.com'),
+])
+def test_registered_domain(host, domain):
+    assert SUFFIXES.registered_domain(host) == domain
+
+def test_same_site_scope_uses_registered_domains():
+    scope = ScopeFilter(sites=['https://www.bbc.co.uk/news', 'alice.github.io'], suffixes=SUFFIXES)
+    urls = [
+        'https://bbc.co.uk/a',
+        'https://sport.bbc.co.uk/b',
+        'https://itv.co.uk/c',
+        'https://alice.github.io/blog',
+        'https://bob.github.io/blog',
+        'https://user:pw@news.bbc.co.uk:8080/d',
+    ]
+    assert scope.filter(urls) == [urls[0], urls[1], urls[3], urls[5]]
+    assert scope.sites == {'bbc.co.uk', 'alice.github.io'}
+
+def test_host_and_path_globs():
+    scope = ScopeFilter(sites=['example.com'], allow_hosts=['*.partner.org'], deny_hosts=['private.example.com'],
+                        deny_paths=['*/logout*', '/search?*'], suffixes=SUFFIXES)
+    assert scope.allowed('https://www.example.com/page')
+    assert scope.allowed('https://cdn.partner.org/page')
+    assert not scope.allowed('https://partner.org/page')
+    assert not scope.allowed('https://private.example.com/page')
+    assert not scope.allowed('https://example.com/account/logout?next=1')
+    assert not scope.allowed('https://example.com/search?q=1')
+    assert scope.allowed('https://example.com')
+
+    only_docs = ScopeFilter(same_site=False, allow_paths=['/docs/*'], suffixes=SUFFIXES)
+    assert only_docs.filter(['https://a.com/docs/x', 'https://b.com/blog', 'https://c.com']) == ['https://a.com/docs/x']
+
+def test_host_cache_is_bounded_and_reset_by_new_sites():
+    scope = ScopeFilter(sites=['example.com'], max_hosts=2, suffixes=SUFFIXES)
+    assert not scope.host_allowed('other.com')
+    scope.host_allowed('a.example.com')
+    scope.host_allowed('b.example.com')
+    assert len(scope._hosts) <= 2
+    scope.add_site('https://other.com/')
+    assert scope.host_allowed('other.com')
+
+def test_create_scope_filter():
+    assert create_scope_filter({'scope': {'enabled': False}}) is None
+    scope = create_scope_filter({'scope': {'deny_hosts': ['ads.*']}}, sites=['https://example.com/'])
+    assert scope.allowed('https://www.example.com/x')
+    assert not scope.allowed('https://ads.example.com/x')
+    assert not scope.allowed('https://elsewhere.net/x')
@@ -0,0 +1,111 @@
+import asyncio
+from sqlalchemy import create_engine, select, Column, Integer, MetaData, String, Table
+from spider.sink import IGNORE, INCREMENT, UPDATE, WriteBehindSink
+
+metadata = MetaData()
+items = Table(
+    'items', metadata,
+    Column('key', String, primary_key=True),
+    Column('value', String, nullable=False)
+)
+counts = Table(
+    'counts', metadata,
+    Column('key', String, primary_key=True),
+    Column('count', Integer, nullable=False)
+)
+
+def make_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sink.db'}")
+    metadata.create_all(engine)
+    return engine
+
+def rows(engine, table):
+    with engine.connect() as conn:
+        return dict(conn.execute(select(*table.columns)).all())
+
+def test_modes_coalesce_buffered_rows_and_upsert(tmp_path):
+    engine = make_engine(tmp_path)
+
+    async def run() -> None:
+        sink = WriteBehindSink(engine, flush_interval=3600)
+        await sink.write(items, {'key': 'kept', 'value': 'first'}, IGNORE)
+        await sink.write(items, {'key': 'kept', 'value': 'second'}, IGNORE)
+        await sink.write(counts, {'key': 'a', 'count': 2}, INCREMENT)
+        await sink.write(counts, {'key': 'a', 'count': 3}, INCREMENT)
+        assert sink.pending == 2
+        await sink.flush()
+        assert rows(engine, items) == {'kept': 'first'}
+        assert rows(engine, counts) == {'a': 5}
+        # Stored rows: IGNORE keeps them, UPDATE replaces them, INCREMENT adds to them.
+        await sink.write(items, {'key': 'kept', 'value': 'third'}, IGNORE)
+        await sink.write(items, {'key': 'replaced', 'value': 'old'}, UPDATE)
+        await sink.write(items, {'key': 'replaced', 'value': 'new'}, UPDATE)
+        await sink.write(counts, {'key': 'a', 'count': 1}, INCREMENT)
+        await sink.close()
+
+    asyncio.run(run())
+    assert rows(engine, items) == {'kept': 'first', 'replaced': 'new'}
+    assert rows(engine, counts) == {'a': 6}
+
+def test_writers_wait_for_the_database_above_max_pending(tmp_path):
+    engine = make_engine(tmp_path)
+
+    async def run() -> None:
+        sink = WriteBehindSink(engine, batch_size=10, flush_interval=3600, max_pending=10)
+        for i in range(10):
+            await sink.write(items, {'key': f'k{i}', 'value': 'v'}, UPDATE)
+        blocked = asyncio.create_task(sink.write(items, {'key': 'k10', 'value': 'v'}, UPDATE))
+        await asyncio.sleep(0)
+        # The full buffer triggered a flush; the blocked writer continues once it is done.
+        await asyncio.wait_for(blocked, 5)
+        assert len(rows(engine, items)) == 10
+        await sink.close()
+
+    asyncio.run(run())
+    assert len(rows(engine, items)) == 11
+
+def test_a_failed_flush_releases_its_rows_and_the_flusher_keeps_running(tmp_path):
+    engine = make_engine(tmp_path)
+
+    async def run() -> None:
+        sink = WriteBehindSink(engine, batch_size=2, flush_interval=0.05, max_pending=2)
+        write_batches = sink._write_batches
+        failures = []
+
+        def fail_once(batches):
+            if not failures:
+                failures.append(batches)
+                raise TypeError("cannot adapt value")
+            return write_batches(batches)
+
+        sink._write_batches = fail_once
+        await sink.write(items, {'key': 'lost', 'value': 'v'}, UPDATE)
+        await sink.write(items, {'key': 'lost2', 'value': 'v'}, UPDATE)
+        # Would wait forever if the failed rows were still counted as pending.
+        await asyncio.wait_for(sink.write(items, {'key': 'saved', 'value': 'v'}, UPDATE), 5)
+        for _ in range(100):
+            if rows(engine, items):
+                break
+            await asyncio.sleep(0.02)
+        assert failures
+        assert not sink._flusher.done()
+        await sink.close()
+        assert sink.pending == 0
+
+    asyncio.run(run())
+    assert rows(engine, items) == {'saved': 'v'}
+
+def test_rows_a_table_rejects_do_not_stop_other_tables(tmp_path):
+    engine = make_engine(tmp_path)
+
+    async def run() -> None:
+        sink = WriteBehindSink(engine, flush_interval=3600)
+        # sqlite3 cannot bind a dict: a driver error that SQLAlchemy may not wrap.
+        await sink.write(items, {'key': 'bad', 'value': {'not': 'a string'}}, UPDATE)
+        await sink.write(counts, {'key': 'a', 'count': 1}, INCREMENT)
+        await sink.close()
+        assert sink.pending == 0
+
+    asyncio.run(run())
+    assert rows(engine, items) == {}
+    assert rows(engine, counts) == {'a': 1}
@@ -0,0 +1,84 @@
+import asyncio
+import copy
+import aiohttp
+import pytest
+from aiohttp import web
+from spider import metrics
+from spider.config import config
+from spider.frontier import MemoryFrontier
+from spider.spider import Spider
+from spider.streaming import BodyTooLarge, NotHtml, read_html
+
+BIG = b'<html><body>' + b'<p>chunk of text</p>' * 5000 + b'</body></html>'
+
+async def streamed(request):
+    response = web.StreamResponse(headers={'Content-Type': 'text/html'})
+    await response.prepare(request)
+    for i in range(0, len(BIG), 4096):
+        await response.write(BIG[i:i + 4096])
+    await response.write_eof()
+    return response
+
+async def binary(request):
+    return web.Response(body=b'GIF89a\x00\x01' * 100, content_type='text/html')
+
+async def latin(request):
+    return web.Response(body='<html><head><meta charset="iso-8859-1"></head><body>café</body></html>'.encode('latin-1'),
+                        headers={'Content-Type': 'text/html'})
+
+async def pdf(request):
+    return web.Response(body=b'%PDF-1.4' * 1000, content_type='application/pdf')
+
+def site() -> web.Application:
+    app = web.Application()
+    app.router.add_get('/big', streamed)
+    app.router.add_get('/binary', binary)
+    app.router.add_get('/latin', latin)
+    app.router.add_get('/pdf', pdf)
+    return app
+
+def read(base_url: str, path: str, **kwargs):
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            async with session.get(base_url + path) as response:
+                return await read_html(response, **kwargs)
+    return asyncio.run(run())
+
+def test_bodies_are_capped_or_rejected_at_max_bytes(serve):
+    with serve(site()) as base_url:
+        content, tree, size = read(base_url, '/big', max_bytes=10000, chunk_size=1000)
+        assert size == 10000
+        assert content == BIG[:10000].decode('utf-8')
+        content, _, size = read(base_url, '/big', max_bytes=len(BIG) * 2)
+        assert size == len(BIG)
+        with pytest.raises(BodyTooLarge):
+            read(base_url, '/big', max_bytes=10000, truncate=False)
+
+def test_charset_binary_detection_and_incremental_parsing(serve):
+    with serve(site()) as base_url:
+        with pytest.raises(NotHtml):
+            read(base_url, '/binary', max_bytes=10000)
+        content, tree, _ = read(base_url, '/latin', max_bytes=10000, incremental=True)
+        assert 'café' in content
+        assert tree is not None and tree.findtext('.//body') == 'café'
+        raw = bytearray()
+        _, tree, size = read(base_url, '/big', max_bytes=len(BIG), incremental=True, raw=raw)
+        assert bytes(raw) == BIG and size == len(BIG)
+        assert len(tree.findall('.//p')) == 5000
+
+def test_fetch_skips_other_content_types_and_oversized_pages(serve):
+    settings = copy.deepcopy(config)
+    settings['fetch'] = {'max_bytes': 10000, 'truncate': False}
+    with serve(site()) as base_url:
+        async def run():
+            spider = Spider(f'{base_url}/big', settings, frontier=MemoryFrontier())
+            async with spider.create_session() as session:
+                return [await spider.fetch(session, f'{base_url}{path}') for path in ('/pdf', '/big', '/latin')]
+
+        content_type = metrics.fetch_errors.get(type='content_type')
+        too_large = metrics.fetch_errors.get(type='too_large')
+        pdf_result, big_result, latin_result = asyncio.run(run())
+    assert pdf_result is None and big_result is None
+    assert 'café' in latin_result.content
+    assert metrics.fetch_errors.get(type='content_type') == content_type + 1
+    assert metrics.fetch_errors.get(type='too_large') == too_large + 1
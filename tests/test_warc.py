@@ -0,0 +1,94 @@
+import asyncio
+import gzip
+import os
+from spider.page import PageContext
+from spider.plugin import OBSERVE, Plugin, PluginManager
+from spider.replay import replay
+from spider.storage import load_page
+from spider.warc import WarcWriter, iter_records, iter_responses, warc_files
+
+HEADERS = [(b'Content-Type', b'text/html; charset=utf-8'), (b'Content-Encoding', b'gzip'), (b'Content-Length', b'9999')]
+
+def page_html(i: int) -> bytes:
+    return f"<html><head><title>Page {i}</title></head><body><p>body {i}</p></body></html>".encode('utf-8')
+
+def write_pages(directory: str, count: int, max_bytes: int = 1024 ** 3) -> WarcWriter:
+    writer = WarcWriter(directory, max_bytes=max_bytes)
+    for i in range(count):
+        writer.write_response(f'http://warc.test/{i}', 200, 'OK', HEADERS, page_html(i))
+    writer.close()
+    return writer
+
+def test_records_round_trip(tmp_path):
+    writer = WarcWriter(str(tmp_path))
+    writer.write_response('http://warc.test/a', 200, 'OK', HEADERS, page_html(1))
+    writer.write_response('http://warc.test/b', 404, 'Not Found', [], b'gone', truncated=True)
+    writer.close()
+    records = list(iter_records(writer.path))
+    assert [record.type for record in records] == ['warcinfo', 'response', 'response']
+    first, second = iter_responses([str(tmp_path)])
+    assert first.url == 'http://warc.test/a'
+    assert first.status == 200
+    assert first.body == page_html(1)
+    # Encodings already undone by aiohttp are renamed; Content-Length matches the stored body.
+    assert first.headers['X-Crawler-Content-Encoding'] == 'gzip'
+    assert first.headers['Content-Length'] == str(len(page_html(1)))
+    assert not first.truncated
+    assert (second.status, second.body, second.truncated) == (404, b'gone', True)
+
+def test_files_rotate_at_max_bytes(tmp_path):
+    writer = write_pages(str(tmp_path), 30, max_bytes=2000)
+    files = warc_files([str(tmp_path)])
+    assert len(files) == writer.serial > 1
+    # Every file starts with its own warcinfo record.
+    assert all(next(iter_records(path)).type == 'warcinfo' for path in files)
+    assert [response.url for response in iter_responses([str(tmp_path)])] == [f'http://warc.test/{i}' for i in range(30)]
+
+def test_truncated_and_foreign_files_are_read_up_to_the_damage(tmp_path):
+    writer = write_pages(str(tmp_path), 3)
+    with open(writer.path, 'rb') as f:
+        data = f.read()
+    with open(writer.path, 'wb') as f:
+        f.write(data[:-40])
+    with open(tmp_path / 'notes.warc', 'wb') as f:
+        f.write(b'this is not a WARC file\r\n\r\n')
+    urls = [response.url for response in iter_responses([str(tmp_path)])]
+    assert urls == ['http://warc.test/0', 'http://warc.test/1']
+
+class TitleCollector(Plugin):
+    mode = OBSERVE
+
+    def __init__(self) -> None:
+        self.titles = {}
+
+    async def process_page(self, page: PageContext) -> None:
+        self.titles[page.url] = page.title
+
+def test_replay_runs_plugins_and_stores_pages(tmp_path):
+    directory = str(tmp_path / 'warc')
+    writer = write_pages(directory, 5)
+    writer.write_response('http://warc.test/missing', 404, 'Not Found', [], b'gone')
+    # A response record whose HTTP message is damaged.
+    writer.write_response('http://warc.test/broken', 200, 'OK', [], b'x')
+    writer.close()
+    # Damage the status line of the last record, keeping its length; the file is stored uncompressed.
+    with gzip.open(writer.path, 'rb') as f:
+        data = f.read()
+    head, _, tail = data.rpartition(b'HTTP/1.1 200 OK')
+    os.remove(writer.path)
+    with open(writer.path[:-len('.gz')], 'wb') as f:
+        f.write(head + b'HTTP/1.1 2x0 OK' + tail)
+    with open(os.path.join(directory, 'zz-foreign.warc.gz'), 'wb') as f:
+        f.write(gzip.compress(b'<html>not a WARC record</html>'))
+    collector = TitleCollector()
+    plugin_manager = PluginManager()
+    plugin_manager.register(collector)
+
+    async def run():
+        counts = await replay([directory], plugin_manager, workers=3)
+        return counts, await load_page('http://warc.test/3')
+
+    counts, stored = asyncio.run(run())
+    assert counts == {'pages': 5, 'skipped': 1, 'errors': 1}
+    assert collector.titles == {f'http://warc.test/{i}': f'Page {i}' for i in range(5)}
+    assert stored == page_html(3).decode('utf-8')